@@ -0,0 +1,387 @@
+"""
+bundle/clone 流程基准测试
+
+在本地生成 N 个合成 git 仓库（大小、提交数可配置），通过 file:// 或本地 git daemon 提供远程，
+在隔离的子进程中依次运行 bundle_repos / clone_or_pull_repos 的各种模式，
+记录耗时、峰值内存（含 git 子进程）和峰值磁盘占用，并排输出对比结果。全程不访问外部网络。
+
+环境变量：
+    BENCH_REPOS            合成仓库数量（默认 8）
+    BENCH_COMMITS          每个仓库的提交数（默认 50）
+    BENCH_FILES            每个仓库的文件数（默认 20）
+    BENCH_FILE_KB          每次修改写入的文件大小 KB（默认 16）
+    BENCH_CHANGES          每个提交修改的文件数（默认 3）
+    BENCH_TRANSPORT        远程协议 file 或 daemon（默认 file）
+    BENCH_WORKERS          并发模式使用的工作线程数（默认 4）
+    BENCH_MODES            要运行的模式，逗号分隔（默认全部，见 SCENARIOS）
+    BENCH_WORK_DIR         工作目录（默认新建临时目录，已存在的合成仓库会复用）
+    BENCH_KEEP             设为 1 时保留工作目录
+结果表打印到控制台，同时保存为 RUN_REPORT_DIR（默认 reports）下的 benchmark_<时间>.json
+"""
+
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计峰值内存
+    resource = None
+
+from util_repo import dir_size, remove_readonly
+
+# 模式名: (流程, 环境变量, 是否先预热一次再计时, 是否使用并发)
+SCENARIOS: dict[str, tuple[str, dict[str, str], bool, bool]] = {
+    "bundle-seq": ("bundle", {}, False, False),
+    "bundle-par": ("bundle", {}, False, True),
+    "bundle-shallow": ("bundle", {"BUNDLE_FETCH_STRATEGY": "shallow"}, False, False),
+    "bundle-mirror": ("bundle", {"BUNDLE_MIRROR_CACHE_DIR": "{cache}"}, False, False),
+    "bundle-incremental": ("bundle", {"BUNDLE_INCREMENTAL": "1"}, False, False),
+    "bundle-warm-skip": ("bundle", {}, True, False),
+    "bundle-warm-fetch": ("bundle", {"BUNDLE_SKIP_UNCHANGED": "0"}, True, False),
+    "bundle-warm-mirror": (
+        "bundle",
+        {"BUNDLE_MIRROR_CACHE_DIR": "{cache}", "BUNDLE_SKIP_UNCHANGED": "0"},
+        True,
+        False,
+    ),
+    "clone-full": ("clone", {"CLONE_FETCH_STRATEGY": "full"}, False, False),
+    "clone-partial": ("clone", {"CLONE_FETCH_STRATEGY": "partial"}, False, False),
+    "clone-par": ("clone", {}, False, True),
+    "clone-warm-pull": ("clone", {}, True, False),
+}
+
+
+def _env_int(name: str, default: int) -> int:
+    """从环境变量读取正整数，无效时使用默认值"""
+    try:
+        value = int(os.getenv(name, ""))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _fast_import_stream(
+    rnd: random.Random, commits: int, files: int, file_kb: int, changes: int
+) -> bytes:
+    """生成 git fast-import 输入流：线性历史，每个提交修改若干文件，最后打一个标签"""
+    parts = []
+    mark = 0
+    previous = None
+    for n in range(commits):
+        changed = range(files) if n == 0 else rnd.sample(range(files), changes)
+        blobs = []
+        for index in changed:
+            mark += 1
+            # 一半随机字节（不可压缩）加一半文本，接近真实仓库的压缩率
+            content = rnd.randbytes(file_kb * 512) + (
+                f"line {n} {index}\n" * (file_kb * 512 // 16)
+            ).encode("utf-8")
+            parts.append(
+                b"blob\nmark :%d\ndata %d\n%s\n" % (mark, len(content), content)
+            )
+            blobs.append((mark, index))
+        mark += 1
+        message = f"commit {n}\n".encode("utf-8")
+        parts.append(
+            b"commit refs/heads/main\nmark :%d\n"
+            b"committer Bench <bench@example.com> %d +0000\n"
+            b"data %d\n%s" % (mark, 1700000000 + n * 60, len(message), message)
+        )
+        if previous:
+            parts.append(b"from :%d\n" % previous)
+        for blob_mark, index in blobs:
+            parts.append(b"M 100644 :%d src/file_%03d.bin\n" % (blob_mark, index))
+        parts.append(b"\n")
+        previous = mark
+    parts.append(b"reset refs/tags/v1\nfrom :%d\n\n" % previous)
+    return b"".join(parts)
+
+
+def generate_repos(src_dir: str, count: int) -> list[str]:
+    """
+    生成合成裸仓库，相同参数下内容固定，便于不同提交之间对比
+    :param src_dir: 合成仓库目录
+    :param count: 仓库数量
+    :return: 仓库名列表
+    """
+    commits = _env_int("BENCH_COMMITS", 50)
+    files = _env_int("BENCH_FILES", 20)
+    file_kb = _env_int("BENCH_FILE_KB", 16)
+    changes = min(files, _env_int("BENCH_CHANGES", 3))
+    os.makedirs(src_dir, exist_ok=True)
+    names = []
+    for i in range(count):
+        name = f"bench_{i:03d}"
+        names.append(name)
+        path = os.path.join(src_dir, f"{name}.git")
+        if os.path.isdir(path):
+            continue
+        print(f"正在生成合成仓库: {name}")
+        subprocess.run(
+            ["git", "init", "--bare", "--quiet", "--initial-branch=main", path],
+            check=True,
+        )
+        stream = _fast_import_stream(random.Random(i), commits, files, file_kb, changes)
+        subprocess.run(
+            ["git", "fast-import", "--quiet"], input=stream, cwd=path, check=True
+        )
+        subprocess.run(["git", "gc", "--quiet"], cwd=path, check=True)
+    return names
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_daemon(src_dir: str) -> tuple[subprocess.Popen, str]:
+    """启动只监听本机的 git daemon，返回进程和远程地址前缀"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            "git",
+            "daemon",
+            "--reuseaddr",
+            "--export-all",
+            f"--base-path={src_dir}",
+            "--listen=127.0.0.1",
+            f"--port={port}",
+            src_dir,
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return process, f"git://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("git daemon 启动失败")
+
+
+def _peak_rss_mb() -> float:
+    """本进程及已回收子进程（git）的峰值常驻内存"""
+    if resource is None:
+        return 0.0
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # Linux 单位为 KB，macOS 为字节
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _run_pipeline(task_path: str) -> None:
+    """子进程入口：运行一次流程，把耗时和峰值内存写回任务文件"""
+    with open(task_path, "r", encoding="utf-8") as f:
+        task = json.load(f)
+    start = time.monotonic()
+    if task["kind"] == "bundle":
+        from util_bundle_repos import bundle_repos
+
+        bundle_repos(task["repos"], task["output_dir"], False, task["workers"])
+    else:
+        from util_clone_repos import clone_or_pull_repos
+
+        clone_or_pull_repos(task["repos"], task["output_dir"], task["workers"])
+    task["seconds"] = round(time.monotonic() - start, 3)
+    task["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    with open(task_path, "w", encoding="utf-8") as f:
+        json.dump(task, f, ensure_ascii=False)
+
+
+def _report_statuses(report_dir: str) -> dict[str, int]:
+    """读取最近一次运行报告汇总中的状态统计"""
+    reports = sorted(
+        os.path.join(report_dir, name)
+        for name in os.listdir(report_dir)
+        if name.endswith(".jsonl")
+    )
+    if not reports:
+        return {}
+    with open(reports[-1], "r", encoding="utf-8") as f:
+        for line in reversed(f.read().splitlines()):
+            record = json.loads(line)
+            if record.get("type") == "summary":
+                return record["statuses"]
+    return {}
+
+
+def run_scenario(
+    name: str, work_dir: str, repos: list[dict[str, str]], workers: int
+) -> dict:
+    """
+    在独立目录和子进程中运行一个模式，临时目录、输出目录和镜像缓存都位于该模式目录下
+    :return: 结果记录
+    """
+    kind, scenario_env, warm, parallel = SCENARIOS[name]
+    scenario_dir = os.path.join(work_dir, "runs", name)
+    if os.path.isdir(scenario_dir):
+        shutil.rmtree(scenario_dir, onerror=remove_readonly)
+    tmp_dir = os.path.join(scenario_dir, "tmp")
+    report_dir = os.path.join(scenario_dir, "reports")
+    os.makedirs(tmp_dir)
+
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith(("BUNDLE_", "CLONE_"))
+    }
+    for key, value in scenario_env.items():
+        env[key] = value.format(cache=os.path.join(scenario_dir, "cache"))
+    # tempfile.gettempdir() 读取这些变量，让临时仓库目录也计入该模式的磁盘占用
+    env.update(
+        TMPDIR=tmp_dir,
+        TEMP=tmp_dir,
+        TMP=tmp_dir,
+        RUN_REPORT_DIR=report_dir,
+        REPO_INVENTORY_DB=os.path.join(scenario_dir, "inventory.sqlite3"),
+    )
+
+    task_path = os.path.join(scenario_dir, "task.json")
+    task = {
+        "kind": kind,
+        "repos": repos,
+        "output_dir": os.path.join(scenario_dir, "out"),
+        "workers": workers if parallel else 1,
+    }
+
+    def _child() -> None:
+        with open(task_path, "w", encoding="utf-8") as f:
+            json.dump(task, f, ensure_ascii=False)
+        with open(os.path.join(scenario_dir, "run.log"), "a", encoding="utf-8") as log:
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run", task_path],
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                check=True,
+            )
+
+    if warm:
+        _child()
+
+    # 后台定期采样模式目录大小，得到峰值磁盘占用
+    peak_disk = 0
+    stop = threading.Event()
+
+    def _sample() -> None:
+        nonlocal peak_disk
+        while True:
+            peak_disk = max(peak_disk, dir_size(scenario_dir))
+            if stop.wait(0.2):
+                return
+
+    sampler = threading.Thread(target=_sample, daemon=True)
+    sampler.start()
+    try:
+        _child()
+    finally:
+        stop.set()
+        sampler.join()
+
+    with open(task_path, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    return {
+        "mode": name,
+        "seconds": result["seconds"],
+        "peak_rss_mb": result["peak_rss_mb"],
+        "peak_disk_mb": round(peak_disk / 1024**2, 1),
+        "final_disk_mb": round(dir_size(task["output_dir"]) / 1024**2, 1),
+        "statuses": _report_statuses(report_dir),
+    }
+
+
+def _print_results(results: list[dict]) -> None:
+    print(
+        "\n模式                    耗时(秒)  峰值内存(MB)  峰值磁盘(MB)  输出(MB)  结果"
+    )
+    for r in results:
+        statuses = ",".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+        print(
+            f"{r['mode']:<22}{r['seconds']:>10.2f}{r['peak_rss_mb']:>14.1f}"
+            f"{r['peak_disk_mb']:>14.1f}{r['final_disk_mb']:>10.1f}  {statuses}"
+        )
+
+
+def main() -> None:
+    modes = [m.strip() for m in os.getenv("BENCH_MODES", "").split(",") if m.strip()]
+    modes = modes or list(SCENARIOS)
+    unknown = [m for m in modes if m not in SCENARIOS]
+    if unknown:
+        print(f"未知模式: {', '.join(unknown)}，可选: {', '.join(SCENARIOS)}")
+        sys.exit(1)
+
+    work_dir = os.getenv("BENCH_WORK_DIR") or tempfile.mkdtemp(prefix="repoBench_")
+    work_dir = os.path.abspath(work_dir)
+    src_dir = os.path.join(work_dir, "src")
+    names = generate_repos(src_dir, _env_int("BENCH_REPOS", 8))
+    print(f"合成仓库: {len(names)} 个，共 {dir_size(src_dir) / 1024**2:.1f} MB")
+
+    daemon = None
+    if os.getenv("BENCH_TRANSPORT", "file") == "daemon":
+        daemon, base_url = start_daemon(src_dir)
+    else:
+        base_url = "file://" + src_dir.replace(os.sep, "/")
+    repos = [{"Name": name, "Url": f"{base_url}/{name}.git"} for name in names]
+
+    workers = _env_int("BENCH_WORKERS", 4)
+    results = []
+    try:
+        for i, mode in enumerate(modes, 1):
+            print(f"[{i}/{len(modes)}] 正在运行模式: {mode}")
+            results.append(run_scenario(mode, work_dir, repos, workers))
+    finally:
+        if daemon:
+            daemon.kill()
+            daemon.wait()
+
+    _print_results(results)
+    # 结果与运行报告保存在同一目录，便于在不同提交之间对比
+    report_dir = os.getenv("RUN_REPORT_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "reports"
+    )
+    os.makedirs(report_dir, exist_ok=True)
+    result_path = os.path.join(
+        report_dir, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "repos": len(names),
+                "commits": _env_int("BENCH_COMMITS", 50),
+                "file_kb": _env_int("BENCH_FILE_KB", 16),
+                "transport": os.getenv("BENCH_TRANSPORT", "file"),
+                "workers": workers,
+                "results": results,
+            },
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+    print(f"结果已保存: {result_path}")
+
+    if os.getenv("BENCH_KEEP") == "1" or os.getenv("BENCH_WORK_DIR"):
+        print(f"工作目录已保留: {work_dir}")
+        return
+    shutil.rmtree(work_dir, onerror=remove_readonly)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--run":
+        _run_pipeline(sys.argv[2])
+    else:
+        main()
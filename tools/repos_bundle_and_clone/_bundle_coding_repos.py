@@ -8,20 +8,18 @@ Coding仓库打包工具
 
 import os
 from util_bundle_repos import bundle_repos
-from coding_repos_info import get_all_repos_info
+from coding_repos_info import CODING_ORG, iter_all_repos_info
 from dotenv import load_dotenv, find_dotenv
 
-
-
 load_dotenv(find_dotenv(".env.local"))
 load_dotenv()
 
 if __name__ == "__main__":
 
-    org = "codingcorp"
+    org = CODING_ORG
     OUTPUT_DIR = os.getenv("BUNDLE_OUTPUT_DIR")
 
-    repos = get_all_repos_info()
+    # 仓库列表逐页获取，获取到的仓库立即开始处理
+    repos = iter_all_repos_info()
 
-    print(f"即将处理 {len(repos)} 个仓库")
-    bundle_repos(repos, OUTPUT_DIR)
+    bundle_repos(repos, OUTPUT_DIR, provider="coding", org=org)
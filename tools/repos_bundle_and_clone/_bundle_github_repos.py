@@ -1,7 +1,6 @@
 import os
 from dotenv import load_dotenv, find_dotenv
 
-
 load_dotenv(find_dotenv(".env.local"))
 load_dotenv()
 
@@ -9,6 +8,13 @@ if __name__ == "__main__":
     from github_repo_list import fetch_repositories_info
     from util_bundle_repos import bundle_repos
 
+    from util_repo_state import (
+        load_state,
+        record_processed,
+        save_state,
+        select_changed_repos,
+    )
+
     repos, org = fetch_repositories_info()
     # 检查命令行参数
     # 将仓库信息保存到JSON文件
@@ -16,5 +22,20 @@ if __name__ == "__main__":
     if not OUTPUT_DIR:
         raise ValueError("BUNDLE_OUTPUT_DIR environment variable is not set.")
 
+    # 只处理上次成功运行之后有推送的仓库，FULL_RUN=1 或 --full 时处理全部
+    state = load_state("bundle", "github", org)
+    listed_names = {repo["Name"] for repo in repos}
+    repos = select_changed_repos(repos, state)
+
     print(f"即将处理 {len(repos)} 个仓库")
-    bundle_repos(repos, OUTPUT_DIR, False)
+    if repos:
+        run_report = bundle_repos(
+            repos,
+            OUTPUT_DIR,
+            False,
+            provider="github",
+            org=org,
+            known_names=listed_names,
+        )
+        record_processed(state, repos, run_report.succeeded())
+        save_state("bundle", "github", org, state)
@@ -8,7 +8,7 @@ Coding仓库打包工具
 
 import os
 from util_clone_repos import clone_or_pull_repos
-from coding_repos_info import get_all_repos_info
+from coding_repos_info import CODING_ORG, iter_all_repos_info
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv(".env.local"))
@@ -16,9 +16,9 @@ load_dotenv()
 
 if __name__ == "__main__":
 
-    repos = get_all_repos_info()
-    org = "codingcorp"
+    # 仓库列表逐页获取，获取到的仓库立即开始处理
+    repos = iter_all_repos_info()
+    org = CODING_ORG
     Repo_Clone_DIR = os.getenv("Repo_OUTPUT_DIR")
 
-    print(f"即将处理 {len(repos)} 个仓库")
-    clone_or_pull_repos(repos, Repo_Clone_DIR)
+    clone_or_pull_repos(repos, Repo_Clone_DIR, provider="coding", org=org)
@@ -1,13 +1,19 @@
 import os
 from dotenv import load_dotenv, find_dotenv
 
-
 load_dotenv(find_dotenv(".env.local"))
 load_dotenv()
 
 if __name__ == "__main__":
     from github_repo_list import fetch_repositories_info
     from util_clone_repos import clone_or_pull_repos
+    from util_repo_state import (
+        load_state,
+        record_processed,
+        save_state,
+        select_changed_repos,
+    )
+
     repos, org = fetch_repositories_info()
     # 检查命令行参数
     # 将仓库信息保存到JSON文件
@@ -16,5 +22,14 @@ if __name__ == "__main__":
     if not Repo_Clone_DIR:
         raise ValueError("Repo_OUTPUT_DIR environment variable is not set.")
 
+    # 只处理上次成功运行之后有推送的仓库，FULL_RUN=1 或 --full 时处理全部
+    state = load_state("clone", "github", org)
+    repos = select_changed_repos(repos, state)
+
     print(f"即将处理 {len(repos)} 个仓库")
-    clone_or_pull_repos(repos, Repo_Clone_DIR)
+    if repos:
+        run_report = clone_or_pull_repos(
+            repos, Repo_Clone_DIR, provider="github", org=org
+        )
+        record_processed(state, repos, run_report.succeeded())
+        save_state("clone", "github", org, state)
@@ -0,0 +1,19 @@
+import os
+import sys
+from dotenv import load_dotenv, find_dotenv
+
+load_dotenv(find_dotenv(".env.local"))
+load_dotenv()
+
+if __name__ == "__main__":
+    from util_verify_bundle import verify_bundles
+
+    OUTPUT_DIR = os.getenv("BUNDLE_OUTPUT_DIR")
+    if not OUTPUT_DIR:
+        raise ValueError("BUNDLE_OUTPUT_DIR environment variable is not set.")
+
+    # --full 或 BUNDLE_VERIFY_FULL=1 时使用 index-pack 完整校验
+    full = True if "--full" in sys.argv[1:] else None
+    passed, failed = verify_bundles(OUTPUT_DIR, full=full)
+    if failed:
+        sys.exit(1)
@@ -1,67 +1,269 @@
-from typing import Dict, Any, List, Optional, Union
-from coding_utils import validate_id, handle_api_error, make_api_request
+import math
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+from coding_utils import (
+    get_client,
+    handle_api_error,
+    is_throttled,
+    make_api_request,
+    validate_id,
+)
 from coding_projects_info import get_project_ids
-from util_filter_repos import filter_repos
-from util_repo import save_to_json
+from util_filter_repos import iter_filter_repos
+from util_inventory import save_listing
 
+DEFAULT_PAGE_SIZE = 100
+# 清单数据库中 Coding 仓库所属的组织，打包和克隆脚本的运行记录使用同一个值
+CODING_ORG = "codingcorp"
+# 响应没有总页数时的翻页上限，防止接口忽略 PageNumber 时无限翻页
+MAX_PAGES = 1000
 
-def fetch_repositories_info(
+
+def _total_pages(data: Dict[str, Any], page_size: int) -> Optional[int]:
+    """从响应中读取总页数，响应中没有分页信息时返回 None"""
+    page = data.get("Page") if isinstance(data.get("Page"), dict) else data
+    if page.get("TotalPage"):
+        return int(page["TotalPage"])
+    total = page.get("TotalRow", page.get("TotalCount"))
+    if total is not None:
+        return math.ceil(int(total) / page_size)
+    return None
+
+
+def fetch_repositories_page(
     project_id: Optional[int] = None,
-) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    page_number: int = 1,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[Union[List[Dict[str, Any]], Dict[str, Any]], Optional[int]]:
+    """
+    获取项目的一页仓库信息
+    :param project_id: 项目ID
+    :param page_number: 页码，从 1 开始
+    :param page_size: 每页数量
+    :return: (仓库列表或错误信息, 总页数；响应中没有分页信息时为 None)
+    """
     if project_id is not None and not validate_id(project_id, "项目ID"):
-        return handle_api_error("INVALID_ID", Exception("项目ID必须为正整数"))
+        return handle_api_error("INVALID_ID", Exception("项目ID必须为正整数")), None
 
     payload_data = {"ProjectId": project_id} if project_id else {}
+    payload_data.update(PageNumber=page_number, PageSize=page_size)
     success, response_data = make_api_request("DescribeProjectDepots", payload_data)
     # print(response_data)
     if not success:
-        return response_data
+        return response_data, None
 
     if (
         "Response" in response_data
         and "Data" in response_data["Response"]
         and "DepotList" in response_data["Response"]["Data"]
     ):
-        repositories = response_data["Response"]["Data"]["DepotList"]
-        return repositories if repositories else []
+        data = response_data["Response"]["Data"]
+        repositories = data["DepotList"]
+        return (repositories if repositories else []), _total_pages(data, page_size)
+
+    return (
+        handle_api_error("INVALID_RESPONSE", Exception("API响应中未找到仓库信息")),
+        None,
+    )
+
+
+class _AdaptiveBackoff:
+    """被限流时所有线程一起退避，退避时间逐次翻倍，请求成功后逐步恢复"""
 
-    return handle_api_error("INVALID_RESPONSE", Exception("API响应中未找到仓库信息"))
+    def __init__(self, base: float = 1.0, maximum: float = 60.0) -> None:
+        self._base = base
+        self._maximum = maximum
+        self._delay = 0.0
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
 
+    def wait(self) -> None:
+        with self._lock:
+            remaining = self._resume_at - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
 
-def get_all_repos_info() -> List[Dict[str, Any]]:
+    def throttled(self) -> None:
+        with self._lock:
+            self._delay = min(self._maximum, max(self._base, self._delay * 2))
+            # 加入随机抖动，避免所有线程在同一时刻恢复请求
+            delay = self._delay * random.uniform(0.5, 1.0)
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._delay = self._delay / 2 if self._delay > self._base else 0.0
+
+
+def _fetch_page_with_backoff(
+    project_id: Optional[int],
+    page_number: int,
+    page_size: int,
+    backoff: _AdaptiveBackoff,
+    max_attempts: int = 6,
+) -> Tuple[Union[List[Dict[str, Any]], Dict[str, Any]], Optional[int]]:
+    """获取一页仓库信息，被限流时退避后重试"""
+    for _ in range(max_attempts):
+        backoff.wait()
+        result, total_pages = fetch_repositories_page(
+            project_id, page_number, page_size
+        )
+        if not is_throttled(result):
+            backoff.succeeded()
+            return result, total_pages
+        backoff.throttled()
+    return result, total_pages
+
+
+def _page_size() -> int:
+    try:
+        page_size = int(os.getenv("CODING_PAGE_SIZE", str(DEFAULT_PAGE_SIZE)))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return page_size if page_size > 0 else DEFAULT_PAGE_SIZE
+
+
+def iter_repositories_info(
+    project_id: Optional[int] = None,
+    page_size: Optional[int] = None,
+    backoff: Optional[_AdaptiveBackoff] = None,
+    errors: Optional[List[Dict[str, Any]]] = None,
+) -> Iterator[Dict[str, Any]]:
     """
-    获取用户所有项目的仓库信息
-    :param unique: 是否去除重复的仓库信息，默认为True
-    :return: 所有仓库信息列表
+    按 PageNumber/PageSize 逐页获取项目的仓库信息，每取回一页立即逐个产出
+    :param project_id: 项目ID
+    :param page_size: 每页数量，为空时读取环境变量 CODING_PAGE_SIZE（默认 100）
+    :param backoff: 多个项目并发获取时共享的限流退避
+    :param errors: 获取失败时追加错误信息的列表，已产出的仓库不受影响
+    已经产出过的仓库（按 Id）不会重复产出
+    """
+    page_size = page_size or _page_size()
+    backoff = backoff or _AdaptiveBackoff()
+    seen = set()
+    page_number = 1
+    while True:
+        repositories, total_pages = _fetch_page_with_backoff(
+            project_id, page_number, page_size, backoff
+        )
+        if isinstance(repositories, dict):
+            if errors is not None:
+                errors.append(repositories)
+            return
+        new_repositories = []
+        for repo in repositories:
+            key = repo.get("Id", repo.get("DepotHttpsUrl"))
+            if key not in seen:
+                seen.add(key)
+                new_repositories.append(repo)
+        yield from new_repositories
+        # 响应带有总页数时以总页数为准，否则取到不满一页为止；
+        # 接口忽略分页参数时（整页都是已产出的仓库，或返回超过一页的数量）也停止
+        if total_pages is not None:
+            if page_number >= total_pages:
+                return
+        elif len(repositories) != page_size:
+            return
+        if not new_repositories:
+            return
+        if page_number >= MAX_PAGES:
+            print(f"项目 {project_id} 的仓库已翻到 {MAX_PAGES} 页，停止翻页")
+            return
+        page_number += 1
+
+
+def fetch_repositories_info(
+    project_id: Optional[int] = None,
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """获取项目的全部仓库信息（自动翻页），失败时返回错误信息"""
+    errors: List[Dict[str, Any]] = []
+    repositories = list(iter_repositories_info(project_id, errors=errors))
+    return errors[0] if errors else repositories
+
+
+_DONE = object()
+
+
+def iter_all_repos_info(workers: Optional[int] = None) -> Iterator[Dict[str, str]]:
+    """
+    以流式方式获取用户所有项目的仓库信息，产出过滤后的 {"Name", "Url"}
+    多个项目并发翻页获取，结果仍按项目ID列表的顺序、逐页产出，
+    下游可以在后续页面仍在获取时就开始处理已经产出的仓库；
+    任一项目获取失败时，在产出其余项目的仓库后抛出 RuntimeError，不保存不完整的列表
+    （不完整的列表会让下游把缺失的仓库当作已删除）
+    :param workers: 并发获取的项目数量，为空时读取环境变量 CODING_API_WORKERS（默认 4），
+        每个请求从共享的 API 客户端连接池中取用连接
     """
 
     project_ids = get_project_ids()
     print(f"项目ID列表: {project_ids}")
+    if workers is None:
+        try:
+            workers = int(os.getenv("CODING_API_WORKERS", "4"))
+        except ValueError:
+            workers = 4
+    workers = max(1, workers)
+
+    backoff = _AdaptiveBackoff()
+    pages: List[queue.Queue] = [queue.Queue() for _ in project_ids]
+    failed_projects: List[int] = []
+
+    def _list(index: int, project_id: int) -> None:
+        errors: List[Dict[str, Any]] = []
+        try:
+            for repo in iter_repositories_info(
+                project_id, backoff=backoff, errors=errors
+            ):
+                pages[index].put(repo)
+        except Exception as e:
+            errors.append(handle_api_error("UNKNOWN_ERROR", e))
+        finally:
+            for error in errors:
+                print(f"获取项目 {project_id} 的仓库信息失败: {error}")
+            if errors:
+                failed_projects.append(project_id)
+            pages[index].put(_DONE)
+
     all_repos = []
 
-    for project_id in project_ids:
-        formated_repos = fetch_repositories_info(project_id)
-        if isinstance(formated_repos, list):
-            all_repos.extend(formated_repos)
-        elif isinstance(formated_repos, dict):
-            all_repos.append(formated_repos)
+    def _formated_repos() -> Iterator[Dict[str, str]]:
+        with ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="coding-api"
+        ) as executor:
+            for index, project_id in enumerate(project_ids):
+                executor.submit(_list, index, project_id)
+            for project_queue in pages:
+                while (repo := project_queue.get()) is not _DONE:
+                    all_repos.append(repo)
+                    if isinstance(repo, dict):
+                        yield {"Name": repo["Name"], "Url": repo["DepotHttpsUrl"]}
 
-    save_to_json(
-        org="tencent_org", all_repos=all_repos, prefix="origin_all_coding_repos"
-    )
+    yield from iter_filter_repos(_formated_repos())
 
-    formated_repos = [
-        {"Name": repo["Name"], "Url": repo["DepotHttpsUrl"]}
-        for repo in all_repos
-        if isinstance(repo, dict)
-    ]
+    get_client().print_stats()
+    if failed_projects:
+        raise RuntimeError(
+            f"获取项目 {sorted(failed_projects)} 的仓库列表失败，放弃本次运行"
+        )
+    save_listing("coding", CODING_ORG, all_repos, "origin_all_coding_repos")
 
-    return filter_repos(formated_repos)
+
+def get_all_repos_info(workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    获取用户所有项目的仓库信息
+    :param workers: 并发获取的项目数量，见 iter_all_repos_info
+    :return: 所有仓库信息列表
+    """
+    return list(iter_all_repos_info(workers))
 
 
 if __name__ == "__main__":
 
-    all_repos = get_all_repos_info(False)
+    all_repos = get_all_repos_info()
 
     print("仓库数量:", len(all_repos))
     print("所有仓库信息:", all_repos)
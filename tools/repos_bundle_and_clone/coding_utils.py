@@ -1,11 +1,13 @@
 import os
+import asyncio
 import logging
 import http.client
 import json
-import socket
+import queue
+import random
+import threading
 import time
-import sys
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv(".env.local"))
@@ -15,6 +17,13 @@ MAX_RETRIES = 3
 RETRY_DELAY = 2  # 重试延迟（秒）
 DEFAULT_TIMEOUT = 10  # 默认超时时间（秒）
 MAX_TIMEOUT = 120  # 最大超时时间（秒）
+# 表示被限流的错误类型：HTTP 429 以及 Coding API 返回的频率限制错误码
+THROTTLE_ERRORS = ("THROTTLED", "RequestLimitExceeded", "LimitExceeded")
+
+
+def is_throttled(result: Any) -> bool:
+    """判断请求结果是否为限流错误"""
+    return isinstance(result, dict) and result.get("error") in THROTTLE_ERRORS
 
 
 def get_api_token() -> str:
@@ -36,79 +45,240 @@ def validate_id(id_value: Any, id_name="ID") -> bool:
     return isinstance(id_value, int) and id_value > 0
 
 
-def make_api_request(
-    action: str, payload_data: Dict[str, Any] = None, timeout: int = 10
-) -> Tuple[bool, Dict[str, Any]]:
+class CodingApiClient:
     """
-    发送API请求
-    :param action: API动作名称
-    :param payload_data: 请求负载数据
-    :param timeout: 超时时间(秒)
-    :return: (是否成功, 响应数据)
+    Coding Open API 客户端
+    维护 keep-alive 连接池，连接失效时重新建立；网络错误、429、5xx 和限流错误码按指数退避（带抖动）重试。
+    可在多个线程之间共享，并按 action 统计请求次数、失败次数、重试次数和耗时
     """
-    if not isinstance(timeout, int) or timeout < 1 or timeout > 30:
-        timeout = 10
-
-    if payload_data is None:
-        payload_data = {}
-    elif not isinstance(payload_data, dict):
-        return False, handle_api_error(
-            "INVALID_PAYLOAD", Exception("payload_data必须是字典")
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        pool_size: int = 8,
+        max_retries: int = MAX_RETRIES,
+        retry_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ) -> None:
+        """
+        :param host: API 主机，为空时读取环境变量 CODING_API_HOST（默认 e.coding.net）
+        :param pool_size: 连接池保留的空闲连接数量，超出的连接用完即关闭
+        :param max_retries: 首次请求失败后的最大重试次数
+        :param retry_delay: 首次重试的退避时间（秒），之后逐次翻倍
+        :param max_delay: 单次退避的上限（秒）
+        """
+        self.host = host or os.getenv("CODING_API_HOST", "e.coding.net")
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_delay = max_delay
+        self._pool: "queue.LifoQueue[http.client.HTTPSConnection]" = queue.LifoQueue(
+            maxsize=pool_size
         )
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {get_api_token()}",
-    }
+    def _acquire(self, timeout: float) -> http.client.HTTPSConnection:
+        """从连接池取出空闲连接，没有时新建"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPSConnection(self.host, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock:
+            conn.sock.settimeout(timeout)
+        return conn
 
-    payload = json.dumps(payload_data)
+    def _release(self, conn: http.client.HTTPSConnection) -> None:
+        """归还连接，连接池已满时关闭"""
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
 
-    global cached_conn
-    max_retries = 3
-    retry_delay = 1
+    def close(self) -> None:
+        """关闭连接池中的全部连接"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
 
-    for attempt in range(max_retries):
-        try:
-            if not hasattr(sys, "cached_conn"):
-                sys.cached_conn = http.client.HTTPSConnection(
-                    "e.coding.net", timeout=timeout
-                )
-            conn = sys.cached_conn
-            conn.request(
-                "POST", f"/open-api/?action={action}", body=payload, headers=headers
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        delay = min(self.max_delay, self.retry_delay * 2**attempt)
+        delay *= random.uniform(0.5, 1.0)
+        # 服务端给出 Retry-After 时至少等待该时长
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.max_delay, float(retry_after)))
+        return delay
+
+    def _record(self, action: str, seconds: float, retries: int, success: bool):
+        with self._stats_lock:
+            stats = self._stats.setdefault(
+                action,
+                {"calls": 0, "errors": 0, "retries": 0, "total": 0.0, "max": 0.0},
             )
+            stats["calls"] += 1
+            stats["errors"] += 0 if success else 1
+            stats["retries"] += retries
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
 
-            response = conn.getresponse()
-            data = response.read()
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """按 action 返回请求统计：calls、errors、retries、total/max/avg 耗时（秒）"""
+        with self._stats_lock:
+            return {
+                action: dict(stats, avg=stats["total"] / stats["calls"])
+                for action, stats in self._stats.items()
+            }
 
-            if response.status != 200:
-                return False, handle_api_error(
-                    "HTTP_ERROR",
-                    Exception(f"HTTP {response.status}: {response.reason}"),
-                )
+    def print_stats(self) -> None:
+        """打印各 action 的请求统计"""
+        print(
+            "\nAPI 动作                          请求    失败    重试    平均(秒)    最大(秒)"
+        )
+        for action, stats in sorted(self.stats().items()):
+            print(
+                f"{action:<32}{stats['calls']:>6}{stats['errors']:>8}{stats['retries']:>8}"
+                f"{stats['avg']:>12.2f}{stats['max']:>12.2f}"
+            )
 
-            response_data = json.loads(data.decode("utf-8"))
+    def request(
+        self,
+        action: str,
+        payload_data: Dict[str, Any] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """
+        发送API请求
+        :param action: API动作名称
+        :param payload_data: 请求负载数据
+        :param timeout: 超时时间(秒)，上限为 MAX_TIMEOUT
+        :return: (是否成功, 响应数据)
+        """
+        if not isinstance(timeout, (int, float)) or timeout <= 0:
+            timeout = DEFAULT_TIMEOUT
+        timeout = min(timeout, MAX_TIMEOUT)
 
-            if "Response" in response_data and "Error" in response_data["Response"]:
-                error = response_data["Response"]["Error"]
-                return False, handle_api_error(
-                    error.get("Code", "API_ERROR"),
-                    Exception(error.get("Message", "Unknown API error")),
+        if payload_data is None:
+            payload_data = {}
+        elif not isinstance(payload_data, dict):
+            return False, handle_api_error(
+                "INVALID_PAYLOAD", Exception("payload_data必须是字典")
+            )
+
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {get_api_token()}",
+        }
+        payload = json.dumps(payload_data)
+
+        start = time.monotonic()
+        retries = 0
+        attempt = 0
+        # 复用的空闲连接可能已被服务端关闭，第一次遇到时直接换新连接重试，不计入重试次数
+        stale_retried = False
+
+        def _fail(error_type: str, error: Exception) -> Tuple[bool, Dict[str, Any]]:
+            self._record(action, time.monotonic() - start, retries, False)
+            return False, handle_api_error(error_type, error)
+
+        while True:
+            conn = self._acquire(timeout)
+            reused = conn.sock is not None
+            retry_after = None
+            try:
+                conn.request(
+                    "POST", f"/open-api/?action={action}", body=payload, headers=headers
                 )
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if reused and not stale_retried:
+                    stale_retried = True
+                    continue
+                error = ("NETWORK_ERROR", e)
+            else:
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+
+                if response.status == 429:
+                    error = ("THROTTLED", Exception(f"HTTP 429: {response.reason}"))
+                    retry_after = response.getheader("Retry-After")
+                elif response.status >= 500:
+                    error = (
+                        "HTTP_ERROR",
+                        Exception(f"HTTP {response.status}: {response.reason}"),
+                    )
+                elif response.status != 200:
+                    return _fail(
+                        "HTTP_ERROR",
+                        Exception(f"HTTP {response.status}: {response.reason}"),
+                    )
+                else:
+                    try:
+                        response_data = json.loads(data.decode("utf-8"))
+                    except json.JSONDecodeError as e:
+                        return _fail("JSON_PARSE_ERROR", e)
+
+                    if (
+                        "Response" in response_data
+                        and "Error" in response_data["Response"]
+                    ):
+                        api_error = response_data["Response"]["Error"]
+                        error = (
+                            api_error.get("Code", "API_ERROR"),
+                            Exception(api_error.get("Message", "Unknown API error")),
+                        )
+                        if error[0] not in THROTTLE_ERRORS:
+                            return _fail(*error)
+                    else:
+                        self._record(action, time.monotonic() - start, retries, True)
+                        return True, response_data
+
+            if attempt >= self.max_retries:
+                return _fail(*error)
+            time.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+            retries += 1
+
+    async def request_async(
+        self,
+        action: str,
+        payload_data: Dict[str, Any] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> Tuple[bool, Dict[str, Any]]:
+        """在协程中发送API请求，阻塞的网络操作在线程池中执行"""
+        return await asyncio.to_thread(self.request, action, payload_data, timeout)
+
 
-            return True, response_data
+_default_client: Optional[CodingApiClient] = None
+_default_client_lock = threading.Lock()
 
-        except (http.client.HTTPException, socket.timeout, ConnectionError) as e:
-            if attempt == max_retries - 1:
-                return False, handle_api_error("NETWORK_ERROR", e)
-            time.sleep(retry_delay)
 
-        except json.JSONDecodeError as e:
-            return False, handle_api_error("JSON_PARSE_ERROR", e)
+def get_client() -> CodingApiClient:
+    """获取进程内共享的 API 客户端，连接池大小读取环境变量 CODING_API_POOL_SIZE（默认 8）"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            try:
+                pool_size = int(os.getenv("CODING_API_POOL_SIZE", "8"))
+            except ValueError:
+                pool_size = 8
+            _default_client = CodingApiClient(pool_size=max(1, pool_size))
+        return _default_client
 
-        except Exception as e:
-            return False, handle_api_error("UNKNOWN_ERROR", e)
 
-    return False, handle_api_error(
-        "MAX_RETRIES_EXCEEDED", Exception(f"请求失败，已达到最大重试次数{max_retries}")
-    )
+def make_api_request(
+    action: str, payload_data: Dict[str, Any] = None, timeout: int = DEFAULT_TIMEOUT
+) -> Tuple[bool, Dict[str, Any]]:
+    """
+    发送API请求（通过共享的 CodingApiClient）
+    :param action: API动作名称
+    :param payload_data: 请求负载数据
+    :param timeout: 超时时间(秒)
+    :return: (是否成功, 响应数据)
+    """
+    return get_client().request(action, payload_data, timeout)
@@ -1,15 +1,46 @@
-import requests
-import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
 from dotenv import load_dotenv, find_dotenv
 
+from github_utils import ETagCache, GitHubClient, default_cache_path
 from util_filter_repos import filter_repos
-from util_repo import save_to_json
+from util_inventory import save_listing
 
 load_dotenv(find_dotenv(".env.local"))
 load_dotenv()
 
 
+def _slim_repos(current_repos: list[dict]) -> list[dict]:
+    return [
+        {
+            "id": repo["id"],
+            "name": repo["name"],
+            "full_name": repo["full_name"],
+            # "private": repo["private"],
+            "clone_url": repo["clone_url"],
+            # "html_url": repo["html_url"],
+            # 列表接口免费给出的变更时间，用于跳过上次成功处理后没有推送的仓库
+            "pushed_at": repo.get("pushed_at"),
+            "updated_at": repo.get("updated_at"),
+            # 用于按大小和语言过滤，size 的单位为 KB
+            "size": repo.get("size"),
+            "language": repo.get("language"),
+        }
+        for repo in current_repos
+        if repo["clone_url"]
+    ]
+
+
+def _last_page(links: dict[str, str] | None, page: int) -> int | None:
+    """从 Link 头读取最后一页的页码；没有 Link 头时返回 None，有 Link 但没有 last 表示当前就是最后一页"""
+    if links is None:
+        return None
+    if "last" not in links:
+        return page
+    return int(parse_qs(urlparse(links["last"]).query)["page"][0])
+
+
 # filename = f"./github_repos_{org}.json"
 def fetch_repositories_info():
     org = os.getenv("ORG_NAME")
@@ -22,52 +53,64 @@ def fetch_repositories_info():
     # print(access_token)
     # 生成带有日期的文件名
 
-    repos = []
-    page = 1
     per_page = 100  # 每页最大数量
+    # 第一页之后的页面并发获取的数量
+    try:
+        workers = max(1, int(os.getenv("GITHUB_PAGE_WORKERS", "4")))
+    except ValueError:
+        workers = 4
+    cache = ETagCache(default_cache_path())
+    client = GitHubClient(access_token, cache=cache, pool_size=workers)
+
+    def _page_url(page: int) -> str:
+        return f"{client.base_url}/orgs/{org}/repos?type=private&page={page}&per_page={per_page}"
+
+    def _fetch(page: int) -> tuple[list[dict], dict[str, str] | None]:
+        """获取一页仓库，失败时抛出异常：不完整的列表会让下游把缺失的仓库当作已删除"""
+        response, current_repos, links = client.get_json(_page_url(page))
+        if current_repos is None:
+            if response is not None:
+                print(f"Error: {response.status_code} - {response.text}")
+            raise RuntimeError(f"获取第 {page} 页仓库列表失败，放弃本次运行")
+        return current_repos, links
 
-    while True:
-        url = f"https://api.github.com/orgs/{org}/repos?type=private&page={page}&per_page={per_page}"
-        # print(url)
-
-        response = requests.get(
-            url,
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Accept": "application/vnd.github.v3+json",
-            },
-        )
-
-        if response.status_code != 200:
-            print(f"Error: {response.status_code} - {response.text}")
-            break
-
-        current_repos = response.json()
-        if not current_repos:
-            break
-        current_repos = [
-            {
-                "id": repo["id"],
-                "name": repo["name"],
-                "full_name": repo["full_name"],
-                # "private": repo["private"],
-                "clone_url": repo["clone_url"],
-                # "html_url": repo["html_url"],
-                # "updated_at": repo["updated_at"],
-            }
-            for repo in current_repos
-            if repo["clone_url"]
-        ]
-
-        repos.extend(current_repos)
-        page += 1
-
+    repos = []
+    current_repos, links = _fetch(1)
+    repos.extend(_slim_repos(current_repos))
+
+    last_page = _last_page(links, 1)
+    if last_page is not None and last_page > 1:
+        # 第一页的 Link 头给出了总页数，其余页面并发获取，结果按页码顺序合并
+        with ThreadPoolExecutor(
+            max_workers=min(workers, last_page - 1), thread_name_prefix="github-api"
+        ) as executor:
+            for current_repos, _ in executor.map(_fetch, range(2, last_page + 1)):
+                repos.extend(_slim_repos(current_repos))
+    elif last_page is None:
+        # 没有 Link 头（如本地模拟服务器）时逐页获取，取到不满一页为止
+        page = 1
+        while current_repos and len(current_repos) >= per_page:
+            page += 1
+            current_repos, _ = _fetch(page)
+            if not current_repos:
+                break
+            repos.extend(_slim_repos(current_repos))
+
+    cache.save()
+    client.print_stats()
     print(f"Total private repos: {len(repos)}")
 
-    save_to_json(org, repos, "origin_all_github_repos")
+    save_listing("github", org, repos, "origin_all_github_repos")
 
     formated_repos = [
-        {"Name": repo["name"], "Url": repo["clone_url"]}
+        {
+            "Name": repo["name"],
+            "Url": repo["clone_url"],
+            "PushedAt": repo["pushed_at"],
+            "UpdatedAt": repo["updated_at"],
+            "Size": repo.get("size"),
+            "Language": repo.get("language"),
+        }
         for repo in repos
         if isinstance(repo, dict)
     ]
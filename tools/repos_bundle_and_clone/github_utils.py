@@ -0,0 +1,204 @@
+"""
+GitHub REST API 客户端
+
+通过 requests.Session 复用连接，并把每个页面 URL 的 ETag / Last-Modified 和响应内容缓存到本地文件。
+再次请求时携带 If-None-Match / If-Modified-Since，未变化的页面返回 304，不计入 GitHub 的速率限制。
+触发速率限制时等待到重置时间后重试，而不是把错误当作列表结束。
+API 地址可通过环境变量 GITHUB_API_URL 指向本地的模拟服务器，便于离线测试。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GITHUB_API_URL = "https://api.github.com"
+
+_LINK_PATTERN = re.compile(r'<([^>]+)>;\s*rel="([^"]+)"')
+
+
+def parse_link_header(value: str | None) -> dict[str, str] | None:
+    """解析 Link 响应头为 {rel: url}，没有 Link 头时返回 None"""
+    if value is None:
+        return None
+    return {rel: url for url, rel in _LINK_PATTERN.findall(value)}
+
+
+def default_cache_path() -> str:
+    """ETag 缓存文件，默认与仓库列表快照一起保存在 repos 目录"""
+    return os.getenv("GITHUB_ETAG_CACHE") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "repos", "github_etag_cache.json"
+    )
+
+
+class ETagCache:
+    """按 URL 保存 ETag、Last-Modified 和响应内容的本地缓存"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries: dict[str, dict] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._entries = {}
+
+    def get(self, url: str) -> dict | None:
+        with self._lock:
+            return self._entries.get(url)
+
+    def put(
+        self,
+        url: str,
+        etag: str | None,
+        last_modified: str | None,
+        body: Any,
+        link: str | None = None,
+    ) -> None:
+        # 304 响应不一定带 Link 头，一并缓存以便继续按页并发获取
+        with self._lock:
+            self._entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "body": body,
+                "link": link,
+            }
+
+    def save(self) -> None:
+        """写入缓存文件，先写临时文件再替换"""
+        with self._lock:
+            entries = dict(self._entries)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            print(f"保存 ETag 缓存失败: {e}")
+
+
+class GitHubClient:
+    """带条件请求缓存和速率限制等待的 GitHub API 客户端"""
+
+    def __init__(
+        self,
+        token: str,
+        base_url: str | None = None,
+        cache: ETagCache | None = None,
+        timeout: float = 30,
+        max_retries: int = 3,
+        pool_size: int = 10,
+    ) -> None:
+        """
+        :param token: 访问令牌
+        :param base_url: API 地址，为空时读取环境变量 GITHUB_API_URL（默认 https://api.github.com）
+        :param cache: ETag 缓存，为空时不发送条件请求
+        :param timeout: 单次请求超时时间（秒）
+        :param max_retries: 5xx 和网络错误的最大重试次数
+        :param pool_size: 每个主机保留的 keep-alive 连接数量，应不小于并发请求数
+        """
+        self.base_url = (
+            base_url or os.getenv("GITHUB_API_URL") or GITHUB_API_URL
+        ).rstrip("/")
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github.v3+json",
+            }
+        )
+        self.stats = {"requests": 0, "not_modified": 0, "rate_limited": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _rate_limit_wait(response: requests.Response) -> float | None:
+        """触发速率限制时返回需要等待的秒数，否则返回 None"""
+        if response.status_code not in (403, 429):
+            return None
+        # 次级速率限制给出 Retry-After，主速率限制给出剩余次数和重置时间
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = int(response.headers.get("X-RateLimit-Reset", "0"))
+            return max(1.0, reset - time.time() + 1)
+        return None
+
+    def get_json(
+        self, url: str
+    ) -> tuple[requests.Response | None, Any, dict[str, str] | None]:
+        """
+        GET 请求并解析 JSON，页面未变化（304）时返回缓存的内容
+        :param url: 完整的请求地址（包含查询参数，作为缓存键）
+        :return: (响应, JSON 内容, Link 头解析结果)；请求失败时内容为 None，没有 Link 头时为 None
+        """
+        headers = {}
+        cached = self.cache.get(url) if self.cache else None
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt >= self.max_retries:
+                    print(f"请求失败: {url} - {e}")
+                    return None, None, None
+                attempt += 1
+                time.sleep(2**attempt)
+                continue
+            self._count("requests")
+
+            if response.status_code == 304 and cached:
+                self._count("not_modified")
+                link = response.headers.get("Link") or cached.get("link")
+                return response, cached["body"], parse_link_header(link)
+
+            wait = self._rate_limit_wait(response)
+            if wait is not None:
+                self._count("rate_limited")
+                print(f"触发 GitHub 速率限制，等待 {wait:.0f} 秒后重试")
+                time.sleep(wait)
+                continue
+
+            if response.status_code >= 500 and attempt < self.max_retries:
+                attempt += 1
+                time.sleep(2**attempt)
+                continue
+
+            if response.status_code != 200:
+                return response, None, None
+
+            body = response.json()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            link = response.headers.get("Link")
+            if self.cache and (etag or last_modified):
+                self.cache.put(url, etag, last_modified, body, link)
+            return response, body, parse_link_header(link)
+
+    def print_stats(self) -> None:
+        print(
+            f"GitHub API 请求 {self.stats['requests']} 次，"
+            f"其中 {self.stats['not_modified']} 个页面未变化（304），"
+            f"速率限制等待 {self.stats['rate_limited']} 次"
+        )
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 工具脚本以平铺模块的方式互相导入，测试时把工具目录加入导入路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,121 @@
+"""增量 bundle 链：导入增量后引用位于链尾，之后的 fetch 不再重新下载增量中的对象"""
+
+import os
+import subprocess
+
+from util_bundle_chain import (
+    create_delta_bundle,
+    new_delta_filename,
+    read_repo_refs,
+    restore_bundle_chain,
+    save_chain,
+    unbundle_deltas,
+)
+from util_bundle_writer import write_bundle
+
+_ENV = {
+    "GIT_AUTHOR_NAME": "test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+}
+
+
+def _git(cwd, *args):
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        env={**os.environ, **_ENV},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def _commit(repo, name):
+    with open(os.path.join(repo, name), "w") as f:
+        f.write(name)
+    _git(repo, "add", name)
+    _git(repo, "commit", "-q", "-m", name)
+
+
+def _build_chain(tmp_path):
+    """源仓库先打完整 bundle，再提交两次，每次写一个增量 bundle"""
+    source = str(tmp_path / "source")
+    mirror = str(tmp_path / "mirror.git")
+    output_dir = str(tmp_path / "bundles")
+    os.makedirs(output_dir)
+    _git(tmp_path, "init", "-q", "-b", "main", source)
+    _commit(source, "a")
+    _git(tmp_path, "clone", "-q", "--mirror", source, mirror)
+
+    success, error_msg, _ = write_bundle(
+        mirror, os.path.join(output_dir, "repo_full.bundle"), ["--all"]
+    )
+    assert success, error_msg
+    links = [
+        {"type": "full", "file": "repo_full.bundle", "refs": read_repo_refs(mirror)[1]}
+    ]
+
+    for name in ("b", "c"):
+        _commit(source, name)
+        _git(mirror, "fetch", "-q", "origin", "+refs/heads/*:refs/heads/*")
+        filename = new_delta_filename(output_dir, "repo", "20260101_000000")
+        success, error_msg, info = create_delta_bundle(
+            mirror, os.path.join(output_dir, filename), links[-1]["refs"]
+        )
+        assert success and info, error_msg
+        links.append(
+            {"type": "delta", "file": filename, "refs": read_repo_refs(mirror)[1]}
+        )
+    save_chain(output_dir, "repo", links)
+    return source, output_dir, links
+
+
+def test_new_delta_filename_does_not_overwrite_same_second(tmp_path):
+    _, output_dir, links = _build_chain(tmp_path)
+    assert [link["file"] for link in links[1:]] == [
+        "repo_20260101_000000.delta.bundle",
+        "repo_20260101_000000_2.delta.bundle",
+    ]
+    assert new_delta_filename(output_dir, "repo", "20260101_000000") == (
+        "repo_20260101_000000_3.delta.bundle"
+    )
+
+
+def test_unbundle_deltas_moves_refs_to_chain_tip(tmp_path):
+    source, output_dir, links = _build_chain(tmp_path)
+    repo = str(tmp_path / "work.git")
+    _git(
+        tmp_path,
+        "clone",
+        "-q",
+        "--bare",
+        os.path.join(output_dir, links[0]["file"]),
+        repo,
+    )
+
+    success, error_msg = unbundle_deltas(repo, output_dir, links)
+    assert success, error_msg
+    assert read_repo_refs(repo)[1] == links[-1]["refs"]
+
+    # 引用已在链尾，fetch 协商不会把增量中的对象当作缺失重新下载
+    _git(repo, "remote", "set-url", "origin", source)
+    _git(repo, "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*")
+    result = subprocess.run(
+        ["git", "fetch", "origin"], cwd=repo, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Receiving objects" not in result.stderr
+    assert read_repo_refs(repo)[1] == links[-1]["refs"]
+
+
+def test_restore_bundle_chain(tmp_path):
+    source, output_dir, links = _build_chain(tmp_path)
+    target = str(tmp_path / "restored.git")
+
+    success, error_msg = restore_bundle_chain(output_dir, "repo", target)
+    assert success, error_msg
+    assert read_repo_refs(target)[1] == links[-1]["refs"]
+    assert _git(target, "log", "--format=%s", "main").split() == ["c", "b", "a"]
+    _git(target, "fsck", "--no-progress")
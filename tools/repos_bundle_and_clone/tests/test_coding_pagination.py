@@ -0,0 +1,110 @@
+"""Coding 仓库列表的翻页停止条件"""
+
+import pytest
+
+import coding_repos_info
+from coding_repos_info import iter_repositories_info
+
+
+def _fake_api(monkeypatch, pages, total_pages=None):
+    """pages 为每页返回的仓库 Id 列表，超出范围的页码返回空列表；返回实际请求过的页码"""
+    requested = []
+
+    def fetch(project_id, page_number, page_size):
+        requested.append(page_number)
+        ids = (
+            pages(page_number)
+            if callable(pages)
+            else (pages[page_number - 1] if page_number <= len(pages) else [])
+        )
+        return [{"Id": i, "Name": f"r{i}"} for i in ids], total_pages
+
+    monkeypatch.setattr(coding_repos_info, "fetch_repositories_page", fetch)
+    return requested
+
+
+def _ids(**kwargs):
+    return [repo["Id"] for repo in iter_repositories_info(1, page_size=2, **kwargs)]
+
+
+def test_stops_at_total_pages(monkeypatch):
+    requested = _fake_api(monkeypatch, [[1, 2], [3, 4], [5, 6]], total_pages=2)
+    assert _ids() == [1, 2, 3, 4]
+    assert requested == [1, 2]
+
+
+def test_stops_at_short_page_without_total(monkeypatch):
+    requested = _fake_api(monkeypatch, [[1, 2], [3]])
+    assert _ids() == [1, 2, 3]
+    assert requested == [1, 2]
+
+
+def test_exact_multiple_of_page_size_stops_at_empty_page(monkeypatch):
+    requested = _fake_api(monkeypatch, [[1, 2], [3, 4]])
+    assert _ids() == [1, 2, 3, 4]
+    assert requested == [1, 2, 3]
+
+
+def test_api_ignoring_page_number_stops_without_duplicates(monkeypatch):
+    requested = _fake_api(monkeypatch, lambda page_number: [1, 2])
+    assert _ids() == [1, 2]
+    assert requested == [1, 2]
+
+
+def test_api_ignoring_page_size_stops_after_first_page(monkeypatch):
+    requested = _fake_api(monkeypatch, lambda page_number: [1, 2, 3, 4, 5])
+    assert _ids() == [1, 2, 3, 4, 5]
+    assert requested == [1]
+
+
+@pytest.mark.parametrize("total_pages", [None, 10**6])
+def test_page_limit(monkeypatch, total_pages):
+    monkeypatch.setattr(coding_repos_info, "MAX_PAGES", 5)
+    requested = _fake_api(
+        monkeypatch,
+        lambda page_number: [2 * page_number, 2 * page_number + 1],
+        total_pages=total_pages,
+    )
+    assert len(_ids()) == 10
+    assert requested == [1, 2, 3, 4, 5]
+
+
+def test_error_stops_and_is_reported(monkeypatch):
+    error = {"error": "boom"}
+    monkeypatch.setattr(
+        coding_repos_info,
+        "fetch_repositories_page",
+        lambda project_id, page_number, page_size: (
+            ([{"Id": 1}, {"Id": 2}], None) if page_number == 1 else (error, None)
+        ),
+    )
+    errors = []
+    assert _ids(errors=errors) == [1, 2]
+    assert errors == [error]
+
+
+def test_failed_project_aborts_listing_after_other_projects(monkeypatch):
+    monkeypatch.setattr(coding_repos_info, "get_project_ids", lambda: [1, 2, 3])
+    monkeypatch.setattr(
+        coding_repos_info,
+        "fetch_repositories_page",
+        lambda project_id, page_number, page_size: (
+            ({"error": "boom"}, None)
+            if project_id == 2
+            else (
+                [{"Id": project_id, "Name": f"r{project_id}", "DepotHttpsUrl": ""}],
+                1,
+            )
+        ),
+    )
+    saved = []
+    monkeypatch.setattr(
+        coding_repos_info, "save_listing", lambda *args: saved.append(args)
+    )
+    names = []
+    with pytest.raises(RuntimeError):
+        for repo in coding_repos_info.iter_all_repos_info(workers=2):
+            names.append(repo["Name"])
+    assert names == ["r1", "r3"]
+    # 不完整的列表不写入仓库清单
+    assert saved == []
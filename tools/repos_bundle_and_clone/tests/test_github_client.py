@@ -0,0 +1,128 @@
+"""GitHubClient 的条件请求缓存和速率限制等待，使用本地 http.server 模拟 GitHub API"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import github_utils
+from github_repo_list import _last_page
+from github_utils import ETagCache, GitHubClient
+
+_REPOS = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}]
+
+
+class _GitHubStub(BaseHTTPRequestHandler):
+    """按 server.responses 依次返回预设的 (状态码, 响应头, 内容)，并记录收到的请求头"""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        status, headers, body = self.server.responses.pop(0)
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _GitHubStub)
+    httpd.requests = []
+    httpd.responses = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("GITHUB_API_URL", f"http://127.0.0.1:{httpd.server_port}/")
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(github_utils.time, "sleep", calls.append)
+    return calls
+
+
+def _url(client, page=1):
+    return f"{client.base_url}/orgs/org/repos?type=private&page={page}&per_page=2"
+
+
+def _link(client, last):
+    return f'<{_url(client, 2)}>; rel="next", <{_url(client, last)}>; rel="last"'
+
+
+def test_base_url_from_environment(server):
+    client = GitHubClient("token")
+    assert client.base_url == f"http://127.0.0.1:{server.server_port}"
+
+
+def test_200_stores_etag_and_link(server, tmp_path):
+    cache = ETagCache(str(tmp_path / "etag.json"))
+    client = GitHubClient("token", cache=cache)
+    url = _url(client)
+    server.responses.append((200, {"ETag": '"v1"', "Link": _link(client, 3)}, _REPOS))
+
+    response, body, links = client.get_json(url)
+    assert response.status_code == 200
+    assert body == _REPOS
+    assert _last_page(links, 1) == 3
+    assert server.requests[0]["Authorization"] == "Bearer token"
+
+    cache.save()
+    entry = ETagCache(cache.path).get(url)
+    assert entry["etag"] == '"v1"'
+    assert entry["link"] == _link(client, 3)
+    assert entry["body"] == _REPOS
+
+
+def test_304_returns_cached_body_and_page_count(server, tmp_path):
+    cache = ETagCache(str(tmp_path / "etag.json"))
+    client = GitHubClient("token", cache=cache)
+    url = _url(client)
+    server.responses.append((200, {"ETag": '"v1"', "Link": _link(client, 3)}, _REPOS))
+    client.get_json(url)
+
+    # 304 响应不带 Link 头时使用缓存的 Link
+    server.responses.append((304, {"ETag": '"v1"'}, None))
+    response, body, links = client.get_json(url)
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+    assert response.status_code == 304
+    assert body == _REPOS
+    assert _last_page(links, 1) == 3
+    assert client.stats == {"requests": 2, "not_modified": 1, "rate_limited": 0}
+
+
+def test_rate_limit_sleeps_and_retries(server, sleeps, monkeypatch):
+    monkeypatch.setattr(github_utils.time, "time", lambda: 1000.0)
+    client = GitHubClient("token")
+    server.responses += [
+        (403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1030"}, {}),
+        (429, {"Retry-After": "7"}, {}),
+        (200, {}, _REPOS),
+    ]
+
+    response, body, links = client.get_json(_url(client))
+    assert response.status_code == 200
+    assert body == _REPOS
+    assert links is None
+    assert sleeps == [31.0, 7.0]
+    assert client.stats["rate_limited"] == 2
+    assert len(server.requests) == 3
+
+
+def test_error_without_rate_limit_is_not_retried(server, sleeps):
+    client = GitHubClient("token")
+    server.responses.append((404, {}, {"message": "Not Found"}))
+
+    response, body, _ = client.get_json(_url(client))
+    assert response.status_code == 404
+    assert body is None
+    assert sleeps == []
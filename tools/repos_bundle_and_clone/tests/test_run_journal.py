@@ -0,0 +1,74 @@
+"""运行日志的续跑语义"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+from util_run_journal import JOURNAL_FILE, RunJournal
+
+
+def _interrupted(output_dir, pipeline="bundle"):
+    """模拟上次运行中途被终止：写入记录后不调用 finish"""
+    journal = RunJournal(output_dir, pipeline, resume=False)
+    journal.record("a", "success", "fp-a")
+    journal.record("b", "skipped", "fp-b")
+    journal.record("c", "failed", "fp-c")
+    journal._file.close()
+    return journal.path
+
+
+def test_resume_skips_only_unchanged_completed_repos(tmp_path):
+    _interrupted(str(tmp_path))
+    journal = RunJournal(str(tmp_path), resume=True)
+    assert journal.is_completed("a", "fp-a")
+    assert journal.is_completed("b", "fp-b")
+    # 失败的仓库、上次之后又有推送的仓库、没有指纹的记录都重新处理
+    assert not journal.is_completed("c", "fp-c")
+    assert not journal.is_completed("a", "fp-a-pushed")
+    assert not journal.is_completed("d", None)
+
+
+def test_later_failure_overrides_earlier_success(tmp_path):
+    journal = RunJournal(str(tmp_path), resume=False)
+    journal.record("a", "success", "fp-a")
+    journal.record("a", "failed", "fp-a")
+    journal._file.close()
+    assert not RunJournal(str(tmp_path), resume=True).has_entry("a")
+
+
+def test_resume_disabled_starts_over(tmp_path):
+    _interrupted(str(tmp_path))
+    journal = RunJournal(str(tmp_path), resume=False)
+    assert not journal.completed
+    journal._file.close()
+    with open(journal.path, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f][1:] == []
+
+
+def test_expired_journal_is_ignored(tmp_path, monkeypatch):
+    path = _interrupted(str(tmp_path))
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    started_at = (datetime.now() - timedelta(hours=3)).isoformat(timespec="seconds")
+    lines[0] = json.dumps({"started_at": started_at}) + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+    monkeypatch.setenv("BUNDLE_RESUME_MAX_HOURS", "2")
+    assert not RunJournal(str(tmp_path), resume=True).completed
+
+
+def test_pipelines_do_not_share_journals(tmp_path):
+    _interrupted(str(tmp_path), "github_org")
+    other = RunJournal(str(tmp_path), "coding_org", resume=True)
+    assert not other.completed
+    other.finish()
+    assert os.path.exists(tmp_path / JOURNAL_FILE.format(pipeline="github_org"))
+
+
+def test_finish_removes_journal(tmp_path):
+    journal = RunJournal(str(tmp_path), resume=True)
+    journal.record("a", "success", "fp-a")
+    journal.finish()
+    assert not os.path.exists(journal.path)
+    assert not RunJournal(str(tmp_path), resume=True).completed
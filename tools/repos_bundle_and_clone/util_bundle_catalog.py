@@ -0,0 +1,159 @@
+"""
+bundle 目录索引
+
+每次运行开始时只列出一次输出目录，按文件名 {repo_name}_{YYYYmmdd_HHMMSS}.bundle 解析出仓库名和时间戳
+（同一秒内创建的增量 bundle 带序号 _{n}，见 util_bundle_chain.new_delta_filename），
+建立仓库名到 bundle 文件的索引，处理每个仓库时直接查找，不再逐个仓库列目录、逐个文件读取修改时间。
+文件名中的时间戳即创建时间，按它排序得到最新的 bundle，不需要 stat。
+按完整的文件名格式解析仓库名，仓库 foo 不会再匹配到仓库 foo_bar 的 bundle。
+
+处理过程中新建和删除的 bundle 同步更新索引，可在多个打包线程之间共享。
+建立索引时报告：
+    重复   同一仓库有多个完整 bundle（不在 bundle 链中），只有最新的一个会被使用
+    孤立   不符合命名格式的 bundle、不属于任何 bundle 链的增量 bundle、没有对应 bundle 的清单文件
+"""
+
+import os
+import re
+import threading
+
+from util_bundle_chain import CHAIN_SUFFIX, DELTA_SUFFIX, chain_files, load_chain
+from util_bundle_writer import SIDECAR_SUFFIX
+
+_BUNDLE_PATTERN = re.compile(
+    r"^(?P<name>.+)_(?P<timestamp>\d{8}_\d{6}(?:_\d+)?)(?P<delta>\.delta)?\.bundle$"
+)
+
+
+class BundleCatalog:
+    """输出目录中 bundle 文件的索引"""
+
+    def __init__(self, output_dir: str) -> None:
+        self.output_dir = os.path.abspath(output_dir)
+        self._lock = threading.Lock()
+        # 仓库名 -> [(时间戳, 文件名)]，按时间戳从新到旧排列
+        self._full: dict[str, list[tuple[str, str]]] = {}
+        self._chains: set[str] = set()
+        self._deltas: dict[str, list[str]] = {}
+        self.orphans: list[str] = []
+        self._scan()
+
+    def _scan(self) -> None:
+        try:
+            names = os.listdir(self.output_dir)
+        except FileNotFoundError:
+            return
+        files = set(names)
+        for file in names:
+            if file.endswith(CHAIN_SUFFIX):
+                self._chains.add(file[: -len(CHAIN_SUFFIX)])
+            elif file.endswith(f".bundle{SIDECAR_SUFFIX}"):
+                if file[: -len(SIDECAR_SUFFIX)] not in files:
+                    self.orphans.append(file)
+            elif file.endswith(".bundle"):
+                match = _BUNDLE_PATTERN.match(file)
+                if not match:
+                    self.orphans.append(file)
+                elif match["delta"]:
+                    self._deltas.setdefault(match["name"], []).append(file)
+                else:
+                    self._full.setdefault(match["name"], []).append(
+                        (match["timestamp"], file)
+                    )
+        for bundles in self._full.values():
+            bundles.sort(reverse=True)
+
+        # 增量 bundle 只有链清单引用时才能使用
+        for name, deltas in self._deltas.items():
+            chained = (
+                set(chain_files(load_chain(self.output_dir, name)))
+                if name in self._chains
+                else set()
+            )
+            self.orphans.extend(file for file in deltas if file not in chained)
+
+    def __len__(self) -> int:
+        return len(self._full)
+
+    def has_chain(self, repo_name: str) -> bool:
+        """仓库是否有 bundle 链清单，没有时不需要再尝试读取"""
+        with self._lock:
+            return repo_name in self._chains
+
+    def full_bundles(self, repo_name: str) -> list[str]:
+        """仓库的完整 bundle 路径，最新的在前"""
+        with self._lock:
+            return [
+                os.path.join(self.output_dir, file)
+                for _, file in self._full.get(repo_name, [])
+            ]
+
+    def latest(self, repo_name: str) -> str | None:
+        """仓库最新的完整 bundle 路径，没有时返回 None"""
+        with self._lock:
+            bundles = self._full.get(repo_name)
+            return os.path.join(self.output_dir, bundles[0][1]) if bundles else None
+
+    def add(self, bundle_path: str) -> None:
+        """登记新建的 bundle（增量 bundle 由链清单管理，不登记）"""
+        match = _BUNDLE_PATTERN.match(os.path.basename(bundle_path))
+        if not match or match["delta"]:
+            return
+        with self._lock:
+            bundles = self._full.setdefault(match["name"], [])
+            entry = (match["timestamp"], match.group(0))
+            if entry not in bundles:
+                bundles.append(entry)
+                bundles.sort(reverse=True)
+
+    def remove(self, bundle_path: str) -> None:
+        """移除已删除的 bundle"""
+        match = _BUNDLE_PATTERN.match(os.path.basename(bundle_path))
+        if not match:
+            return
+        with self._lock:
+            bundles = self._full.get(match["name"], [])
+            entry = (match["timestamp"], match.group(0))
+            if entry in bundles:
+                bundles.remove(entry)
+
+    def set_chain(self, repo_name: str, exists: bool) -> None:
+        with self._lock:
+            if exists:
+                self._chains.add(repo_name)
+            else:
+                self._chains.discard(repo_name)
+
+    def duplicates(self) -> dict[str, list[str]]:
+        """有多个完整 bundle 的仓库（链中的完整 bundle 由链清单管理，不算重复）"""
+        with self._lock:
+            return {
+                name: [file for _, file in bundles]
+                for name, bundles in self._full.items()
+                if len(bundles) > 1 and name not in self._chains
+            }
+
+    def repo_names(self) -> set[str]:
+        with self._lock:
+            return {name for name, bundles in self._full.items() if bundles}
+
+    def print_report(self, limit: int = 10) -> None:
+        """打印索引统计以及重复和孤立的 bundle"""
+        duplicates = self.duplicates()
+        print(
+            f"bundle 索引: {len(self.repo_names())} 个仓库，"
+            f"{len(self._chains)} 条bundle链，"
+            f"重复 {len(duplicates)} 个仓库，孤立文件 {len(self.orphans)} 个"
+        )
+        for name, files in list(duplicates.items())[:limit]:
+            print(f"  重复: {name} 有 {len(files)} 个完整bundle，将使用 {files[0]}")
+        for file in self.orphans[:limit]:
+            print(f"  孤立: {file}")
+
+    def print_untouched(self, processed: set[str], limit: int = 10) -> None:
+        """打印输出目录中有 bundle、但不在本次仓库列表中的仓库（可能已被删除或改名）"""
+        untouched = sorted(self.repo_names() - processed)
+        if untouched:
+            shown = ", ".join(untouched[:limit])
+            more = f" 等 {len(untouched)} 个" if len(untouched) > limit else ""
+            print(f"不在本次仓库列表中、但有bundle的仓库: {shown}{more}")
@@ -0,0 +1,231 @@
+"""
+增量 bundle 链
+
+增量模式下每个仓库在输出目录中维护一条 bundle 链：
+第一个节点是包含全部历史的完整 bundle，之后每次运行只写入
+<上次打包时的引用>..<当前引用> 之间新增对象的增量 bundle。
+链的清单保存在 {repo_name}.chain.json 中，记录每个节点的文件和打包时的全部引用，
+恢复时按顺序重放整条链，并以最后一个节点记录的引用为准。
+"""
+
+import json
+import os
+import sys
+
+from util_bundle_writer import load_sidecar, remove_bundle, write_bundle, write_sidecar
+from util_run_command import run_command, run_command_return_std
+
+CHAIN_SUFFIX = ".chain.json"
+DELTA_SUFFIX = ".delta.bundle"
+
+
+def chain_path(output_dir: str, repo_name: str) -> str:
+    """bundle 链清单与 bundle 文件保存在同一目录"""
+    return os.path.join(output_dir, f"{repo_name}{CHAIN_SUFFIX}")
+
+
+def load_chain(output_dir: str, repo_name: str) -> list[dict] | None:
+    """
+    读取仓库的 bundle 链
+    :return: 链节点列表，每个节点包含 type（full/delta/refs）、file 和 refs；不存在或损坏时返回 None
+    """
+    try:
+        with open(chain_path(output_dir, repo_name), "r", encoding="utf-8") as f:
+            links = json.load(f).get("links")
+    except (OSError, json.JSONDecodeError, AttributeError):
+        return None
+    if not links or links[0].get("type") != "full":
+        return None
+    return links
+
+
+def save_chain(output_dir: str, repo_name: str, links: list[dict]) -> None:
+    """保存 bundle 链清单，先写临时文件再替换"""
+    path = chain_path(output_dir, repo_name)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"links": links}, f, indent=2, ensure_ascii=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def chain_files(links: list[dict] | None) -> list[str]:
+    """链中实际存在 bundle 文件的节点文件名"""
+    return [link["file"] for link in links or [] if link.get("file")]
+
+
+def remove_chain_files(output_dir: str, files: list[str]) -> None:
+    """删除已被新的完整 bundle 取代的链文件"""
+    for file in files:
+        try:
+            remove_bundle(os.path.join(output_dir, file))
+            print(f"  已删除旧bundle链文件: {file}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"  删除旧bundle链文件失败: {file}, 错误: {e}")
+
+
+def _parse_refs(output: str) -> dict[str, str]:
+    refs = {}
+    for line in output.splitlines():
+        parts = line.strip().split(" ", 1)
+        if len(parts) == 2 and parts[1] != "HEAD":
+            refs[parts[1]] = parts[0]
+    return refs
+
+
+def read_repo_refs(repo_dir: str) -> tuple[bool, dict[str, str] | str]:
+    """读取仓库中的全部引用（与 git bundle create --all 的范围一致）"""
+    success, output = run_command_return_std(
+        ["git", "for-each-ref", "--format=%(objectname) %(refname)"], 60, cwd=repo_dir
+    )
+    if not success:
+        return False, output
+    return True, _parse_refs(output)
+
+
+def read_bundle_refs(bundle_path: str) -> tuple[bool, dict[str, str] | str]:
+    """读取 bundle 文件中记录的引用，有清单文件（见 util_bundle_writer）时直接读取清单"""
+    manifest = load_sidecar(bundle_path)
+    if manifest and isinstance(manifest.get("refs"), dict):
+        return True, manifest["refs"]
+    success, output = run_command_return_std(
+        ["git", "bundle", "list-heads", bundle_path], 300
+    )
+    if not success:
+        return False, output
+    return True, _parse_refs(output)
+
+
+def new_delta_filename(output_dir: str, repo_name: str, timestamp: str) -> str:
+    """增量 bundle 文件名，同一秒内创建多个时追加序号，不覆盖链中已有的文件"""
+    filename = f"{repo_name}_{timestamp}{DELTA_SUFFIX}"
+    seq = 1
+    while os.path.exists(os.path.join(output_dir, filename)):
+        seq += 1
+        filename = f"{repo_name}_{timestamp}_{seq}{DELTA_SUFFIX}"
+    return filename
+
+
+def update_refs(repo_dir: str, refs: dict[str, str]) -> tuple[bool, str]:
+    """把仓库引用更新为 refs 中记录的提交"""
+    updates = "".join(f"update {ref} {sha}\n" for ref, sha in sorted(refs.items()))
+    return run_command_return_std(
+        ["git", "update-ref", "--stdin"], 300, cwd=repo_dir, input=updates
+    )
+
+
+def unbundle_deltas(
+    repo_dir: str, output_dir: str, links: list[dict]
+) -> tuple[bool, str]:
+    """
+    按顺序把链中的增量 bundle 对象导入仓库，再把引用更新为链中最后一个节点记录的引用
+    （git bundle unbundle 不修改引用，引用仍停留在基础 bundle 时，之后 fetch 协商会把增量中的对象当作缺失重新下载）
+    """
+    for link in links:
+        if link.get("type") != "delta":
+            continue
+        print(f"  正在导入增量bundle... {link['file']}")
+        success, error_msg = run_command_return_std(
+            ["git", "bundle", "unbundle", os.path.join(output_dir, link["file"])],
+            900,
+            cwd=repo_dir,
+        )
+        if not success:
+            return False, error_msg
+    success, error_msg = update_refs(repo_dir, links[-1]["refs"])
+    if not success:
+        return False, f"更新引用失败: {error_msg}"
+    return True, ""
+
+
+def create_delta_bundle(
+    repo_dir: str, bundle_path: str, base_refs: dict[str, str]
+) -> tuple[bool, str, dict | None]:
+    """
+    创建只包含 base_refs 之后新增对象的增量 bundle，并写入清单文件
+    :param repo_dir: 已包含 base_refs 全部对象的仓库目录
+    :param bundle_path: 增量 bundle 路径
+    :param base_refs: 上一个链节点记录的引用
+    :return: (是否成功, 错误信息, 写入信息（大小和校验和，见 util_bundle_writer.write_bundle）)；
+        没有新对象时不写文件，写入信息为 None
+    """
+    # 上次的引用可能已被强制推送覆盖，仓库中不存在的对象不能作为排除条件
+    shas = sorted(set(base_refs.values()))
+    success, output = run_command_return_std(
+        ["git", "cat-file", "--batch-check=%(objectname)"],
+        300,
+        cwd=repo_dir,
+        input="".join(f"{sha}\n" for sha in shas),
+    )
+    if not success:
+        return False, output, None
+    # 缺失的对象输出为 "<sha> missing"
+    present = [line for line in output.splitlines() if " " not in line.strip()]
+    # 引用较多时命令行可能过长，排除条件通过标准输入传给 git
+    exclusions = "".join(f"^{sha}\n" for sha in present)
+    success, error_msg, info = write_bundle(
+        repo_dir, bundle_path, ["--all", "--stdin"], input=exclusions
+    )
+    if success:
+        success, refs = read_repo_refs(repo_dir)
+        write_sidecar(bundle_path, info, refs if success else {}, "delta")
+        return True, "", info
+    if "empty bundle" in error_msg:
+        # 只有引用删除或回退，没有新对象
+        return True, "", None
+    return False, error_msg, None
+
+
+def restore_bundle_chain(
+    output_dir: str, repo_name: str, target_dir: str
+) -> tuple[bool, str]:
+    """
+    按顺序重放 bundle 链，恢复为裸仓库
+    :param output_dir: bundle 输出目录
+    :param repo_name: 仓库名
+    :param target_dir: 恢复的目标目录（将初始化为裸仓库）
+    :return: (是否成功, 错误信息)
+    """
+    output_dir = os.path.abspath(output_dir)
+    links = load_chain(output_dir, repo_name)
+    if not links:
+        return False, f"未找到仓库 {repo_name} 的bundle链清单"
+
+    os.makedirs(target_dir, exist_ok=True)
+    success, error_msg = run_command(
+        ["git", "init", "--bare", "--quiet", target_dir], 60
+    )
+    if not success:
+        return False, error_msg
+
+    for i, link in enumerate(links, 1):
+        if not link.get("file"):
+            continue
+        print(f"[{i}/{len(links)}] 正在导入: {link['file']}")
+        success, error_msg = run_command_return_std(
+            ["git", "bundle", "unbundle", os.path.join(output_dir, link["file"])],
+            900,
+            cwd=target_dir,
+        )
+        if not success:
+            return False, f"导入 {link['file']} 失败: {error_msg}"
+
+    # 引用以链中最后一个节点记录的为准
+    refs = links[-1]["refs"]
+    success, error_msg = update_refs(target_dir, refs)
+    if not success:
+        return False, f"更新引用失败: {error_msg}"
+    print(f"恢复完成: {target_dir}，共 {len(refs)} 个引用")
+    return True, ""
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print(
+            "用法: python util_bundle_chain.py <bundle输出目录> <仓库名> <恢复目标目录>"
+        )
+        sys.exit(1)
+    success, error_msg = restore_bundle_chain(sys.argv[1], sys.argv[2], sys.argv[3])
+    if not success:
+        print(error_msg)
+        sys.exit(1)
@@ -1,30 +1,206 @@
-import json
 import os
 import sys
 import tempfile
+import threading
 import time
+from collections.abc import Iterable, Sized
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime
 
-from util_run_command import fetch_repository, run_command
-from util_repo import cleanup_temp_dir, mkdtemp_chdir
+from util_bundle_catalog import BundleCatalog
+from util_bundle_writer import (
+    remove_bundle,
+    sweep_partial_files,
+    write_bundle,
+    write_sidecar,
+)
+from util_bundle_chain import (
+    chain_files,
+    chain_path,
+    create_delta_bundle,
+    load_chain,
+    new_delta_filename,
+    read_bundle_refs,
+    read_repo_refs,
+    remove_chain_files,
+    save_chain,
+    unbundle_deltas,
+)
+from util_dedup_store import DedupStore, print_dedup_ratio
+from util_disk_scheduler import DiskScheduler, is_out_of_space, is_scheduler_enabled
+from util_mirror_cache import (
+    configure_origin,
+    evict_mirrors,
+    mirror_path,
+    update_mirror,
+)
+from util_ref_fingerprint import (
+    compute_fingerprints,
+    is_unchanged,
+    remote_fingerprint,
+    save_fingerprint,
+)
+from util_run_command import (
+    checkout_size,
+    clone_strategy_args,
+    count_objects,
+    fetch_repository,
+    gc_auto,
+    resolve_fetch_strategy,
+    run_command,
+)
+from util_repo import (
+    cleanup_temp_dir,
+    mkdtemp_repo,
+    pack_files,
+    received_bytes,
+    remove_temp_dir_later,
+    wait_temp_cleanup,
+)
+from util_verify_bundle import (
+    flush_verify_caches,
+    is_verify_enabled,
+    verify_new_bundle,
+)
+from util_inventory import Inventory
+from util_run_journal import RunJournal
+from util_run_report import RepoReport, RunReport
+
+# 各阶段的并发槽位：network 对应 clone/fetch，pack 对应 bundle create 等本地打包操作
+# 仅在并发模式下由 bundle_repos 设置，顺序执行时不做限制
+_stage_limits: dict[str, threading.Semaphore] = {}
+
+
+def _stage(name: str):
+    """获取指定阶段的并发槽位，未启用并发时返回空上下文"""
+    return _stage_limits.get(name) or nullcontext()
+
+
+def _env_int(name: str, default: int) -> int:
+    """从环境变量读取正整数，无效时使用默认值"""
+    try:
+        value = int(os.getenv(name, ""))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _objects_dir(repo_dir: str) -> str:
+    return os.path.join(repo_dir, "objects")
+
+
+def _discard_invalid_bundle(bundle_path: str, error_msg: str) -> None:
+    """删除未通过校验的新 bundle，保留原有的 bundle"""
+    print(f"  新bundle校验失败，保留原有bundle: {error_msg}")
+    try:
+        remove_bundle(bundle_path)
+    except OSError as e:
+        print(f"  删除未通过校验的bundle失败: {e}")
+
+
+def _append_delta(
+    repo_name: str,
+    output_dir: str,
+    repo_dir: str,
+    chain: list[dict],
+    timestamp: str,
+    ref_fingerprint: str | None,
+    report: RepoReport,
+    catalog: BundleCatalog,
+) -> tuple[bool, str]:
+    """在bundle链末尾追加 <上次引用>..<当前引用> 的增量bundle"""
+    success, refs = read_repo_refs(repo_dir)
+    if not success:
+        print(f"  {refs}")
+        return False, refs
+
+    if refs == chain[-1]["refs"]:
+        print("  引用没有变化，无需写入增量bundle")
+    else:
+        delta_filename = new_delta_filename(output_dir, repo_name, timestamp)
+        delta_path = os.path.join(output_dir, delta_filename)
+        print("  正在创建增量bundle...")
+        with _stage("pack"), report.stage("bundle"):
+            success, error_msg, written = create_delta_bundle(
+                repo_dir, delta_path, chain[-1]["refs"]
+            )
+        if not success:
+            print(f"  {error_msg}")
+            return False, error_msg
+        if written and is_verify_enabled():
+            with report.stage("verify"):
+                success, error_msg = verify_new_bundle(
+                    output_dir, delta_filename, repo_dir, sha256=written["sha256"]
+                )
+            if not success:
+                _discard_invalid_bundle(delta_path, error_msg)
+                return False, f"增量bundle校验失败: {error_msg}"
+        if written:
+            report.set(
+                bundle_bytes=written["size"],
+                bundle_sha256=written["sha256"],
+                bundle_type="delta",
+                bundle_file=delta_filename,
+            )
+            chain.append({"type": "delta", "file": delta_filename, "refs": refs})
+            print(f"  成功创建增量bundle: {delta_path}")
+        else:
+            # 只有引用删除或回退，记录新的引用即可
+            chain.append({"type": "refs", "file": None, "refs": refs})
+            print("  没有新增对象，只记录引用变化")
+        save_chain(output_dir, repo_name, chain)
+        catalog.set_chain(repo_name, True)
+
+    if ref_fingerprint:
+        save_fingerprint(output_dir, repo_name, ref_fingerprint, chain_files(chain)[-1])
+    return True, ""
 
 
 def bundle_repo(
-    repo_name: str, repo_Url: str, output_dir: str, aways_bundle_new: bool = False
+    repo_name: str,
+    repo_Url: str,
+    output_dir: str,
+    aways_bundle_new: bool = False,
+    ref_fingerprint: str | None = None,
+    incremental: bool = False,
+    mirror_cache_dir: str | None = None,
+    fetch_strategy: str = "full",
+    report: RepoReport | None = None,
+    catalog: BundleCatalog | None = None,
 ) -> tuple[bool, str]:
-    """将仓库打包成git bundle，支持增量更新"""
+    """
+    将仓库打包成git bundle，支持增量更新
+    :param ref_fingerprint: 打包前获取的远程引用指纹，打包成功后保存到输出目录
+    :param incremental: 是否只写入相对上次打包新增对象的增量bundle（见 util_bundle_chain）
+    :param mirror_cache_dir: 持久化镜像缓存目录，为空时每次在临时目录中重新克隆（见 util_mirror_cache）
+    :param fetch_strategy: 从远程克隆时的获取策略，full 或 shallow（bundle 需要完整对象，不支持 partial）
+    :param report: 记录各阶段耗时与传输量的运行记录，为空时不输出报告
+    :param catalog: 本次运行共享的bundle目录索引，为空时为本仓库单独建立
+    """
     print(f"正在处理仓库: {repo_name}")
+    output_dir = os.path.abspath(output_dir)
+    if report is None:
+        report = RepoReport(repo_name, repo_Url)
+
+    if catalog is None:
+        catalog = BundleCatalog(output_dir)
 
-    # 查找现有的bundle文件
-    existing_bundles: list[str] = []
-    for file in os.listdir(output_dir):
-        if file.startswith(f"{repo_name}_") and file.endswith(".bundle"):
-            existing_bundles.append(os.path.join(output_dir, file))
+    # 已有bundle链时以链清单为准，完整bundle作为起点，增量bundle按顺序导入
+    chain = load_chain(output_dir, repo_name) if catalog.has_chain(repo_name) else None
+    old_chain_files = chain_files(chain)
+
+    # 从索引中查找现有的完整bundle，最新的在前（增量bundle只能通过链清单使用）
+    existing_bundles = catalog.full_bundles(repo_name) if not chain else []
 
-    # 按修改时间排序，获取最新的bundle文件
     existing_bundle = None
-    if existing_bundles:
-        existing_bundles.sort(key=os.path.getmtime, reverse=True)
+    if chain:
+        existing_bundle = os.path.join(output_dir, chain[0]["file"])
+        print(
+            f"  找到bundle链: {chain[0]['file']}，"
+            f"增量bundle {len(old_chain_files) - 1} 个"
+        )
+    elif existing_bundles:
         existing_bundle = existing_bundles[0]
         if aways_bundle_new:
             print(
@@ -35,121 +211,232 @@ def bundle_repo(
 
         for i, expired_file in enumerate(existing_bundles[1:], 1):
             # os.remove(expired_file)
-            os.unlink(expired_file)  # 直接永久删除
+            remove_bundle(expired_file)  # 直接永久删除
+            catalog.remove(expired_file)
             print(
                 f"    已删除旧bundle文件: {os.path.basename(expired_file)},"
                 f"序号：{i}/{len(existing_bundles)-1}"
             )
 
-    temp_root_dir = os.path.join(tempfile.gettempdir(), "repositoryMananger")
-    # 确保临时目录存在
-    os.makedirs(temp_root_dir, exist_ok=True)
-
-    # 创建临时目录
-    temp_dir = mkdtemp_chdir(repo_name, temp_root_dir)
-    # print(f"  创建临时目录: {temp_dir}")
+    temp_dirs: list[str] = []
     try:
-
-        def _try_clone_repo_from_bundle():
-            # 分步执行命令并添加错误处理
-            print(f"  开始clone bundle... {existing_bundle}")
-            success, error_msg = run_command(
-                ["git", "clone", existing_bundle, temp_dir], 300
-            )
+        # 使用持久化镜像缓存时直接在镜像中更新并打包，不再创建临时克隆
+        if mirror_cache_dir:
+            print(f"  正在更新镜像缓存...{repo_Url}")
+            before = pack_files(_objects_dir(mirror_path(mirror_cache_dir, repo_name)))
+            with _stage("network"), report.stage("fetch"):
+                success, result = update_mirror(mirror_cache_dir, repo_name, repo_Url)
             if not success:
-                print(f"  {error_msg}")
-                return False, error_msg
-            # print("  clone更新成功")
-            # 检查远程仓库是否存在，不存在则添加，存在则更新
-            success, error_msg = run_command(["git", "remote", "get-url", "origin"], 60)
-            # print(f"  检查远程仓库...{repo_Url}")
-            if success:
-                # 远程仓库已存在，更新 URL
-                success, error_msg = run_command(
-                    ["git", "remote", "set-url", "origin", repo_Url], 60
-                )
-                # print("  远程仓库已存在，更新 URL 成功")
-            else:
-                # 远程仓库不存在，添加
-                success, error_msg = run_command(
-                    ["git", "remote", "add", "origin", repo_Url], 60
-                )
+                print(f"  {result}")
+                return False, result
+            repo_dir = result
+            report.add(
+                "bytes_transferred", received_bytes(_objects_dir(repo_dir), before)
+            )
+            gc_auto(repo_dir)
+            strategy_used = "mirror"
+            # 镜像中保留了全部历史，可以直接在已有bundle链后追加增量
+            can_append = bool(existing_bundle) and not aways_bundle_new
+        else:
+            temp_root_dir = os.path.join(tempfile.gettempdir(), "repositoryMananger")
+            # 确保临时目录存在
+            os.makedirs(temp_root_dir, exist_ok=True)
 
-                # print("  远程仓库不存在，添加成功")
-            if not success:
-                print(f"  {error_msg}")
-                return False, error_msg
-            # print("  远程仓库已设置")
+            # 创建临时目录，所有git命令都通过cwd在该目录中执行，不修改进程工作目录
+            temp_dir = mkdtemp_repo(repo_name, temp_root_dir)
+            temp_dirs.append(temp_dir)
+            # print(f"  创建临时目录: {temp_dir}")
 
-            success, error_msg = fetch_repository(repo_Url, temp_dir)
-            if not success:
-                return False, error_msg
-            # print("  远程仓库已更新")
-            return True, ""
+            def _try_clone_repo_from_bundle():
+                # 分步执行命令并添加错误处理
+                print(f"  开始clone bundle... {existing_bundle}")
+                with _stage("pack"), report.stage("clone"):
+                    success, error_msg = run_command(
+                        ["git", "clone", "--bare", existing_bundle, temp_dir], 300
+                    )
+                if not success:
+                    print(f"  {error_msg}")
+                    return False, error_msg
+                if chain:
+                    with _stage("pack"), report.stage("clone"):
+                        success, error_msg = unbundle_deltas(
+                            temp_dir, output_dir, chain
+                        )
+                    if not success:
+                        print(f"  {error_msg}")
+                        return False, error_msg
+                # print("  clone更新成功")
+                # 把 origin 指向远程仓库，分支和标签直接同步到裸仓库的引用
+                success, error_msg = configure_origin(temp_dir, repo_Url)
+                if not success:
+                    print(f"  {error_msg}")
+                    return False, error_msg
+                # print("  远程仓库已设置")
 
-        need_to_clone_from_repo_url = None
+                before = pack_files(_objects_dir(temp_dir))
+                with _stage("network"), report.stage("fetch"):
+                    success, error_msg = fetch_repository(repo_Url, temp_dir)
+                if not success:
+                    return False, error_msg
+                report.add(
+                    "bytes_transferred", received_bytes(_objects_dir(temp_dir), before)
+                )
+                # print("  远程仓库已更新")
+                return True, ""
 
-        if aways_bundle_new:
-            print("  设置为总是创建新的bundle,将删除已找到的bundle文件")
-            need_to_clone_from_repo_url = True
-        elif existing_bundle:
-            print("  找到现有bundle文件，将尝试增量更新...")
-            success, error_msg = _try_clone_repo_from_bundle()
-            if success:
-                print("  增量更新 bundle 成功...")
-                need_to_clone_from_repo_url = False
+            need_to_clone_from_repo_url = None
+
+            if aways_bundle_new:
+                print("  设置为总是创建新的bundle,将删除已找到的bundle文件")
+                need_to_clone_from_repo_url = True
+            elif existing_bundle:
+                print("  找到现有bundle文件，将尝试增量更新...")
+                success, error_msg = _try_clone_repo_from_bundle()
+                if success:
+                    print("  增量更新 bundle 成功...")
+                    need_to_clone_from_repo_url = False
+                else:
+                    print(f"  增量更新失败，将尝试重新克隆仓库: {error_msg}")
+                    need_to_clone_from_repo_url = True
             else:
-                print(f"  增量更新失败，将尝试重新克隆仓库: {error_msg}")
+                print("  未找到现有bundle文件，将尝试克隆仓库...")
                 need_to_clone_from_repo_url = True
-        else:
-            print("  未找到现有bundle文件，将尝试克隆仓库...")
-            need_to_clone_from_repo_url = True
-        if need_to_clone_from_repo_url:
-            temp_dir = mkdtemp_chdir(repo_name, temp_root_dir)
-            # 如果不存在bundle文件，直接克隆仓库
-            print(f"  正在浅克隆仓库...{repo_Url}")
-            success, error_msg = run_command(
-                [
-                    "git",
-                    "clone",
-                    repo_Url,
-                    temp_dir,
-                    # ".",
-                    #
-                    "--depth",
-                    "1",
-                ],
-                900,
-            )
-            if not success:
-                print(f"  {error_msg}")
-                return False, error_msg
+            if need_to_clone_from_repo_url:
+                temp_dir = mkdtemp_repo(repo_name, temp_root_dir)
+                temp_dirs.append(temp_dir)
+                # 如果不存在bundle文件，直接克隆仓库
+                print(f"  正在克隆仓库（获取策略: {fetch_strategy}）...{repo_Url}")
+                with _stage("network"):
+                    with report.stage("clone"):
+                        success, error_msg = run_command(
+                            ["git", "clone", "--bare", repo_Url, temp_dir]
+                            + clone_strategy_args(fetch_strategy),
+                            900,
+                        )
+                    if not success:
+                        print(f"  {error_msg}")
+                        return False, error_msg
+                    success, error_msg = configure_origin(temp_dir, repo_Url)
+                    if not success:
+                        print(f"  {error_msg}")
+                        return False, error_msg
+
+                    # 完整克隆已经一次取回全部分支和标签，浅克隆还需要 --unshallow
+                    if fetch_strategy == "shallow":
+                        with report.stage("fetch"):
+                            success, error_msg = fetch_repository(repo_Url, temp_dir)
+                if not success:
+                    print(f"  {error_msg}")
+                    return False, error_msg
+                report.add(
+                    "bytes_transferred", received_bytes(_objects_dir(temp_dir), {})
+                )
+            repo_dir = temp_dir
+            can_append = not need_to_clone_from_repo_url
+            # 从已有bundle恢复后只需增量fetch，否则为实际使用的克隆策略
+            strategy_used = "bundle" if can_append else fetch_strategy
+        print(f"  获取策略: {strategy_used}")
+
+        report.set(strategy=strategy_used, objects=count_objects(repo_dir))
+        # bundle流程只使用裸仓库，统计因此避免的工作区检出写入；需要遍历整个目录树，
+        # 大仓库上开销明显，只在设置 BUNDLE_CHECKOUT_STATS=1 时统计
+        if os.getenv("BUNDLE_CHECKOUT_STATS", "0") == "1":
+            avoided_bytes = checkout_size(repo_dir)
+            print(f"  使用裸仓库，避免检出写入约 {avoided_bytes / 1024**2:.1f} MB")
+            report.set(checkout_bytes_avoided=avoided_bytes)
 
-            success, error_msg = fetch_repository(repo_Url, temp_dir)
-            if not success:
-                print(f"  {error_msg}")
-                return False, error_msg
         # 创建新的bundle文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        if incremental and can_append:
+            if not chain:
+                # 将已有的完整bundle作为链的起点
+                success, base_refs = read_bundle_refs(existing_bundle)
+                if not success:
+                    print(f"  {base_refs}")
+                    return False, base_refs
+                chain = [
+                    {
+                        "type": "full",
+                        "file": os.path.basename(existing_bundle),
+                        "refs": base_refs,
+                    }
+                ]
+            # 增量bundle达到上限时合并为新的完整bundle
+            if len(chain) - 1 < _env_int("BUNDLE_CHAIN_MAX", 7):
+                return _append_delta(
+                    repo_name,
+                    output_dir,
+                    repo_dir,
+                    chain,
+                    timestamp,
+                    ref_fingerprint,
+                    report,
+                    catalog,
+                )
+            print("  增量bundle数量已达上限，将合并为新的完整bundle...")
+
         bundle_filename = f"{repo_name}_{timestamp}.bundle"
         bundle_path = os.path.join(output_dir, bundle_filename)
 
-        # 创建bundle
+        # 清单文件和bundle链都以打包时仓库中的引用为准
+        success, refs = read_repo_refs(repo_dir)
+        if not success:
+            print(f"  {refs}")
+            return False, refs
+
+        # 创建bundle，输出流式写入文件并同时计算校验和（见 util_bundle_writer）
         print("  正在创建bundle...")
-        success, error_msg = run_command(
-            ["git", "bundle", "create", bundle_path, "--all"], 900
-        )
+        with _stage("pack"), report.stage("bundle"):
+            success, error_msg, written = write_bundle(repo_dir, bundle_path, ["--all"])
         if not success:
             print(f"  {error_msg}")
             return False, error_msg
+        write_sidecar(bundle_path, written, refs, "full")
+
+        # 新bundle通过校验后才能取代旧bundle，校验失败时删除新bundle、保留旧bundle
+        if is_verify_enabled():
+            with report.stage("verify"):
+                success, error_msg = verify_new_bundle(
+                    output_dir, bundle_filename, repo_dir, sha256=written["sha256"]
+                )
+            if not success:
+                if existing_bundle != bundle_path:
+                    _discard_invalid_bundle(bundle_path, error_msg)
+                return False, f"bundle校验失败: {error_msg}"
+        report.set(
+            bundle_bytes=written["size"],
+            bundle_sha256=written["sha256"],
+            bundle_type="full",
+            bundle_file=bundle_filename,
+        )
+        catalog.add(bundle_path)
+
+        # 增量模式下新的完整bundle成为链的起点
+        if incremental:
+            save_chain(
+                output_dir,
+                repo_name,
+                [{"type": "full", "file": bundle_filename, "refs": refs}],
+            )
+            catalog.set_chain(repo_name, True)
+        elif chain:
+            os.unlink(chain_path(output_dir, repo_name))
+            catalog.set_chain(repo_name, False)
 
-        # 只有在成功创建新bundle后才删除旧bundle
-        if existing_bundle:
-            try:
-                os.unlink(existing_bundle)  # 直接永久删除
-                print(f"  已删除旧bundle文件: {os.path.basename(existing_bundle)}")
-            except OSError as e:
-                print(f"  删除旧bundle文件失败: {e}")
+        # 只有在新bundle创建并通过校验后才删除旧bundle（同一秒内重复打包时文件名相同，不能删除）
+        with report.stage("delete_old"):
+            if existing_bundle and existing_bundle != bundle_path:
+                try:
+                    remove_bundle(existing_bundle)  # 直接永久删除
+                    catalog.remove(existing_bundle)
+                    print(f"  已删除旧bundle文件: {os.path.basename(existing_bundle)}")
+                except OSError as e:
+                    print(f"  删除旧bundle文件失败: {e}")
+            remove_chain_files(output_dir, old_chain_files[1:])
+
+        if ref_fingerprint:
+            save_fingerprint(output_dir, repo_name, ref_fingerprint, bundle_filename)
 
         print(f"  成功创建bundle: {bundle_path}")
         return True, ""
@@ -160,12 +447,99 @@ def bundle_repo(
         return False, error_msg
 
     finally:
-        cleanup_temp_dir(temp_root_dir)
+        # 只清理本仓库创建的临时目录，避免误删其他并发任务的目录；
+        # 删除在后台线程池中进行，不占用本仓库的处理时间
+        with report.stage("cleanup"):
+            for created_dir in temp_dirs:
+                remove_temp_dir_later(created_dir)
 
 
-def bundle_repos(
-    repos: list[dict[str, str]], output_dir: str, aways_bundle_new: bool = False
+def bundle_repo_dedup(
+    repo_name: str, repo_Url: str, store: DedupStore, report: RepoReport
+) -> tuple[bool, str]:
+    """
+    去重模式：把仓库获取到所属家族的共享仓库中，家族bundle和引用清单在全部仓库处理完后统一写入
+    :param store: 共享对象库（见 util_dedup_store）
+    :param report: 记录各阶段耗时的运行记录
+    """
+    print(f"正在处理仓库: {repo_name}")
+    with _stage("network"), report.stage("fetch"):
+        success, result = store.ingest(repo_name, repo_Url)
+    if not success:
+        print(f"  {result}")
+        return False, result
+    report.set(strategy="dedup", bundle_type="dedup", family=result)
+    return True, ""
+
+
+def _finish_dedup(
+    store: DedupStore, output_dir: str, fingerprints: dict[str, str | None]
 ) -> None:
+    """为本次更新过的家族创建bundle，重写家族中全部仓库的引用清单，并打印去重比"""
+    for family, names in store.touched.items():
+        members = store.members(family)
+        print(
+            f"\n正在为家族 {family[:12]} 创建bundle，"
+            f"本次更新 {len(names)}/{len(members)} 个仓库..."
+        )
+        success, result = store.bundle_family(family, output_dir)
+        if not success:
+            print(f"  创建家族bundle失败: {result}")
+            continue
+        print(f"  成功创建家族bundle: {result}")
+        # 旧的家族bundle已被替换，家族中没有更新的仓库也要指向新bundle
+        for name in members:
+            manifest = store.write_manifest(output_dir, name, family, result)
+            if name in names and fingerprints.get(name):
+                save_fingerprint(output_dir, name, fingerprints[name], manifest)
+    if store.touched:
+        print_dedup_ratio(*store.dedup_stats(store.touched))
+
+
+def bundle_repos(
+    repos: Iterable[dict[str, str]],
+    output_dir: str,
+    aways_bundle_new: bool = False,
+    workers: int | None = None,
+    skip_unchanged: bool | None = None,
+    incremental: bool | None = None,
+    mirror_cache_dir: str | None = None,
+    fetch_strategy: str | None = None,
+    dedup_store_dir: str | None = None,
+    provider: str = "",
+    org: str = "",
+    known_names: set[str] | None = None,
+) -> RunReport:
+    """
+    批量打包仓库
+    :param repos: 仓库信息列表或仓库流（如 coding_repos_info.iter_all_repos_info），每项包含 Name 和 Url；
+        传入仓库流时边接收边处理，引用指纹在处理每个仓库时单独获取
+    :param output_dir: bundle 输出目录
+    :param aways_bundle_new: 是否总是重新克隆并创建新的 bundle
+    :param workers: 并发处理的仓库数量，为空时读取环境变量 BUNDLE_WORKERS（默认 1，即顺序处理）
+    :param skip_unchanged: 是否跳过远程引用未变化的仓库，为空时读取环境变量 BUNDLE_SKIP_UNCHANGED（默认开启）
+    :param incremental: 是否写入增量bundle链，为空时读取环境变量 BUNDLE_INCREMENTAL（默认关闭），
+        链长度由 BUNDLE_CHAIN_MAX 控制，恢复见 util_bundle_chain.restore_bundle_chain
+    :param mirror_cache_dir: 持久化镜像缓存目录，为空时读取环境变量 BUNDLE_MIRROR_CACHE_DIR（默认不启用），
+        缓存大小上限由 BUNDLE_MIRROR_CACHE_MAX_GB 控制
+    :param fetch_strategy: 从远程克隆的获取策略（full/shallow），为空时读取环境变量
+        BUNDLE_FETCH_STRATEGY（默认 full，一次协商、一次传输）
+    :param dedup_store_dir: 按仓库家族去重的共享对象库目录，为空时读取环境变量 BUNDLE_DEDUP_STORE_DIR
+        （默认不启用）；启用后每个家族输出一个bundle，每个仓库只输出引用清单（见 util_dedup_store）
+    :param provider: 仓库来源（如 github、coding），与 org 一起区分仓库清单中的同名仓库，
+        共用输出目录的不同来源各自维护断点续跑日志
+    :param org: 组织或团队
+    :param known_names: 预先筛选前完整仓库列表中的仓库名（如只处理有推送的仓库时），
+        这些仓库即使本次没有处理也不会报告为可能已被删除或改名
+    新bundle写入后先校验（BUNDLE_VERIFY=0 关闭，BUNDLE_VERIFY_FULL=1 完整校验，见 util_verify_bundle），
+    通过后才删除旧bundle
+    bundle先写入 .partial 文件再原子重命名；运行中途被终止后再次运行时，按输出目录中的运行日志
+    跳过上次已完成且远程引用未变化的仓库（BUNDLE_RESUME=0 时重新处理全部仓库，见 util_run_journal）
+    按估算大小和临时目录、输出目录的剩余空间准入仓库，空间不足时暂停等待而不是失败
+    （BUNDLE_DISK_SCHEDULER=0 关闭，见 util_disk_scheduler）
+    每个仓库的阶段耗时、传输量和结果写入 reports 目录下的 JSON-lines 运行报告（见 util_run_report）
+    :return: 本次运行的报告，可从中取得处理成功的仓库
+    """
 
     # 确保输出目录存在
     try:
@@ -173,38 +547,225 @@ def bundle_repos(
     except OSError as e:
         print(f"无法创建输出目录 {output_dir}: {e}")
         sys.exit(1)
+    # 以前运行遗留的临时仓库目录和未写完的bundle
+    temp_root_dir = os.path.join(tempfile.gettempdir(), "repositoryMananger")
+    cleanup_temp_dir(temp_root_dir)
+    sweep_partial_files(output_dir)
+    if os.getenv("BUNDLE_ZSTD_DIR") and os.path.isdir(os.getenv("BUNDLE_ZSTD_DIR")):
+        sweep_partial_files(os.getenv("BUNDLE_ZSTD_DIR"))
+    journal = RunJournal(output_dir, f"{provider}_{org}" if provider else "bundle")
+    # 只列出一次输出目录，之后每个仓库直接在索引中查找（见 util_bundle_catalog）
+    catalog = BundleCatalog(output_dir)
+    catalog.print_report()
+    processed_names: set[str] = set()
 
-    if not repos:
-        print("没有找到仓库信息")
-        sys.exit(1)
+    if isinstance(repos, Sized):
+        if not repos:
+            print("没有找到仓库信息")
+            sys.exit(1)
+        total = str(len(repos))
+        print(f"找到 {total} 个仓库")
+    else:
+        total = "?"
+        print("以流式方式接收仓库，边获取边处理")
 
-    print(f"找到 {len(repos)} 个仓库")
+    if workers is None:
+        workers = _env_int("BUNDLE_WORKERS", 1)
+    workers = max(1, workers)
+    fetch_strategy = resolve_fetch_strategy(
+        fetch_strategy or os.getenv("BUNDLE_FETCH_STRATEGY"),
+        "full",
+        ("full", "shallow"),
+    )
+    if mirror_cache_dir is None:
+        mirror_cache_dir = os.getenv("BUNDLE_MIRROR_CACHE_DIR") or None
+    if dedup_store_dir is None:
+        dedup_store_dir = os.getenv("BUNDLE_DEDUP_STORE_DIR") or None
+    store = DedupStore(dedup_store_dir) if dedup_store_dir else None
+    dedup_fingerprints: dict[str, str | None] = {}
+    print(
+        f"获取策略: {'dedup' if store else 'mirror' if mirror_cache_dir else fetch_strategy}"
+    )
+    if incremental is None:
+        incremental = os.getenv("BUNDLE_INCREMENTAL", "0") == "1"
+    if skip_unchanged is None:
+        skip_unchanged = os.getenv("BUNDLE_SKIP_UNCHANGED", "1") != "0"
+    # 镜像模式下仓库克隆到镜像缓存目录，其他模式克隆到临时目录
+    scheduler = (
+        DiskScheduler(mirror_cache_dir or temp_root_dir, output_dir, catalog)
+        if is_scheduler_enabled()
+        else None
+    )
+    if scheduler and workers > 1 and isinstance(repos, Sized):
+        repos = scheduler.order(list(repos))
 
+    # 预检：批量执行 git ls-remote 计算引用指纹，用于跳过没有新提交的仓库
+    fingerprints: dict[str, str | None] = {}
+    if skip_unchanged and isinstance(repos, Sized):
+        print("正在获取远程引用指纹...")
+        fingerprints = compute_fingerprints(
+            list(repos),
+            _env_int("BUNDLE_PREFLIGHT_WORKERS", 8),
+        )
+
+    # 每个仓库的结果同时写入仓库清单数据库（见 util_inventory）
+    run_report = RunReport("bundle", inventory=Inventory(), provider=provider, org=org)
+
+    def _bundle(repo: dict[str, str]) -> tuple[bool, str]:
+        """
+        处理一个仓库并写入运行日志；上次中断的运行中已完成、且远程引用没有再变化的仓库直接跳过，
+        记为 resumed（不计入 RunReport.succeeded，不更新仓库状态中的推送时间）
+        """
+        name = repo["Name"]
+        processed_names.add(name)
+        # 上次已完成的仓库即使关闭了跳过未变化仓库，也要核对远程引用
+        if name in fingerprints or (not skip_unchanged and not journal.has_entry(name)):
+            fingerprint = fingerprints.get(name)
+        else:
+            success, fingerprint = remote_fingerprint(repo["Url"])
+            fingerprint = fingerprint if success else None
+        if journal.is_completed(name, fingerprint):
+            print(f"  上次中断的运行中已完成，远程引用未变化，跳过: {name}")
+            report = run_report.new_repo(name, repo["Url"])
+            report.set(fingerprint=fingerprint)
+            report.finish("resumed")
+            run_report.add(report)
+            if store:
+                store.touch(name)
+            return True, ""
+        success, error_msg = _bundle_one(repo, fingerprint)
+        journal.record(name, "success" if success else "failed", fingerprint)
+        return success, error_msg
+
+    def _bundle_one(repo: dict[str, str], fingerprint: str | None) -> tuple[bool, str]:
+        report = run_report.new_repo(repo["Name"], repo["Url"])
+        report.set(fingerprint=fingerprint)
+        if not aways_bundle_new and is_unchanged(output_dir, repo["Name"], fingerprint):
+            print(f"  远程引用未变化，跳过打包: {repo['Name']}")
+            report.finish("skipped")
+            run_report.add(report)
+            return True, ""
+        for attempt in (1, 2):
+            with scheduler.admit(repo) if scheduler else nullcontext(True) as admitted:
+                if not admitted:
+                    success, error_msg = False, "磁盘空间不足，等待超时"
+                    break
+                success, error_msg = _bundle_fetched(repo, fingerprint, report)
+            # 处理中途空间耗尽时，释放预留，等其他仓库释放空间后重新准入并重试一次；
+            # clone/fetch 不捕获标准错误，失败后按剩余空间判断是否由空间不足引起
+            if (
+                success
+                or attempt == 2
+                or not scheduler
+                or not (is_out_of_space(error_msg) or scheduler.is_low_on_space())
+                or not scheduler.wait_for_space(repo["Name"])
+            ):
+                break
+            # 重试使用新的记录，阶段耗时和传输量不重复累计
+            report = run_report.new_repo(repo["Name"], repo["Url"])
+            report.set(fingerprint=fingerprint, disk_retry=True)
+        report.finish("success" if success else "failed", error_msg)
+        run_report.add(report)
+        return success, error_msg
+
+    def _bundle_fetched(
+        repo: dict[str, str], fingerprint: str | None, report: RepoReport
+    ) -> tuple[bool, str]:
+        if store:
+            success, error_msg = bundle_repo_dedup(
+                repo["Name"], repo["Url"], store, report
+            )
+            if success:
+                dedup_fingerprints[repo["Name"]] = fingerprint
+            return success, error_msg
+        return bundle_repo(
+            repo["Name"],
+            repo["Url"],
+            output_dir,
+            aways_bundle_new,
+            fingerprint,
+            incremental,
+            mirror_cache_dir,
+            fetch_strategy,
+            report,
+            catalog,
+        )
 
-    erRepos = []
     # 处理每个仓库
     success_count = 0
-    for i, repo in enumerate(repos, 1):
+    processed_count = 0
+    lock = threading.Lock()
 
-        print(f"\n[{i}/{len(repos)}] 处理仓库: {repo['Name']}")
-        success, error_msg = bundle_repo(
-            repo["Name"], repo["Url"], output_dir, aways_bundle_new
+    def _record(i: int, repo: dict[str, str], success: bool, error_msg: str) -> None:
+        nonlocal success_count, processed_count
+        with lock:
+            processed_count += 1
+            if success:
+                success_count += 1
+                print(f"处理成功: {repo['Name']} - 当前成功数: {success_count}/{i}")
+            else:
+                print(f"处理失败: {repo['Name']} - {repo['Url']}")
+                repo["Error"] = error_msg
+
+    if workers == 1:
+        for i, repo in enumerate(repos, 1):
+
+            print(f"\n[{i}/{total}] 处理仓库: {repo['Name']}")
+            success, error_msg = _bundle(repo)
+            _record(i, repo, success, error_msg)
+    else:
+        network_workers = _env_int("BUNDLE_NETWORK_WORKERS", workers)
+        pack_workers = _env_int(
+            "BUNDLE_PACK_WORKERS", min(workers, os.cpu_count() or 1)
         )
-        if success:
-            success_count += 1
-            print(f"处理成功: {repo['Name']} - 当前成功数: {success_count}/{i}")
-        else:
-            print(f"处理失败: {repo['Name']} - {repo['Url']}")
-            repo["Error"] = error_msg
-            erRepos.append(repo)
-
-    current_date = datetime.now().strftime("%Y%m%d")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    filename = os.path.join(script_dir, f"bundle_repos_error_{current_date}.log")
-    # 将仓库信息保存到JSON文件
-    try:
-        with open(filename, mode="a", encoding="utf-8") as f:
-            json.dump(erRepos, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving to log file: {e}")
-    print(f"\n完成! 成功处理 {success_count}/{len(repos)} 个仓库")
+        print(
+            f"并发模式: 工作线程 {workers}，网络并发上限 {network_workers}，"
+            f"打包并发上限 {pack_workers}"
+        )
+        _stage_limits["network"] = threading.BoundedSemaphore(network_workers)
+        _stage_limits["pack"] = threading.BoundedSemaphore(pack_workers)
+
+        def _process(i: int, repo: dict[str, str]) -> tuple[bool, str]:
+            print(f"\n[{i}/{total}] 处理仓库: {repo['Name']}")
+            return _bundle(repo)
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="bundle"
+            ) as executor:
+                # 仓库流在提交任务的同时逐个获取，先到的仓库立即开始处理
+                futures = {
+                    executor.submit(_process, i, repo): repo
+                    for i, repo in enumerate(repos, 1)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    repo = futures[future]
+                    try:
+                        success, error_msg = future.result()
+                    except Exception as e:
+                        success, error_msg = False, f"处理仓库时出错: {str(e)}"
+                    _record(done, repo, success, error_msg)
+        finally:
+            _stage_limits.clear()
+
+    if store:
+        _finish_dedup(store, os.path.abspath(output_dir), dedup_fingerprints)
+
+    if mirror_cache_dir and os.getenv("BUNDLE_MIRROR_CACHE_MAX_GB"):
+        try:
+            max_gb = float(os.getenv("BUNDLE_MIRROR_CACHE_MAX_GB"))
+            evict_mirrors(mirror_cache_dir, int(max_gb * 1024**3))
+        except ValueError:
+            print("BUNDLE_MIRROR_CACHE_MAX_GB 不是有效的数字，跳过镜像缓存淘汰")
+
+    wait_temp_cleanup()
+    flush_verify_caches()
+    if scheduler and scheduler.paused_seconds:
+        print(f"因磁盘空间不足共暂停 {scheduler.paused_seconds:.0f} 秒")
+
+    # 运行汇总（含失败仓库列表）写入运行报告，取代原来的 bundle_repos_error_<日期>.log
+    run_report.summary()
+    catalog.print_untouched(processed_names | (known_names or set()))
+    journal.finish()
+    print(f"\n完成! 成功处理 {success_count}/{processed_count} 个仓库")
+    return run_report
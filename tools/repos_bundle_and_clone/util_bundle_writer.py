@@ -0,0 +1,230 @@
+"""
+流式写入 bundle
+
+git bundle create - 把 bundle 输出到标准输出，按大块（BUNDLE_WRITE_CHUNK_MB，默认 8 MB）缓冲写入目标文件，
+同一次读取中计算 SHA-256，写完后在旁边生成清单 {bundle}.json，记录大小、校验和与引用，
+后续的校验缓存、异地同步直接使用清单中的校验和，不需要再读一遍 bundle（输出目录常在较慢的 NAS 上）。
+
+bundle 先写入 {bundle}.partial，写完并 fsync 后再原子地重命名为最终文件名，
+运行中途被终止时只会留下 .partial 文件，不会出现被误当作最新 bundle 的残缺文件（见 sweep_partial_files）。
+
+设置 BUNDLE_ZSTD_DIR 时，同一次读取中还会把 zstd 压缩的副本 {bundle}.zst 写入该目录，供异地同步使用；
+输出目录中的 bundle 保持原始格式，可以直接被 git clone / git bundle 使用。
+压缩需要安装可选依赖 zstandard，未安装时跳过压缩副本。
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SIDECAR_SUFFIX = ".json"
+ZSTD_SUFFIX = ".zst"
+PARTIAL_SUFFIX = ".partial"
+
+
+def sidecar_path(bundle_path: str) -> str:
+    return f"{bundle_path}{SIDECAR_SUFFIX}"
+
+
+def _chunk_size() -> int:
+    try:
+        chunk_mb = int(os.getenv("BUNDLE_WRITE_CHUNK_MB", "8"))
+    except ValueError:
+        chunk_mb = 8
+    return max(1, chunk_mb) * 1024 * 1024
+
+
+def _zstd_path(bundle_path: str) -> str | None:
+    """压缩副本路径，未设置 BUNDLE_ZSTD_DIR 或未安装 zstandard 时返回 None"""
+    zstd_dir = os.getenv("BUNDLE_ZSTD_DIR")
+    if not zstd_dir:
+        return None
+    if zstandard is None:
+        print("  未安装 zstandard，跳过压缩副本")
+        return None
+    os.makedirs(zstd_dir, exist_ok=True)
+    return os.path.join(zstd_dir, os.path.basename(bundle_path) + ZSTD_SUFFIX)
+
+
+def write_bundle(
+    repo_dir: str,
+    bundle_path: str,
+    rev_args: list[str],
+    input: str | None = None,
+    timeout: int = 900,
+) -> tuple[bool, str, dict | None]:
+    """
+    执行 git bundle create - 并流式写入文件
+    :param repo_dir: 打包的仓库目录
+    :param bundle_path: bundle 文件路径
+    :param rev_args: 打包范围，如 ["--all"]
+    :param input: 写入 git 标准输入的内容（配合 --stdin 传入排除条件）
+    :param timeout: 超时时间（秒）
+    :return: (是否成功, 错误信息, {"size", "sha256", "zstd_file", "zstd_size"})；失败时不留下任何文件
+    """
+    chunk_size = _chunk_size()
+    zstd_path = _zstd_path(bundle_path)
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        process = subprocess.Popen(
+            ["git", "bundle", "create", "-"] + rev_args,
+            cwd=repo_dir,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            close_fds=True,
+        )
+    except OSError as e:
+        return False, f"未知错误: {str(e)}", None
+
+    # 标准输入和标准错误在后台线程中处理，避免管道写满后互相等待
+    stderr_chunks: list[bytes] = []
+
+    def _feed() -> None:
+        try:
+            process.stdin.write(input.encode("utf-8"))
+            process.stdin.close()
+        except OSError:
+            pass
+
+    threads = [
+        threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()))
+    ]
+    if input is not None:
+        threads.append(threading.Thread(target=_feed))
+    timed_out = threading.Event()
+
+    def _kill() -> None:
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, _kill)
+    for thread in threads:
+        thread.start()
+    timer.start()
+
+    partial_path = f"{bundle_path}{PARTIAL_SUFFIX}"
+    zstd_partial = f"{zstd_path}{PARTIAL_SUFFIX}" if zstd_path else None
+    zstd_file = None
+    try:
+        with open(partial_path, "wb", buffering=chunk_size) as f:
+            if zstd_path:
+                zstd_file = open(zstd_partial, "wb")
+                compressor = zstandard.ZstdCompressor().stream_writer(zstd_file)
+            while chunk := process.stdout.read(chunk_size):
+                f.write(chunk)
+                sha.update(chunk)
+                size += len(chunk)
+                if zstd_path:
+                    compressor.write(chunk)
+            if zstd_path:
+                compressor.close()
+            returncode = process.wait()
+            if returncode == 0:
+                f.flush()
+                os.fsync(f.fileno())
+    except OSError as e:
+        process.kill()
+        process.wait()
+        returncode = None
+        stderr_chunks.append(f"写入bundle失败: {e}".encode("utf-8"))
+    finally:
+        timer.cancel()
+        for thread in threads:
+            thread.join()
+        if zstd_file and not zstd_file.closed:
+            zstd_file.close()
+
+    if returncode != 0:
+        for path in (partial_path, zstd_partial):
+            if path and os.path.exists(path):
+                os.unlink(path)
+        if timed_out.is_set():
+            error_msg = "命令执行超时，已终止操作"
+        else:
+            error_msg = b"".join(stderr_chunks).decode("utf-8", "replace").strip()
+            error_msg = f"命令执行失败: {error_msg}"
+        return False, error_msg, None
+
+    # 写完后才出现在最终文件名下
+    os.replace(partial_path, bundle_path)
+    if zstd_path:
+        os.replace(zstd_partial, zstd_path)
+    info = {"size": size, "sha256": sha.hexdigest()}
+    if zstd_path:
+        info["zstd_file"] = os.path.basename(zstd_path)
+        info["zstd_size"] = os.path.getsize(zstd_path)
+    return True, "", info
+
+
+def write_sidecar(
+    bundle_path: str, info: dict, refs: dict[str, str], bundle_type: str
+) -> None:
+    """写入 bundle 旁边的清单文件，先写临时文件再替换"""
+    path = sidecar_path(bundle_path)
+    manifest = {
+        "file": os.path.basename(bundle_path),
+        "type": bundle_type,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        **info,
+        "refs": refs,
+    }
+    try:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"  写入bundle清单失败: {e}")
+
+
+def load_sidecar(bundle_path: str) -> dict | None:
+    """读取 bundle 的清单文件，不存在或损坏时返回 None"""
+    try:
+        with open(sidecar_path(bundle_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def remove_bundle(bundle_path: str) -> None:
+    """删除 bundle 及其清单文件和压缩副本，bundle 不存在时抛出 FileNotFoundError"""
+    os.unlink(bundle_path)
+    extra = [sidecar_path(bundle_path)]
+    if os.getenv("BUNDLE_ZSTD_DIR"):
+        extra.append(
+            os.path.join(
+                os.getenv("BUNDLE_ZSTD_DIR"),
+                os.path.basename(bundle_path) + ZSTD_SUFFIX,
+            )
+        )
+    for path in extra:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def sweep_partial_files(output_dir: str) -> int:
+    """删除上次运行中断时留下的 .partial 文件（包括家族 bundle 子目录），返回删除的数量"""
+    removed = 0
+    for root, _, files in os.walk(output_dir):
+        for file in files:
+            if file.endswith(PARTIAL_SUFFIX):
+                try:
+                    os.unlink(os.path.join(root, file))
+                    removed += 1
+                except OSError as e:
+                    print(f"删除未写完的文件失败: {file}, 错误: {e}")
+    if removed:
+        print(f"已删除上次运行中断时留下的 {removed} 个未写完的文件")
+    return removed
@@ -6,35 +6,96 @@ Coding仓库打包工具
 主要用于代码仓库的批量管理、备份和分发。
 """
 
-import json
 import os
-import subprocess
 import sys
-from datetime import datetime
+import threading
+import time
+from collections.abc import Iterable, Sized
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from util_repo import pack_files, received_bytes
+from util_run_command import (
+    KEEP_PACK_CONFIG,
+    clone_strategy_args,
+    count_objects,
+    gc_auto,
+    is_shallow_repository,
+    resolve_fetch_strategy,
+    run_command,
+)
+from util_filter_repos import RepoFilter, default_filter
+from util_inventory import Inventory
+from util_run_report import RepoReport, RunReport
+
+
+def _env_int(name: str, default: int) -> int:
+    """从环境变量读取正整数，无效时使用默认值"""
+    try:
+        value = int(os.getenv(name, ""))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def repo_host(repo_Url: str) -> str:
+    """从仓库地址中解析主机名，支持 https:// 与 git@host:path 形式"""
+    host = urlparse(repo_Url).hostname
+    if host:
+        return host
+    if "@" in repo_Url and ":" in repo_Url:
+        return repo_Url.split("@", 1)[1].split(":", 1)[0]
+    return "local"
 
-from util_run_command import is_shallow_repository, run_command
 
 def clone_or_pull_repo(
-    repo_name: str, repo_Url: str, repo_clone_dir: str
+    repo_name: str,
+    repo_Url: str,
+    repo_clone_dir: str,
+    fetch_strategy: str = "partial",
+    report: RepoReport | None = None,
 ) -> tuple[bool, str]:
-    """克隆或拉取仓库"""
+    """
+    克隆或拉取仓库
+    :param fetch_strategy: 仓库不存在时的克隆策略：full、partial（--filter=blob:none）或 shallow
+    :param report: 记录各阶段耗时与传输量的运行记录，为空时不输出报告
+    """
+    if report is None:
+        report = RepoReport(repo_name, repo_Url)
     print(f"正在处理仓库: {repo_name}")
     # 确保目标目录的父目录存在
     os.makedirs(repo_clone_dir, exist_ok=True)
     # 创建目标目录路径
-    repo_dir = os.path.join(repo_clone_dir, repo_name)
+    repo_dir = os.path.join(os.path.abspath(repo_clone_dir), repo_name)
+    objects_dir = os.path.join(repo_dir, ".git", "objects")
     # 检查目标目录是否存在
     if os.path.exists(repo_dir):
-        print("  仓库已存在，执行 git pull...")
+        print("  仓库已存在，执行 git pull...（获取策略: pull）")
         try:
-            os.chdir(repo_dir)
             is_shallow = is_shallow_repository(repo_dir)
-            pull_command = ["git", "pull", "--all", "--tags", "--force"]
+            pull_command = [
+                "git",
+                *KEEP_PACK_CONFIG,
+                "pull",
+                "--all",
+                "--tags",
+                "--force",
+            ]
             if is_shallow:
                 pull_command.append("--unshallow")
 
-            success, error_msg = run_command(pull_command, 900)
+            report.set(strategy="pull")
+            before = pack_files(objects_dir)
+            with report.stage("pull"):
+                success, error_msg = run_command(
+                    pull_command, 900, cwd=repo_dir, new_process_group=True
+                )
             if success:
+                report.set(
+                    bytes_transferred=received_bytes(objects_dir, before),
+                    objects=count_objects(repo_dir),
+                )
+                gc_auto(repo_dir)
                 print(f"  成功更新仓库: {repo_name}")
                 return True, ""
             else:
@@ -46,19 +107,20 @@ def clone_or_pull_repo(
             print(f"  {error_msg}")
             return False, error_msg
     else:
-        print("  仓库不存在，执行 git clone...")
-        success, error_msg = run_command(
-            [
-                "git",
-                "clone",
-                repo_Url,
-                os.path.normpath(repo_dir),
-                "--depth",
-                "1",
-            ],
-            900,
-        )
+        print(f"  仓库不存在，执行 git clone...（获取策略: {fetch_strategy}）")
+        report.set(strategy=fetch_strategy)
+        with report.stage("clone"):
+            success, error_msg = run_command(
+                ["git", "clone", repo_Url, os.path.normpath(repo_dir)]
+                + clone_strategy_args(fetch_strategy),
+                900,
+                new_process_group=True,
+            )
         if success:
+            report.set(
+                bytes_transferred=received_bytes(objects_dir, {}),
+                objects=count_objects(repo_dir),
+            )
             print(f"  成功克隆仓库: {repo_name}")
             return True, ""
         else:
@@ -67,8 +129,56 @@ def clone_or_pull_repo(
             return False, error_msg
 
 
-def clone_or_pull_repos(repos: list[dict[str, str]], output_dir: str) -> None:
-    """批量克隆或拉取仓库"""
+def _print_summary(results: list[dict[str, object]]) -> None:
+    """按主机汇总打印结果表，并列出失败的仓库"""
+    hosts: dict[str, dict[str, float]] = {}
+    for result in results:
+        stats = hosts.setdefault(
+            result["Host"], {"成功": 0, "失败": 0, "取消": 0, "耗时": 0.0}
+        )
+        stats[result["Status"]] += 1
+        stats["耗时"] += result["Seconds"]
+
+    print("\n主机                            成功    失败    取消    累计耗时(秒)")
+    for host, stats in sorted(hosts.items()):
+        print(
+            f"{host:<30}{stats['成功']:>6}{stats['失败']:>8}{stats['取消']:>8}"
+            f"{stats['耗时']:>16.1f}"
+        )
+
+    failed = [result for result in results if result["Status"] != "成功"]
+    if failed:
+        print("\n未成功的仓库:")
+        for result in failed:
+            print(f"  [{result['Status']}] {result['Name']} - {result['Error']}")
+
+
+def clone_or_pull_repos(
+    repos: Iterable[dict[str, str]],
+    output_dir: str,
+    workers: int | None = None,
+    fetch_strategy: str | None = None,
+    repo_filter: RepoFilter | None = None,
+    provider: str = "",
+    org: str = "",
+) -> RunReport:
+    """
+    批量克隆或拉取仓库
+    :param repos: 仓库信息列表或仓库流（如 coding_repos_info.iter_all_repos_info），每项包含 Name 和 Url，
+        传入仓库流时边接收边处理
+    :param output_dir: 仓库克隆目录
+    :param workers: 并发处理的仓库数量，为空时读取环境变量 CLONE_WORKERS（默认 1）
+    每个主机的并发数由环境变量 CLONE_PER_HOST_WORKERS 限制（默认 4），
+    结果按完成顺序输出；Ctrl-C 会取消尚未开始的仓库，正在执行的 git 命令会继续到完成或超时。
+    :param fetch_strategy: 新仓库的克隆策略，为空时读取环境变量 CLONE_FETCH_STRATEGY，
+        默认 partial：只传输提交和目录树，文件内容在检出时按需获取，一次协商即可完成
+    :param repo_filter: 仓库过滤规则（名称通配符、大小、语言、推送时间），为空时使用环境变量配置的规则
+        （见 util_filter_repos）
+    :param provider: 仓库来源（如 github、coding），与 org 一起区分仓库清单中的同名仓库
+    :param org: 组织或团队
+    每个仓库的阶段耗时、传输量和结果写入 reports 目录下的 JSON-lines 运行报告（见 util_run_report）
+    :return: 本次运行的报告，可从中取得处理成功的仓库
+    """
     # 确保输出目录存在
     try:
         os.makedirs(output_dir, exist_ok=True)
@@ -76,44 +186,138 @@ def clone_or_pull_repos(repos: list[dict[str, str]], output_dir: str) -> None:
         print(f"无法创建输出目录 {output_dir}: {e}")
         sys.exit(1)
 
-    if not repos:
-        print("没有找到仓库信息")
-        sys.exit(1)
+    if isinstance(repos, Sized):
+        if not repos:
+            print("没有找到仓库信息")
+            sys.exit(1)
+        total = str(len(repos))
+        print(f"找到 {total} 个仓库")
+    else:
+        total = "?"
+        print("以流式方式接收仓库，边获取边处理")
+    repo_filter = repo_filter or default_filter()
 
-    print(f"找到 {len(repos)} 个仓库")
-    # 从环境变量或配置文件读取忽略仓库列表
-    ignore_repos = (
-        os.getenv("IGNORE_REPOS", "").split(",")
-        if os.getenv("IGNORE_REPOS")
-        else ["BACKUP-CHINA"]
+    if workers is None:
+        workers = _env_int("CLONE_WORKERS", 1)
+    workers = max(1, workers)
+    per_host_workers = _env_int("CLONE_PER_HOST_WORKERS", 4)
+    fetch_strategy = resolve_fetch_strategy(
+        fetch_strategy or os.getenv("CLONE_FETCH_STRATEGY"), "partial"
     )
+    print(f"新仓库获取策略: {fetch_strategy}")
+    host_limits: dict[str, threading.Semaphore] = {}
+    host_limits_lock = threading.Lock()
+    stop_event = threading.Event()
+    # 每个仓库的结果同时写入仓库清单数据库（见 util_inventory）
+    run_report = RunReport("clone", inventory=Inventory(), provider=provider, org=org)
+    # 仓库处理中产生的运行记录，在 _record 中补全结果后写入报告
+    reports: dict[int, RepoReport] = {}
+
+    def _host_slot(host: str) -> threading.Semaphore:
+        with host_limits_lock:
+            if host not in host_limits:
+                host_limits[host] = threading.BoundedSemaphore(per_host_workers)
+            return host_limits[host]
 
-    erRepos = []
+    def _process(i: int, repo: dict[str, str]) -> tuple[bool, str, float]:
+        slot = _host_slot(repo_host(repo["Url"]))
+        # 等待主机槽位时定期检查是否已被取消
+        while not slot.acquire(timeout=0.5):
+            if stop_event.is_set():
+                return False, "已取消", 0.0
+        try:
+            if stop_event.is_set():
+                return False, "已取消", 0.0
+            print(f"\n[{i}/{total}] 处理仓库: {repo['Name']}")
+            start = time.monotonic()
+            report = run_report.new_repo(repo["Name"], repo["Url"])
+            reports[id(repo)] = report
+            success, error_msg = clone_or_pull_repo(
+                repo["Name"], repo["Url"], output_dir, fetch_strategy, report
+            )
+            return success, error_msg, time.monotonic() - start
+        finally:
+            slot.release()
+
+    results: list[dict[str, object]] = []
     # 处理每个仓库
     success_count = 0
-    for i, repo in enumerate(repos, 1):
-        if repo["Name"] in ignore_repos:
-            print(f"\n[{i}/{len(repos)}] 忽略仓库: {repo['Name']}")
+    # 已完成（含失败与取消）的仓库数量
+    done = 0
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clone")
+    futures = {}
+    repo_count = 0
+
+    def _record(repo: dict[str, str], success: bool, error_msg: str, seconds: float):
+        nonlocal success_count, done
+        done += 1
+        if success:
+            status = "成功"
+            success_count += 1
+            print(f"处理成功: {repo['Name']} - 当前成功数: {success_count}/{done}")
+        elif error_msg == "已取消":
+            status = "取消"
         else:
-            print(f"\n[{i}/{len(repos)}] 处理仓库: {repo['Name']}")
-            success, error_msg = clone_or_pull_repo(
-                repo["Name"], repo["Url"], output_dir
-            )
-            if success:
-                success_count += 1
-                print(f"处理成功: {repo['Name']} - 当前成功数: {success_count}/{i}")
-            else:
-                print(f"处理失败: {repo['Name']} - {repo['Url']}")
-                repo["Error"] = error_msg
-                erRepos.append(repo)
-
-    current_date = datetime.now().strftime("%Y%m%d")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    filename = os.path.join(script_dir, f"clone_repos_error_{current_date}.log")
-    # 将仓库信息保存到JSON文件
+            status = "失败"
+            print(f"处理失败: {repo['Name']} - {repo['Url']}")
+        results.append(
+            {
+                "Name": repo["Name"],
+                "Host": repo_host(repo["Url"]),
+                "Status": status,
+                "Error": error_msg,
+                "Seconds": seconds,
+            }
+        )
+        if not success:
+            repo["Error"] = error_msg
+        # 取消的仓库没有开始执行，补一条空的运行记录
+        report = reports.pop(id(repo), None) or run_report.new_repo(
+            repo["Name"], repo["Url"]
+        )
+        report.finish(
+            {"成功": "success", "取消": "cancelled"}.get(status, "failed"), error_msg
+        )
+        run_report.add(report)
+
+    def _collect(future) -> None:
+        repo = futures.pop(future)
+        if future.cancelled():
+            _record(repo, False, "已取消", 0.0)
+            return
+        try:
+            success, error_msg, seconds = future.result()
+        except Exception as e:
+            success, error_msg, seconds = False, f"处理仓库时出错: {str(e)}", 0.0
+        _record(repo, success, error_msg, seconds)
+
     try:
-        with open(filename, mode="a", encoding="utf-8") as f:
-            json.dump(erRepos, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving to log file: {e}")
-    print(f"\n完成! 成功处理 {success_count}/{len(repos)} 个仓库")
+        # 仓库流在提交任务的同时逐个获取，先到的仓库立即开始处理，
+        # 已完成的仓库边提交边收集；获取仓库列表期间的 Ctrl-C 同样会取消尚未开始的仓库
+        for i, repo in enumerate(repos, 1):
+            repo_count = i
+            rule = repo_filter.excluded_by(repo)
+            if rule is not None:
+                print(f"\n[{i}/{total}] 忽略仓库: {repo['Name']}（{rule}）")
+            else:
+                futures[executor.submit(_process, i, repo)] = repo
+            for future in [future for future in futures if future.done()]:
+                _collect(future)
+        for future in as_completed(list(futures)):
+            _collect(future)
+    except KeyboardInterrupt:
+        print(
+            "\n收到中断信号，取消尚未开始的仓库，等待正在执行的 git 命令完成或超时..."
+        )
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in list(futures):
+            _collect(future)
+    finally:
+        executor.shutdown(wait=True)
+
+    _print_summary(results)
+    # 运行汇总（含失败仓库列表）写入运行报告，取代原来的 clone_repos_error_<日期>.log
+    run_report.summary()
+    print(f"\n完成! 成功处理 {success_count}/{repo_count} 个仓库")
+    return run_report
@@ -0,0 +1,312 @@
+"""
+按仓库家族去重的共享对象库
+
+fork、改名或复制出来的仓库共享大部分历史，各自打包完整 bundle 会把同样的对象保存很多次。
+启用去重（BUNDLE_DEDUP_STORE_DIR）后：
+    以仓库的根提交（多个根提交时取最小的）作为家族标识，同一家族的仓库共用一个裸仓库
+    {store_dir}/{family}.git，每个仓库的分支和标签保存在 refs/repos/<仓库名>/heads|tags/ 下；
+    已知家族的仓库直接从远程 fetch 到家族仓库，只传输家族中还没有的对象；
+    每个家族只输出一个 bundle（输出目录的 families/ 子目录），共享历史只保存一次；
+    每个仓库只输出一个引用清单 {repo_name}.refs.json，记录所属家族的 bundle、HEAD 和引用。
+运行结束时按 rev-list --disk-usage 统计去重前（各仓库单独保存）和去重后（家族仓库）的对象大小，打印去重比。
+
+恢复单个仓库：
+    python util_dedup_store.py <bundle输出目录> <仓库名> <恢复目标目录>
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+from util_bundle_chain import read_repo_refs
+from util_bundle_writer import remove_bundle, write_bundle, write_sidecar
+from util_repo import mkdtemp_repo, remove_temp_dir_later
+from util_run_command import run_command, run_command_return_std
+from util_verify_bundle import is_verify_enabled, verify_new_bundle
+
+FAMILY_DIR = "families"
+MANIFEST_SUFFIX = ".refs.json"
+_INDEX_FILE = "families.json"
+
+
+def manifest_path(output_dir: str, repo_name: str) -> str:
+    """引用清单与其他仓库文件保存在同一目录"""
+    return os.path.join(output_dir, f"{repo_name}{MANIFEST_SUFFIX}")
+
+
+def _repo_refspecs(repo_name: str) -> list[str]:
+    return [
+        f"+refs/heads/*:refs/repos/{repo_name}/heads/*",
+        f"+refs/tags/*:refs/repos/{repo_name}/tags/*",
+    ]
+
+
+def _disk_usage(repo_dir: str, revs: list[str]) -> int:
+    """可从 revs 到达的全部对象在磁盘上占用的字节数"""
+    success, output = run_command_return_std(
+        ["git", "rev-list", "--objects", "--disk-usage"] + revs, 900, cwd=repo_dir
+    )
+    return int(output) if success and output.isdigit() else 0
+
+
+class DedupStore:
+    """家族仓库及仓库名到家族的索引，可在多个打包线程之间共享"""
+
+    def __init__(self, store_dir: str) -> None:
+        self.store_dir = os.path.abspath(store_dir)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.store_dir, _INDEX_FILE)
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self._index: dict[str, dict] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self._index = {}
+        # 本次运行更新过的家族 -> 仓库名
+        self.touched: dict[str, set[str]] = {}
+
+    def family_path(self, family: str) -> str:
+        return os.path.join(self.store_dir, f"{family}.git")
+
+    def _save_index(self) -> None:
+        with open(f"{self._index_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._index, f, indent=2, ensure_ascii=False)
+        os.replace(f"{self._index_path}.tmp", self._index_path)
+
+    def _ensure_family(self, family: str) -> tuple[bool, str]:
+        path = self.family_path(family)
+        with self._lock:
+            if os.path.isdir(path):
+                return True, path
+            success, error_msg = run_command(
+                ["git", "init", "--bare", "--quiet", path], 60
+            )
+        return (True, path) if success else (False, error_msg)
+
+    def _identify(self, repo_name: str, repo_Url: str, temp_dir: str):
+        """首次遇到的仓库先克隆到临时目录，按根提交确定家族"""
+        print(f"  首次处理，正在克隆仓库以确定所属家族...{repo_Url}")
+        success, error_msg = run_command(
+            ["git", "clone", "--bare", "--quiet", repo_Url, temp_dir], 900
+        )
+        if not success:
+            return False, error_msg, None
+        success, roots = run_command_return_std(
+            ["git", "rev-list", "--max-parents=0", "--all"], 300, cwd=temp_dir
+        )
+        if not success:
+            return False, roots, None
+        if not roots:
+            return False, "仓库没有任何提交，无法确定家族", None
+        success, head = run_command_return_std(
+            ["git", "symbolic-ref", "HEAD"], 60, cwd=temp_dir
+        )
+        return True, min(roots.split()), head if success else None
+
+    def ingest(self, repo_name: str, repo_Url: str) -> tuple[bool, str]:
+        """
+        把仓库的分支和标签获取到所属家族的仓库中
+        :return: (是否成功, 家族标识或错误信息)
+        """
+        with self._lock:
+            entry = self._index.get(repo_name)
+        temp_dir = None
+        try:
+            if entry:
+                family, head, source = entry["family"], entry.get("head"), repo_Url
+            else:
+                temp_root_dir = os.path.join(
+                    tempfile.gettempdir(), "repositoryMananger"
+                )
+                os.makedirs(temp_root_dir, exist_ok=True)
+                temp_dir = mkdtemp_repo(repo_name, temp_root_dir)
+                success, family, head = self._identify(repo_name, repo_Url, temp_dir)
+                if not success:
+                    return False, family
+                source = temp_dir
+
+            success, family_dir = self._ensure_family(family)
+            if not success:
+                return False, family_dir
+            print(f"  所属家族: {family[:12]}，正在获取到家族仓库...")
+            # 只传输家族仓库中还没有的对象，--prune 只清理本仓库命名空间下的引用
+            success, error_msg = run_command(
+                ["git", "fetch", "--quiet", "--no-tags", "--prune", source]
+                + _repo_refspecs(repo_name),
+                900,
+                cwd=family_dir,
+            )
+            if not success:
+                return False, error_msg
+        finally:
+            if temp_dir:
+                remove_temp_dir_later(temp_dir)
+
+        with self._lock:
+            self._index[repo_name] = {"family": family, "head": head}
+            self.touched.setdefault(family, set()).add(repo_name)
+            self._save_index()
+        return True, family
+
+    def touch(self, repo_name: str) -> None:
+        """把上次中断的运行中已经获取过的仓库计入本次更新的家族，运行结束时重新创建家族bundle"""
+        with self._lock:
+            entry = self._index.get(repo_name)
+            if entry:
+                self.touched.setdefault(entry["family"], set()).add(repo_name)
+
+    def members(self, family: str) -> list[str]:
+        """家族中的全部仓库（包括本次没有处理的仓库）"""
+        with self._lock:
+            return sorted(
+                name for name, entry in self._index.items() if entry["family"] == family
+            )
+
+    def repo_refs(self, family: str, repo_name: str) -> dict[str, str]:
+        """仓库在家族仓库中的引用，还原为 refs/heads 和 refs/tags"""
+        prefix = f"refs/repos/{repo_name}/"
+        success, output = run_command_return_std(
+            ["git", "for-each-ref", "--format=%(objectname) %(refname)", prefix],
+            60,
+            cwd=self.family_path(family),
+        )
+        refs = {}
+        for line in output.splitlines() if success else []:
+            sha, _, ref = line.partition(" ")
+            refs[f"refs/{ref[len(prefix):]}"] = sha
+        return refs
+
+    def bundle_family(self, family: str, output_dir: str) -> tuple[bool, str]:
+        """
+        为家族创建 bundle，通过校验后删除该家族的旧 bundle
+        :return: (是否成功, 相对输出目录的 bundle 路径或错误信息)
+        """
+        family_output = os.path.join(output_dir, FAMILY_DIR)
+        os.makedirs(family_output, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        bundle_filename = f"{family}_{timestamp}.bundle"
+        bundle_path = os.path.join(family_output, bundle_filename)
+        family_dir = self.family_path(family)
+        success, error_msg, written = write_bundle(family_dir, bundle_path, ["--all"])
+        if not success:
+            return False, error_msg
+        success, refs = read_repo_refs(family_dir)
+        write_sidecar(bundle_path, written, refs if success else {}, "family")
+        # 新的家族bundle通过校验后才删除旧bundle
+        if is_verify_enabled():
+            success, error_msg = verify_new_bundle(
+                output_dir,
+                f"{FAMILY_DIR}/{bundle_filename}",
+                family_dir,
+                sha256=written["sha256"],
+            )
+            if not success:
+                remove_bundle(bundle_path)
+                return False, f"家族bundle校验失败: {error_msg}"
+        for file in os.listdir(family_output):
+            if (
+                file.startswith(f"{family}_")
+                and file.endswith(".bundle")
+                and file != bundle_filename
+            ):
+                try:
+                    remove_bundle(os.path.join(family_output, file))
+                except OSError as e:
+                    print(f"  删除旧家族bundle失败: {file}, 错误: {e}")
+        return True, f"{FAMILY_DIR}/{bundle_filename}"
+
+    def write_manifest(
+        self, output_dir: str, repo_name: str, family: str, bundle_file: str
+    ) -> str:
+        """写入仓库的引用清单，返回清单文件名"""
+        path = manifest_path(output_dir, repo_name)
+        with self._lock:
+            head = self._index.get(repo_name, {}).get("head")
+        manifest = {
+            "family": family,
+            "bundle": bundle_file,
+            "head": head,
+            "refs": self.repo_refs(family, repo_name),
+        }
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+        return os.path.basename(path)
+
+    def dedup_stats(self, families) -> tuple[int, int]:
+        """
+        统计家族仓库的去重效果
+        :return: (各仓库单独保存时的对象字节数之和, 家族仓库实际占用的对象字节数)
+        """
+        logical = physical = 0
+        for family in families:
+            family_dir = self.family_path(family)
+            physical += _disk_usage(family_dir, ["--all"])
+            for name in self.members(family):
+                logical += _disk_usage(family_dir, [f"--glob=refs/repos/{name}/*"])
+        return logical, physical
+
+
+def print_dedup_ratio(logical: int, physical: int) -> None:
+    ratio = logical / physical if physical else 1.0
+    print(
+        f"去重前对象大小 {logical / 1024**2:.1f} MB，"
+        f"去重后 {physical / 1024**2:.1f} MB，去重比 {ratio:.2f}:1"
+    )
+
+
+def restore_from_family(
+    output_dir: str, repo_name: str, target_dir: str
+) -> tuple[bool, str]:
+    """
+    从家族 bundle 恢复单个仓库为裸仓库，只获取该仓库引用可达的对象
+    :param output_dir: bundle 输出目录
+    :param repo_name: 仓库名
+    :param target_dir: 恢复的目标目录（将初始化为裸仓库）
+    :return: (是否成功, 错误信息)
+    """
+    try:
+        with open(manifest_path(output_dir, repo_name), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        return False, f"读取仓库 {repo_name} 的引用清单失败: {e}"
+
+    os.makedirs(target_dir, exist_ok=True)
+    success, error_msg = run_command(
+        ["git", "init", "--bare", "--quiet", target_dir], 60
+    )
+    if not success:
+        return False, error_msg
+    refspecs = [
+        f"+refs/repos/{repo_name}/heads/*:refs/heads/*",
+        f"+refs/repos/{repo_name}/tags/*:refs/tags/*",
+    ]
+    bundle_path = os.path.join(os.path.abspath(output_dir), manifest["bundle"])
+    success, error_msg = run_command_return_std(
+        ["git", "fetch", "--quiet", "--no-tags", bundle_path] + refspecs,
+        900,
+        cwd=target_dir,
+    )
+    if not success:
+        return False, f"从 {manifest['bundle']} 获取失败: {error_msg}"
+    if manifest.get("head"):
+        run_command(
+            ["git", "symbolic-ref", "HEAD", manifest["head"]], 60, cwd=target_dir
+        )
+    print(f"恢复完成: {target_dir}，共 {len(manifest['refs'])} 个引用")
+    return True, ""
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print(
+            "用法: python util_dedup_store.py <bundle输出目录> <仓库名> <恢复目标目录>"
+        )
+        sys.exit(1)
+    success, error_msg = restore_from_family(sys.argv[1], sys.argv[2], sys.argv[3])
+    if not success:
+        print(error_msg)
+        sys.exit(1)
@@ -0,0 +1,191 @@
+"""
+按磁盘空间调度 bundle 任务
+
+大仓库先克隆到临时目录，再写出差不多同样大小的 bundle，小磁盘的机器上运行到一半就可能空间不足，
+之后的仓库也会接连失败。调度器在开始处理每个仓库前：
+    估算仓库大小：优先使用列表接口给出的 Size（GitHub，单位 KB），其次是输出目录中上次 bundle 的大小，
+        都没有时使用 BUNDLE_DEFAULT_SIZE_MB（默认 100）；
+    准入控制：临时目录和输出目录（在同一个文件系统上时合并计算）的剩余空间扣除正在处理的仓库的预留后，
+        仍能容纳该仓库并保留 BUNDLE_MIN_FREE_MB（默认 512）时才开始处理；
+    空间不足时暂停等待（每 BUNDLE_DISK_POLL_SECONDS 秒检查一次，默认 30），空间释放后自动恢复，
+        超过 BUNDLE_DISK_WAIT_MINUTES（默认 60）仍不足时该仓库按失败处理；
+    超过 BUNDLE_LARGE_REPO_MB（默认 1024）的大仓库同时最多处理 BUNDLE_LARGE_WORKERS 个（默认 1），
+        仓库列表按大小交错排列，大仓库不会集中在同一时间处理。
+设置 BUNDLE_DISK_SCHEDULER=0 时关闭。
+"""
+
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from util_bundle_catalog import BundleCatalog
+from util_bundle_writer import load_sidecar
+
+_MB = 1024**2
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        value = float(os.getenv(name, ""))
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+def is_scheduler_enabled() -> bool:
+    return os.getenv("BUNDLE_DISK_SCHEDULER", "1") != "0"
+
+
+def is_out_of_space(error_msg: str) -> bool:
+    """错误信息是否由磁盘空间不足引起（git 的输出或写入 bundle 时的 OSError）"""
+    return "No space left on device" in error_msg or "Errno 28" in error_msg
+
+
+class DiskScheduler:
+    """按剩余磁盘空间准入仓库任务，可在多个打包线程之间共享"""
+
+    def __init__(self, temp_dir: str, output_dir: str, catalog: BundleCatalog) -> None:
+        """
+        :param temp_dir: 克隆仓库使用的目录（临时目录根目录或镜像缓存目录）
+        :param output_dir: bundle 输出目录
+        :param catalog: 本次运行的 bundle 目录索引，用于读取上次 bundle 的大小
+        """
+        os.makedirs(temp_dir, exist_ok=True)
+        self.paths = [temp_dir, output_dir]
+        self.catalog = catalog
+        self.min_free = int(_env_float("BUNDLE_MIN_FREE_MB", 512) * _MB)
+        self.default_size = int(_env_float("BUNDLE_DEFAULT_SIZE_MB", 100) * _MB)
+        self.large_size = int(_env_float("BUNDLE_LARGE_REPO_MB", 1024) * _MB)
+        self.poll_seconds = _env_float("BUNDLE_DISK_POLL_SECONDS", 30)
+        self.max_wait = _env_float("BUNDLE_DISK_WAIT_MINUTES", 60) * 60
+        self._large = threading.BoundedSemaphore(
+            max(1, int(_env_float("BUNDLE_LARGE_WORKERS", 1)))
+        )
+        self._cond = threading.Condition()
+        # 文件系统设备号 -> 正在处理的仓库预留的字节数
+        self._reserved: dict[int, int] = {}
+        self._running = 0
+        self.paused_seconds = 0.0
+
+    def estimate(self, repo: dict) -> int:
+        """估算仓库克隆或 bundle 的大小（字节）"""
+        if repo.get("Size"):
+            return int(repo["Size"]) * 1024
+        latest = self.catalog.latest(repo["Name"])
+        if latest:
+            manifest = load_sidecar(latest)
+            if manifest and manifest.get("size"):
+                return int(manifest["size"])
+            try:
+                return os.path.getsize(latest)
+            except OSError:
+                pass
+        return self.default_size
+
+    def order(self, repos: list[dict]) -> list[dict]:
+        """按估算大小交错排列：最大、最小、次大、次小……，避免大仓库集中在一起"""
+        ranked = sorted(repos, key=self.estimate, reverse=True)
+        ordered = []
+        while ranked:
+            ordered.append(ranked.pop(0))
+            if ranked:
+                ordered.append(ranked.pop())
+        return ordered
+
+    def _needs(self, size: int) -> dict[int, int]:
+        """临时目录和输出目录各需要 size 字节，在同一文件系统上时合并"""
+        needs: dict[int, int] = {}
+        for path in self.paths:
+            device = os.stat(path).st_dev
+            needs[device] = needs.get(device, 0) + size
+        return needs
+
+    def _fits(self, needs: dict[int, int]) -> bool:
+        for path in self.paths:
+            device = os.stat(path).st_dev
+            free = shutil.disk_usage(path).free - self._reserved.get(device, 0)
+            # 没有其他仓库在处理时只要求最低剩余空间，估算超出磁盘容量的仓库也能单独尝试
+            if self._running:
+                free -= needs[device]
+            if free < self.min_free:
+                return False
+        return True
+
+    def _wait_for(self, repo_name: str, needs: dict[int, int]) -> bool:
+        """等待到空间足够并预留，超时返回 False"""
+        start = time.monotonic()
+        paused = False
+        with self._cond:
+            while not self._fits(needs):
+                if not paused:
+                    paused = True
+                    print(
+                        f"  磁盘空间不足，暂停处理 {repo_name}"
+                        f"（需要约 {sum(needs.values()) / _MB:.0f} MB），等待空间释放..."
+                    )
+                if time.monotonic() - start > self.max_wait:
+                    return False
+                self._cond.wait(self.poll_seconds)
+            for device, size in needs.items():
+                self._reserved[device] = self._reserved.get(device, 0) + size
+            self._running += 1
+        if paused:
+            waited = time.monotonic() - start
+            with self._cond:
+                self.paused_seconds += waited
+            print(f"  磁盘空间已释放，恢复处理 {repo_name}（等待 {waited:.0f} 秒）")
+        return True
+
+    def _release(self, needs: dict[int, int]) -> None:
+        with self._cond:
+            for device, size in needs.items():
+                self._reserved[device] -= size
+            self._running -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, repo: dict):
+        """
+        等待空间足够后开始处理仓库，处理结束后释放预留
+        :return: 上下文值为是否获准处理；等待超时时为 False
+        """
+        size = self.estimate(repo)
+        needs = self._needs(size)
+        large = size >= self.large_size
+        if large:
+            self._large.acquire()
+        try:
+            if not self._wait_for(repo["Name"], needs):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                self._release(needs)
+        finally:
+            if large:
+                self._large.release()
+
+    def is_low_on_space(self) -> bool:
+        """临时目录或输出目录的剩余空间是否已低于 BUNDLE_MIN_FREE_MB"""
+        return any(shutil.disk_usage(path).free < self.min_free for path in self.paths)
+
+    def wait_for_space(self, repo_name: str) -> bool:
+        """
+        处理中遇到空间不足时，暂停到剩余空间恢复到 BUNDLE_MIN_FREE_MB 以上，超时返回 False；
+        调用前应先退出 admit 释放本仓库的预留，恢复后重新准入
+        """
+        start = time.monotonic()
+        print(f"  磁盘空间不足，暂停处理 {repo_name}，等待空间释放后重试...")
+        while self.is_low_on_space():
+            if time.monotonic() - start > self.max_wait:
+                return False
+            with self._cond:
+                self._cond.wait(self.poll_seconds)
+        waited = time.monotonic() - start
+        with self._cond:
+            self.paused_seconds += waited
+        print(f"  磁盘空间已释放，重试 {repo_name}（等待 {waited:.0f} 秒）")
+        return True
@@ -1,6 +1,25 @@
-import os
-from typing import Any, Dict, List
+"""
+仓库过滤
+
+RepoFilter 在每次运行开始时编译一次过滤规则：
+    精确的仓库名放入集合，按哈希查找；
+    包含 * ? [ 的通配符规则（如 archive-*）合并成一个正则表达式，一次匹配；
+    另外支持按大小（KB）、语言和最近推送时间过滤，仓库信息中没有对应字段时不按该条件排除。
+每个被排除的仓库都记录是哪条规则排除的，过滤结束后打印按规则汇总的统计。
 
+默认规则读取环境变量：
+    IGNORE_REPOS           忽略的仓库，逗号分隔，默认 BACKUP-CHINA
+    ONLY_PROCESS_REPOS     只处理的仓库，逗号分隔，为空时处理全部仓库
+    FILTER_MIN_SIZE_KB     仓库最小大小（KB）
+    FILTER_MAX_SIZE_KB     仓库最大大小（KB）
+    FILTER_LANGUAGES       只处理的语言，逗号分隔，不区分大小写
+    FILTER_PUSHED_SINCE    只处理该时间之后有推送的仓库（ISO 8601，如 2024-01-01）
+"""
+
+import fnmatch
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 IGNORE_REPOS = (
     os.getenv("IGNORE_REPOS", "").split(",")
@@ -13,22 +32,202 @@ ONLY_PROCESS_REPOS = (
     else []
 )
 
+_GLOB_CHARS = "*?["
+
+
+class _NameMatcher:
+    """精确名称用集合查找，通配符规则合并为一个正则表达式"""
+
+    def __init__(self, rules: Iterable[str]) -> None:
+        self.exact: set[str] = set()
+        self.patterns: List[str] = []
+        for rule in rules:
+            rule = rule.strip()
+            if not rule:
+                continue
+            if any(c in rule for c in _GLOB_CHARS):
+                self.patterns.append(rule)
+            else:
+                self.exact.add(rule)
+        # 每个通配符规则一个命名分组，匹配后通过 lastgroup 得到是哪条规则
+        self._regex = (
+            re.compile(
+                "|".join(
+                    f"(?P<p{i}>{fnmatch.translate(pattern)})"
+                    for i, pattern in enumerate(self.patterns)
+                )
+            )
+            if self.patterns
+            else None
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.exact or self.patterns)
+
+    def match(self, name: str) -> Optional[str]:
+        """返回匹配的规则，不匹配时返回 None"""
+        if name in self.exact:
+            return name
+        if self._regex is not None:
+            m = self._regex.match(name)
+            if m is not None:
+                return self.patterns[int(m.lastgroup[1:])]
+        return None
+
+    def describe(self) -> List[str]:
+        return sorted(self.exact) + self.patterns
+
+
+def _env_int(name: str) -> Optional[int]:
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _env_list(name: str) -> List[str]:
+    return [item for item in os.getenv(name, "").split(",") if item.strip()]
+
+
+class RepoFilter:
+    """编译后的仓库过滤规则，每次运行构建一次，可以对多个仓库列表或仓库流重复使用"""
+
+    def __init__(
+        self,
+        ignore: Iterable[str] = (),
+        only: Iterable[str] = (),
+        min_size_kb: Optional[int] = None,
+        max_size_kb: Optional[int] = None,
+        languages: Iterable[str] = (),
+        pushed_since: Optional[str] = None,
+    ) -> None:
+        """
+        :param ignore: 忽略的仓库名或通配符规则
+        :param only: 只处理的仓库名或通配符规则，为空时处理全部仓库
+        :param min_size_kb: 仓库最小大小（KB），按仓库信息中的 Size 判断
+        :param max_size_kb: 仓库最大大小（KB）
+        :param languages: 只处理的语言，按仓库信息中的 Language 判断，不区分大小写
+        :param pushed_since: 只处理该时间之后有推送的仓库，按仓库信息中的 PushedAt 判断
+        """
+        self.ignore = _NameMatcher(ignore)
+        self.only = _NameMatcher(only)
+        self.min_size_kb = min_size_kb
+        self.max_size_kb = max_size_kb
+        self.languages = {language.strip().lower() for language in languages}
+        self.languages.discard("")
+        self.pushed_since = pushed_since or None
+        # 规则 -> 被该规则排除的仓库名
+        self.excluded: Dict[str, List[str]] = {}
+
+    @classmethod
+    def from_env(cls) -> "RepoFilter":
+        """按环境变量构建默认规则"""
+        return cls(
+            ignore=IGNORE_REPOS,
+            only=ONLY_PROCESS_REPOS,
+            min_size_kb=_env_int("FILTER_MIN_SIZE_KB"),
+            max_size_kb=_env_int("FILTER_MAX_SIZE_KB"),
+            languages=_env_list("FILTER_LANGUAGES"),
+            pushed_since=os.getenv("FILTER_PUSHED_SINCE"),
+        )
+
+    def excluded_by(self, repo: Dict[str, Any]) -> Optional[str]:
+        """返回排除该仓库的规则，仓库通过过滤时返回 None"""
+        name = repo["Name"]
+        rule = self.ignore.match(name)
+        if rule is not None:
+            return f"IGNORE_REPOS: {rule}"
+        if self.only and self.only.match(name) is None:
+            return "不在 ONLY_PROCESS_REPOS 中"
+        size = repo.get("Size")
+        if size is not None:
+            if self.min_size_kb is not None and size < self.min_size_kb:
+                return f"小于 {self.min_size_kb} KB"
+            if self.max_size_kb is not None and size > self.max_size_kb:
+                return f"大于 {self.max_size_kb} KB"
+        language = repo.get("Language")
+        if self.languages and language and language.lower() not in self.languages:
+            return f"语言不在 {sorted(self.languages)} 中"
+        pushed_at = repo.get("PushedAt")
+        # 都是 ISO 8601 时间，可以直接按字符串比较
+        if self.pushed_since and pushed_at and pushed_at < self.pushed_since:
+            return f"{self.pushed_since} 之后没有推送"
+        return None
+
+    def __call__(self, repo: Dict[str, Any]) -> bool:
+        """仓库是否通过过滤，被排除时记录排除的规则"""
+        rule = self.excluded_by(repo)
+        if rule is None:
+            return True
+        self.excluded.setdefault(rule, []).append(repo["Name"])
+        return False
+
+    def print_rules(self) -> None:
+        if not self.only:
+            print(f"处理全部仓库，但忽略仓库: {self.ignore.describe()}")
+        else:
+            print(
+                f"只处理仓库: {self.only.describe()}，"
+                f"而且忽略其中的仓库: {self.ignore.describe()}"
+            )
+        if self.min_size_kb is not None or self.max_size_kb is not None:
+            print(f"仓库大小范围: {self.min_size_kb} ~ {self.max_size_kb} KB")
+        if self.languages:
+            print(f"只处理语言: {sorted(self.languages)}")
+        if self.pushed_since:
+            print(f"只处理 {self.pushed_since} 之后有推送的仓库")
+
+    def print_excluded(self, limit: int = 10) -> None:
+        """按规则打印被排除的仓库，每条规则最多列出 limit 个仓库名"""
+        for rule, names in sorted(self.excluded.items(), key=lambda x: -len(x[1])):
+            shown = ", ".join(names[:limit])
+            more = f" 等 {len(names)} 个" if len(names) > limit else ""
+            print(f"  [{rule}] 排除 {len(names)} 个仓库: {shown}{more}")
+
+    def iter_filter(self, repos: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """逐个过滤仓库，适用于边获取边处理的仓库流，全部处理完后打印过滤统计"""
+        self.print_rules()
+        self.excluded = {}
+        all_repos = 0
+        filtered = 0
+        for repo in repos:
+            all_repos += 1
+            if self(repo):
+                filtered += 1
+                yield repo
+        print(f"过滤前仓库数量: {all_repos}, 过滤后仓库数量: {filtered}")
+        self.print_excluded()
+
+    def filter(self, repos: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return list(self.iter_filter(repos))
+
+
+_default_filter: Optional[RepoFilter] = None
+
+
+def default_filter() -> RepoFilter:
+    """按环境变量构建的默认规则，首次使用时编译一次"""
+    global _default_filter
+    if _default_filter is None:
+        _default_filter = RepoFilter.from_env()
+    return _default_filter
+
+
+def is_repo_included(
+    repo: Dict[str, Any], repo_filter: Optional[RepoFilter] = None
+) -> bool:
+    """仓库是否通过过滤，默认使用环境变量配置的规则"""
+    return (repo_filter or default_filter()).excluded_by(repo) is None
+
+
+def iter_filter_repos(
+    repos: Iterable[Dict[str, Any]], repo_filter: Optional[RepoFilter] = None
+) -> Iterator[Dict[str, Any]]:
+    """逐个过滤仓库，见 RepoFilter.iter_filter"""
+    return (repo_filter or default_filter()).iter_filter(repos)
+
 
-def filter_repos(repos: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    all_repos = len(repos)
-    filtered_repos = []
-
-    # print(f"只处理仓库: {ONLY_PROCESS_REPOS}")
-    if not ONLY_PROCESS_REPOS or len(ONLY_PROCESS_REPOS) == 0:
-        print(f"处理全部仓库，但忽略仓库: {IGNORE_REPOS}")
-        filtered_repos = [repo for repo in repos if repo["Name"] not in IGNORE_REPOS]
-    else:
-        print(f"只处理仓库: {ONLY_PROCESS_REPOS}，而且忽略其中的仓库: {IGNORE_REPOS}")
-        filtered_repos = [
-            repo
-            for repo in repos
-            if repo["Name"] in ONLY_PROCESS_REPOS and repo["Name"] not in IGNORE_REPOS
-        ]
-    filtered = len(filtered_repos)
-    print(f"过滤前仓库数量: {all_repos}, 过滤后仓库数量: {filtered}")
-    return filtered_repos
+def filter_repos(
+    repos: List[Dict[str, Any]], repo_filter: Optional[RepoFilter] = None
+) -> List[Dict[str, Any]]:
+    return (repo_filter or default_filter()).filter(repos)
@@ -0,0 +1,320 @@
+"""
+仓库清单（SQLite）
+
+用一个本地 SQLite 数据库代替每次运行写入的带日期 JSON 快照，保存：
+    repos   每个来源（provider/org）列出的仓库、地址、pushed_at/updated_at 和首次/最近出现时间
+    runs    每个流程（bundle/clone）中每个来源的每个仓库最近一次的结果：状态、错误、引用指纹、bundle 文件、大小和耗时
+    state   每个流程中每个来源的每个仓库最近一次成功处理时的 pushed_at（见 util_repo_state）
+runs 和 state 与 repos 一样按 provider/org/name 区分仓库，不同来源的同名仓库互不覆盖。
+仓库名、来源和变更时间都建有索引，选择性运行和报表直接查询数据库，不再解析越来越多的 JSON 文件。
+数据库路径由环境变量 REPO_INVENTORY_DB 指定，默认 repos/inventory.sqlite3。
+
+命令行报表：
+    python util_inventory.py failed <bundle|clone>    最近一次运行失败的仓库
+    python util_inventory.py changed <时间>            该时间之后有推送的仓库（ISO 8601，如 2024-01-01T00:00:00Z）
+    python util_inventory.py repo <仓库名>             仓库的清单信息和各流程的最近结果
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+
+from util_repo import save_to_json
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    provider TEXT NOT NULL,
+    org TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT,
+    pushed_at TEXT,
+    updated_at TEXT,
+    raw TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (provider, org, name)
+);
+CREATE INDEX IF NOT EXISTS idx_repos_name ON repos (name);
+CREATE INDEX IF NOT EXISTS idx_repos_pushed ON repos (provider, pushed_at);
+
+CREATE TABLE IF NOT EXISTS runs (
+    kind TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    org TEXT NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT,
+    status TEXT,
+    error TEXT,
+    strategy TEXT,
+    fingerprint TEXT,
+    bundle_file TEXT,
+    bundle_bytes INTEGER,
+    bytes_transferred INTEGER,
+    seconds REAL,
+    stages TEXT,
+    finished_at TEXT NOT NULL,
+    last_success_at TEXT,
+    PRIMARY KEY (kind, provider, org, name)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (kind, status);
+CREATE INDEX IF NOT EXISTS idx_runs_finished ON runs (finished_at);
+
+CREATE TABLE IF NOT EXISTS state (
+    kind TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    org TEXT NOT NULL,
+    name TEXT NOT NULL,
+    pushed_at TEXT NOT NULL,
+    PRIMARY KEY (kind, provider, org, name)
+);
+"""
+
+
+def default_db_path() -> str:
+    return os.getenv("REPO_INVENTORY_DB") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "repos", "inventory.sqlite3"
+    )
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class Inventory:
+    """仓库清单数据库，可在多个线程之间共享"""
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path or default_db_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        # WAL 模式下读取不阻塞写入，多个进程同时运行也不会互相锁死
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def upsert_repos(self, provider: str, org: str, repos: list[dict]) -> int:
+        """
+        写入一次列表结果，已存在的仓库更新地址、变更时间和最近出现时间
+        :param provider: 来源，如 github、coding
+        :param org: 组织或团队
+        :param repos: 列表接口返回的仓库信息（GitHub 的 name/clone_url 或 Coding 的 Name/DepotHttpsUrl）
+        :return: 写入的仓库数量
+        """
+        now = _now()
+        rows = [
+            (
+                provider,
+                org,
+                repo.get("name") or repo.get("Name"),
+                repo.get("clone_url") or repo.get("DepotHttpsUrl") or repo.get("Url"),
+                repo.get("pushed_at"),
+                repo.get("updated_at"),
+                json.dumps(repo, ensure_ascii=False),
+                now,
+                now,
+            )
+            for repo in repos
+            if isinstance(repo, dict) and (repo.get("name") or repo.get("Name"))
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO repos (provider, org, name, url, pushed_at, updated_at, raw,
+                                   first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (provider, org, name) DO UPDATE SET
+                    url = excluded.url,
+                    pushed_at = excluded.pushed_at,
+                    updated_at = excluded.updated_at,
+                    raw = excluded.raw,
+                    last_seen = excluded.last_seen
+                """,
+                rows,
+            )
+        print(f"已写入仓库清单: {len(rows)} 个仓库 ({provider}/{org}) -> {self.path}")
+        return len(rows)
+
+    def record_run(
+        self, kind: str, record: dict, provider: str = "", org: str = ""
+    ) -> None:
+        """
+        写入一个仓库在 bundle/clone 流程中的最近一次结果（util_run_report 的仓库记录）
+        :param provider: 仓库来源，如 github、coding
+        :param org: 组织或团队
+        """
+        now = _now()
+        success = record["status"] in ("success", "skipped")
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO runs (kind, provider, org, name, url, status, error, strategy,
+                                  fingerprint, bundle_file, bundle_bytes, bytes_transferred,
+                                  seconds, stages, finished_at, last_success_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (kind, provider, org, name) DO UPDATE SET
+                    url = excluded.url,
+                    status = excluded.status,
+                    error = excluded.error,
+                    strategy = COALESCE(excluded.strategy, runs.strategy),
+                    fingerprint = COALESCE(excluded.fingerprint, runs.fingerprint),
+                    bundle_file = COALESCE(excluded.bundle_file, runs.bundle_file),
+                    bundle_bytes = CASE WHEN excluded.bundle_bytes > 0
+                        THEN excluded.bundle_bytes ELSE runs.bundle_bytes END,
+                    bytes_transferred = excluded.bytes_transferred,
+                    seconds = excluded.seconds,
+                    stages = excluded.stages,
+                    finished_at = excluded.finished_at,
+                    last_success_at = COALESCE(excluded.last_success_at,
+                                               runs.last_success_at)
+                """,
+                (
+                    kind,
+                    provider,
+                    org,
+                    record["repo"],
+                    record.get("url"),
+                    record["status"],
+                    record.get("error") or None,
+                    record.get("strategy"),
+                    record.get("fingerprint"),
+                    record.get("bundle_file"),
+                    record.get("bundle_bytes", 0),
+                    record.get("bytes_transferred", 0),
+                    record.get("total_seconds"),
+                    json.dumps(record.get("stages", {})),
+                    now,
+                    now if success else None,
+                ),
+            )
+
+    def load_state(self, kind: str, provider: str, org: str) -> dict[str, str]:
+        """流程在一个来源上的处理状态：仓库名到上次成功处理时 pushed_at 的映射"""
+        rows = self._query(
+            "SELECT name, pushed_at FROM state WHERE kind = ? AND provider = ? AND org = ?",
+            (kind, provider, org),
+        )
+        return {row["name"]: row["pushed_at"] for row in rows}
+
+    def save_state(
+        self, kind: str, provider: str, org: str, state: dict[str, str]
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO state (kind, provider, org, name, pushed_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (kind, provider, org, name)
+                DO UPDATE SET pushed_at = excluded.pushed_at
+                """,
+                [
+                    (kind, provider, org, name, pushed_at)
+                    for name, pushed_at in state.items()
+                ],
+            )
+
+    def get_repo(self, name: str, provider: str | None = None) -> list[dict]:
+        """按仓库名查询（不同来源可能有同名仓库）"""
+        if provider:
+            return self._query(
+                "SELECT * FROM repos WHERE name = ? AND provider = ?", (name, provider)
+            )
+        return self._query("SELECT * FROM repos WHERE name = ?", (name,))
+
+    def repos_by_provider(self, provider: str, org: str | None = None) -> list[dict]:
+        if org:
+            return self._query(
+                "SELECT * FROM repos WHERE provider = ? AND org = ? ORDER BY name",
+                (provider, org),
+            )
+        return self._query(
+            "SELECT * FROM repos WHERE provider = ? ORDER BY name", (provider,)
+        )
+
+    def changed_since(self, since: str, provider: str | None = None) -> list[dict]:
+        """pushed_at 晚于指定时间的仓库，按推送时间从新到旧排列"""
+        if provider:
+            return self._query(
+                "SELECT * FROM repos WHERE provider = ? AND pushed_at > ? "
+                "ORDER BY pushed_at DESC",
+                (provider, since),
+            )
+        return self._query(
+            "SELECT * FROM repos WHERE pushed_at > ? ORDER BY pushed_at DESC", (since,)
+        )
+
+    def last_runs(self, name: str) -> list[dict]:
+        """仓库在各流程中的最近一次结果"""
+        return self._query(
+            "SELECT * FROM runs WHERE name = ? ORDER BY kind, provider, org", (name,)
+        )
+
+    def failed_runs(self, kind: str) -> list[dict]:
+        return self._query(
+            "SELECT * FROM runs WHERE kind = ? AND status = 'failed' "
+            "ORDER BY provider, org, name",
+            (kind,),
+        )
+
+
+def save_listing(provider: str, org: str, repos: list[dict], prefix: str) -> None:
+    """
+    保存一次仓库列表结果到清单数据库；设置环境变量 REPO_JSON_SNAPSHOT=1 时同时写入带日期的 JSON 快照
+    :param provider: 来源，如 github、coding
+    :param org: 组织或团队
+    :param repos: 列表接口返回的仓库信息
+    :param prefix: JSON 快照文件名前缀
+    """
+    try:
+        inventory = Inventory()
+        inventory.upsert_repos(provider, org, repos)
+        inventory.close()
+    except sqlite3.Error as e:
+        print(f"写入仓库清单失败: {e}")
+    if os.getenv("REPO_JSON_SNAPSHOT", "0") == "1":
+        save_to_json(org, repos, prefix)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("failed", "changed", "repo"):
+        print(
+            "用法: python util_inventory.py failed <bundle|clone> | "
+            "changed <时间> | repo <仓库名>"
+        )
+        sys.exit(1)
+    inventory = Inventory()
+    command, argument = sys.argv[1], sys.argv[2]
+    if command == "failed":
+        for row in inventory.failed_runs(argument):
+            print(
+                f"{row['provider']}/{row['org']}/{row['name']}\t"
+                f"{row['finished_at']}\t{row['error']}"
+            )
+    elif command == "changed":
+        for row in inventory.changed_since(argument):
+            print(f"{row['provider']}/{row['org']}/{row['name']}\t{row['pushed_at']}")
+    else:
+        for row in inventory.get_repo(argument):
+            print(
+                f"{row['provider']}/{row['org']}/{row['name']}\t{row['url']}\t"
+                f"pushed_at={row['pushed_at']}\tlast_seen={row['last_seen']}"
+            )
+        for row in inventory.last_runs(argument):
+            print(
+                f"[{row['kind']} {row['provider']}/{row['org']}] "
+                f"{row['status']}\t{row['finished_at']}\t"
+                f"bundle={row['bundle_file']}\t{row['bundle_bytes']} 字节\t"
+                f"{row['seconds']} 秒\t{row['error'] or ''}"
+            )
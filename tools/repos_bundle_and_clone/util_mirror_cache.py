@@ -0,0 +1,164 @@
+"""
+持久化裸镜像缓存
+
+每个仓库在缓存目录中保留一个长期存在的裸镜像 {repo_name}.git，
+后续运行只需 git remote update --prune 获取增量对象，并直接在镜像中创建 bundle，
+避免每次都在临时目录中完整克隆和检出。
+更新失败时保留镜像，只有本地完整性检查不通过时才删除重建。
+缓存总大小超过上限时，按最后访问时间淘汰最久未使用的镜像。
+"""
+
+import os
+import shutil
+import time
+
+from util_repo import dir_size, remove_readonly
+from util_run_command import KEEP_PACK_CONFIG, run_command, run_command_return_std
+
+MIRROR_SUFFIX = ".git"
+
+
+def mirror_path(cache_dir: str, repo_name: str) -> str:
+    """仓库在缓存目录中的镜像路径"""
+    return os.path.join(os.path.abspath(cache_dir), f"{repo_name}{MIRROR_SUFFIX}")
+
+
+def configure_origin(path: str, repo_Url: str) -> tuple[bool, str]:
+    """
+    把裸仓库的 origin 配置为镜像方式：分支和标签直接同步到 refs/heads 和 refs/tags，
+    效果等同于 git clone --mirror，但不会把 refs/pull/* 等引用打进 bundle
+    """
+    success, _ = run_command(["git", "remote", "get-url", "origin"], 60, cwd=path)
+    remote_command = "set-url" if success else "add"
+    for command in (
+        ["git", "remote", remote_command, "origin", repo_Url],
+        ["git", "config", "remote.origin.mirror", "true"],
+        ["git", "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*"],
+        ["git", "config", "--add", "remote.origin.fetch", "+refs/tags/*:refs/tags/*"],
+    ):
+        success, error_msg = run_command(command, 60, cwd=path)
+        if not success:
+            return False, error_msg
+    return True, ""
+
+
+def _init_mirror(path: str, repo_Url: str) -> tuple[bool, str]:
+    """初始化空的镜像仓库"""
+    success, error_msg = run_command(["git", "init", "--bare", "--quiet", path], 60)
+    if not success:
+        return False, error_msg
+    return configure_origin(path, repo_Url)
+
+
+def _sync_head(path: str) -> None:
+    """让镜像的 HEAD 指向远程默认分支，保证从 bundle 克隆时可以正常检出"""
+    success, output = run_command_return_std(
+        ["git", "ls-remote", "--symref", "origin", "HEAD"], 60, cwd=path
+    )
+    for line in output.splitlines() if success else []:
+        if line.startswith("ref: ") and line.endswith("\tHEAD"):
+            head_ref = line[len("ref: ") : -len("\tHEAD")]
+            run_command(["git", "symbolic-ref", "HEAD", head_ref], 60, cwd=path)
+            return
+
+
+def _is_intact(path: str, connectivity: bool = False) -> bool:
+    """
+    检查镜像在本地是否完好
+    :param connectivity: 是否同时检查对象连通性（git fsck --connectivity-only，大仓库上较慢）
+    """
+    # 显式指定 --git-dir，镜像目录损坏时不会向上找到外层的仓库
+    git = ["git", "--git-dir", path]
+    success, _ = run_command_return_std([*git, "rev-parse", "--git-dir"], 60)
+    if success and connectivity:
+        success, _ = run_command_return_std(
+            [*git, "fsck", "--connectivity-only", "--no-progress"], 1800
+        )
+    return success
+
+
+def _remove_mirror(path: str) -> bool:
+    try:
+        shutil.rmtree(path, onerror=remove_readonly)
+    except OSError as e:
+        print(f"  删除镜像缓存失败: {path}, 错误: {e}")
+        return False
+    return True
+
+
+def update_mirror(cache_dir: str, repo_name: str, repo_Url: str) -> tuple[bool, str]:
+    """
+    创建或更新仓库的镜像缓存
+    :param cache_dir: 镜像缓存目录
+    :param repo_name: 仓库名
+    :param repo_Url: 仓库地址
+    :return: (是否成功, 镜像路径或错误信息)
+    """
+    path = mirror_path(cache_dir, repo_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if os.path.isdir(path) and _is_intact(path):
+        success, error_msg = run_command(
+            ["git", "remote", "set-url", "origin", repo_Url], 60, cwd=path
+        )
+        if success:
+            success, error_msg = run_command(
+                ["git", *KEEP_PACK_CONFIG, "remote", "update", "--prune"], 900, cwd=path
+            )
+        if success:
+            touch_mirror(path)
+            return True, path
+        # 网络、认证或远程服务错误时保留镜像，下次运行继续增量更新；
+        # 只有本地对象不完整时才重新创建
+        if _is_intact(path, connectivity=True):
+            return False, f"更新镜像缓存失败: {error_msg}"
+        print(f"  镜像缓存已损坏，将重新创建: {error_msg}")
+    if os.path.isdir(path) and not _remove_mirror(path):
+        return False, f"镜像缓存已损坏且无法删除: {path}"
+
+    success, error_msg = _init_mirror(path, repo_Url)
+    if success:
+        success, error_msg = run_command(
+            ["git", *KEEP_PACK_CONFIG, "remote", "update", "--prune"], 900, cwd=path
+        )
+    if not success:
+        _remove_mirror(path)
+        return False, error_msg
+    _sync_head(path)
+    touch_mirror(path)
+    return True, path
+
+
+def touch_mirror(path: str) -> None:
+    """记录镜像的最后访问时间（目录修改时间），用于 LRU 淘汰"""
+    now = time.time()
+    os.utime(path, (now, now))
+
+
+def evict_mirrors(cache_dir: str, max_bytes: int) -> None:
+    """
+    缓存总大小超过上限时，按最后访问时间从旧到新删除镜像
+    :param cache_dir: 镜像缓存目录
+    :param max_bytes: 缓存大小上限（字节）
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    mirrors = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir() and entry.name.endswith(MIRROR_SUFFIX):
+            mirrors.append((entry.stat().st_mtime, dir_size(entry.path), entry.path))
+
+    total = sum(size for _, size, _ in mirrors)
+    print(f"镜像缓存: {len(mirrors)} 个镜像，共 {total / 1024**3:.2f} GB")
+    for _, size, path in sorted(mirrors):
+        if total <= max_bytes:
+            break
+        try:
+            shutil.rmtree(path, onerror=remove_readonly)
+            total -= size
+            print(
+                f"  已淘汰镜像缓存: {os.path.basename(path)}，"
+                f"释放 {size / 1024**2:.1f} MB"
+            )
+        except OSError as e:
+            print(f"  淘汰镜像缓存失败: {path}, 错误: {e}")
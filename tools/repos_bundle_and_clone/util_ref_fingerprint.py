@@ -0,0 +1,99 @@
+"""
+远程引用指纹缓存
+
+打包前通过 git ls-remote 获取远程仓库的分支与标签，计算引用集合的哈希值，
+并与保存在 bundle 输出目录中的上次指纹比较，引用没有变化的仓库可以直接跳过打包。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+
+from util_run_command import run_command_return_std, run_commands_async
+
+FINGERPRINT_SUFFIX = ".fingerprint.json"
+
+
+def _ls_remote_command(repo_Url: str) -> list[str]:
+    # 只比较 fetch 会获取的分支和标签，避免 refs/pull/* 之类的引用频繁变化
+    return ["git", "ls-remote", "--heads", "--tags", repo_Url]
+
+
+def _hash_refs(output: str) -> str:
+    refs = sorted(line.strip() for line in output.splitlines() if line.strip())
+    return hashlib.sha256("\n".join(refs).encode("utf-8")).hexdigest()
+
+
+def remote_fingerprint(repo_Url: str, timeout: int = 120) -> tuple[bool, str]:
+    """
+    计算远程仓库引用集合的指纹
+    :param repo_Url: 仓库地址
+    :param timeout: 超时时间（秒）
+    :return: (是否成功, 指纹或错误信息)
+    """
+    success, output = run_command_return_std(_ls_remote_command(repo_Url), timeout)
+    if not success:
+        return False, output
+    return True, _hash_refs(output)
+
+
+def fingerprint_path(output_dir: str, repo_name: str) -> str:
+    """指纹文件与 bundle 文件保存在同一目录"""
+    return os.path.join(output_dir, f"{repo_name}{FINGERPRINT_SUFFIX}")
+
+
+def load_fingerprint(output_dir: str, repo_name: str) -> dict | None:
+    """读取仓库上次打包时保存的指纹记录，不存在或损坏时返回 None"""
+    try:
+        with open(fingerprint_path(output_dir, repo_name), "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def save_fingerprint(
+    output_dir: str, repo_name: str, fingerprint: str, bundle_filename: str
+) -> None:
+    """保存指纹记录，先写临时文件再替换，避免中断时留下损坏的记录"""
+    path = fingerprint_path(output_dir, repo_name)
+    record = {"fingerprint": fingerprint, "bundle": bundle_filename}
+    try:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"  保存引用指纹失败: {e}")
+
+
+def is_unchanged(output_dir: str, repo_name: str, fingerprint: str | None) -> bool:
+    """远程引用与上次打包时一致，且上次生成的 bundle 仍然存在"""
+    if not fingerprint:
+        return False
+    record = load_fingerprint(output_dir, repo_name)
+    if not record or record.get("fingerprint") != fingerprint:
+        return False
+    return os.path.isfile(os.path.join(output_dir, record.get("bundle", "")))
+
+
+def compute_fingerprints(
+    repos: list[dict[str, str]], workers: int = 8
+) -> dict[str, str | None]:
+    """
+    批量计算仓库的远程引用指纹，通过异步执行器并发运行 ls-remote
+    :param repos: 仓库信息列表，每项包含 Name 和 Url
+    :param workers: 并发执行 ls-remote 的数量
+    :return: 仓库名到指纹的映射，获取失败的仓库为 None
+    """
+    results = asyncio.run(
+        run_commands_async(
+            [_ls_remote_command(repo["Url"]) for repo in repos], workers, timeout=120
+        )
+    )
+    fingerprints: dict[str, str | None] = {}
+    for repo, (success, output) in zip(repos, results):
+        if not success:
+            print(f"  获取远程引用失败: {repo['Name']} - {output}")
+        fingerprints[repo["Name"]] = _hash_refs(output) if success else None
+    return fingerprints
@@ -4,6 +4,13 @@ import os
 import shutil
 import stat
 import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# 临时仓库目录的命名：tempRepo_<仓库名>_xxxx_gitRepo（mkdtemp_repo）、verifyBundle_xxxx_gitRepo（util_verify_bundle）
+TEMP_PREFIXES = ("tempRepo_", "verifyBundle_")
+TEMP_SUFFIX = "_gitRepo"
 
 
 def save_to_json(org, all_repos, prefix):
@@ -52,14 +59,13 @@ def read_repos_from_json(json_file_path: str) -> list[dict[str, str]]:
         return []
 
 
-def mkdtemp_chdir(repo_name, temp_root_dir):
-    """创建临时目录，并切换到该目录"""
+def mkdtemp_repo(repo_name, temp_root_dir):
+    """为仓库创建独立的临时目录（不切换进程工作目录，可在多线程中安全使用）"""
     temp_dir = tempfile.mkdtemp(
         prefix=os.path.normpath(f"tempRepo_{repo_name}_"),
         suffix="_gitRepo",
         dir=temp_root_dir,
     )
-    os.chdir(temp_dir)
     return temp_dir
 
 
@@ -69,21 +75,128 @@ def remove_readonly(func, path, _):
     func(path)
 
 
-def cleanup_temp_dir(target_dir: str) -> None:
-    for root, dirs, files in os.walk(target_dir):
-        # for file in files:
-        #     file_path = os.path.join(root, file)
-        #     try:
-        #         os.chmod(file_path, stat.S_IWRITE)  # 修改文件权限
-        #         os.unlink(file_path)
-        #         # print(f"已删除文件: {file_path}")
-        #     except OSError as e:
-        #         # print(f"删除文件失败: {file_path}, 错误: {str(e)}")
-        #         pass
-        for dir in dirs:
-            dir_path = os.path.join(root, dir)
+def dir_size(path: str) -> int:
+    """统计目录占用的字节数"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(root, file)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def pack_files(objects_dir: str) -> dict[str, int]:
+    """对象目录中的 pack 文件名及大小"""
+    pack_dir = os.path.join(objects_dir, "pack")
+    packs = {}
+    try:
+        names = os.listdir(pack_dir)
+    except FileNotFoundError:
+        return packs
+    for name in names:
+        if name.endswith(".pack"):
             try:
-                shutil.rmtree(dir_path, onerror=remove_readonly)  # 处理只读文件
-            except OSError as e:
-                # print(f"删除目录失败: {dir_path}, 错误: {str(e)}")
+                packs[name] = os.path.getsize(os.path.join(pack_dir, name))
+            except OSError:
                 pass
+    return packs
+
+
+def received_bytes(objects_dir: str, before: dict[str, int]) -> int:
+    """
+    本次 clone/fetch 接收的字节数：之后新出现的 pack 文件大小之和
+    （获取时需使用 util_run_command.KEEP_PACK_CONFIG，让接收的对象总是保存为新的 pack）
+    """
+    return sum(
+        size for name, size in pack_files(objects_dir).items() if name not in before
+    )
+
+
+def remove_temp_dir(temp_dir: str) -> None:
+    """只删除指定仓库的临时目录，不影响其他并发任务的目录"""
+    try:
+        shutil.rmtree(temp_dir, onerror=remove_readonly)
+    except OSError as e:
+        print(f"  删除临时目录失败: {temp_dir}, 错误: {str(e)}")
+
+
+class _TempDirReaper:
+    """后台删除临时目录，仓库处理完后不必等待大目录删除完成"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._futures: list[Future] = []
+
+    def submit(self, temp_dir: str) -> None:
+        with self._lock:
+            if self._executor is None:
+                try:
+                    workers = max(1, int(os.getenv("TEMP_CLEANUP_WORKERS", "2")))
+                except ValueError:
+                    workers = 2
+                self._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="cleanup"
+                )
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(self._executor.submit(remove_temp_dir, temp_dir))
+
+    def wait(self) -> None:
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+
+_reaper = _TempDirReaper()
+
+
+def remove_temp_dir_later(temp_dir: str) -> None:
+    """把仓库的临时目录交给后台线程池删除（线程数由 TEMP_CLEANUP_WORKERS 控制，默认 2）"""
+    _reaper.submit(temp_dir)
+
+
+def wait_temp_cleanup() -> None:
+    """等待后台删除全部完成，在运行结束时调用"""
+    _reaper.wait()
+
+
+def cleanup_temp_dir(target_dir: str, max_age_hours: float | None = None) -> int:
+    """
+    启动时清理以前运行遗留的临时仓库目录（tempRepo_*_gitRepo）
+    只检查 target_dir 的第一层，删除交给后台线程池并行执行；
+    只删除超过 max_age_hours 没有修改的目录，不影响同时运行的其他任务
+    :param target_dir: 临时目录根目录
+    :param max_age_hours: 视为遗留目录的最短未修改时间，为空时读取环境变量 TEMP_STALE_HOURS（默认 12）
+    :return: 删除的目录数量
+    """
+    if max_age_hours is None:
+        try:
+            max_age_hours = float(os.getenv("TEMP_STALE_HOURS", "12"))
+        except ValueError:
+            max_age_hours = 12
+    deadline = time.time() - max_age_hours * 3600
+    stale = []
+    try:
+        entries = list(os.scandir(target_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not (
+            entry.name.startswith(TEMP_PREFIXES)
+            and entry.name.endswith(TEMP_SUFFIX)
+            and entry.is_dir(follow_symlinks=False)
+        ):
+            continue
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime < deadline:
+                stale.append(entry.path)
+        except OSError:
+            pass
+    for temp_dir in stale:
+        remove_temp_dir_later(temp_dir)
+    if stale:
+        print(f"正在后台清理以前运行遗留的 {len(stale)} 个临时目录: {target_dir}")
+    return len(stale)
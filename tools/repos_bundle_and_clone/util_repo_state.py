@@ -0,0 +1,71 @@
+"""
+仓库处理状态
+
+按流程（bundle、clone）和来源（provider/org，如 github/<org>）记录每个仓库最近一次成功处理时的 pushed_at，
+保存在仓库清单数据库的 state 表中（见 util_inventory）。
+GitHub 的仓库列表接口本身就返回 pushed_at，与记录比较即可只处理上次成功运行之后有推送的仓库，
+不需要对每个仓库执行 git ls-remote。设置环境变量 FULL_RUN=1 或传入 --full 参数时处理全部仓库。
+"""
+
+import os
+import sys
+
+from util_inventory import Inventory
+
+
+def load_state(kind: str, provider: str, org: str) -> dict[str, str]:
+    """读取流程在一个来源上的处理状态：仓库名到上次成功处理时 pushed_at 的映射"""
+    inventory = Inventory()
+    try:
+        return inventory.load_state(kind, provider, org)
+    finally:
+        inventory.close()
+
+
+def save_state(kind: str, provider: str, org: str, state: dict[str, str]) -> None:
+    """保存处理状态"""
+    inventory = Inventory()
+    try:
+        inventory.save_state(kind, provider, org, state)
+    finally:
+        inventory.close()
+
+
+def is_full_run() -> bool:
+    """是否强制处理全部仓库"""
+    return os.getenv("FULL_RUN", "0") == "1" or "--full" in sys.argv[1:]
+
+
+def select_changed_repos(
+    repos: list[dict[str, str]], state: dict[str, str]
+) -> list[dict[str, str]]:
+    """
+    选出上次成功处理之后有推送的仓库；没有 PushedAt 或没有处理记录的仓库总是保留
+    :param repos: 仓库信息列表，每项包含 Name、Url 和 PushedAt
+    :param state: load_state 读取的处理状态
+    """
+    if is_full_run():
+        print(f"全量运行，处理全部 {len(repos)} 个仓库")
+        return repos
+    # pushed_at 为 ISO 8601 UTC 时间，可以直接按字符串比较
+    changed = [
+        repo
+        for repo in repos
+        if not repo.get("PushedAt")
+        or repo["Name"] not in state
+        or repo["PushedAt"] > state[repo["Name"]]
+    ]
+    print(
+        f"上次成功运行后有推送的仓库: {len(changed)}/{len(repos)}，"
+        f"跳过 {len(repos) - len(changed)} 个没有变化的仓库"
+    )
+    return changed
+
+
+def record_processed(
+    state: dict[str, str], repos: list[dict[str, str]], succeeded: set[str]
+) -> None:
+    """把处理成功的仓库的 PushedAt 写入状态"""
+    for repo in repos:
+        if repo["Name"] in succeeded and repo.get("PushedAt"):
+            state[repo["Name"]] = repo["PushedAt"]
@@ -1,17 +1,38 @@
+import asyncio
 import os
+import re
+import signal
 import subprocess
+from collections import deque
+from typing import Callable
 
 
-def run_command(command: list[str], timeout: int = 900) -> tuple[bool, str]:
+def _process_group_kwargs() -> dict:
+    """让子进程运行在独立的进程组中，终端的 Ctrl-C 不会直接中断它"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def run_command(
+    command: list[str],
+    timeout: int = 900,
+    cwd: str | None = None,
+    new_process_group: bool = False,
+) -> tuple[bool, str]:
     """
     执行命令并统一处理错误
     :param command: 命令列表
     :param timeout: 超时时间（秒）
-    :return: (是否成功, 错误信息, 标准输出, 标准错误)
+    :param cwd: 命令的工作目录，为空时使用当前进程工作目录
+    :param new_process_group: 是否在独立进程组中执行，用于在 Ctrl-C 后让正在执行的命令完成或超时
+    :return: (是否成功, 成功时为标准输出（未捕获时为空字符串），失败时为错误信息)
     """
     try:
         result = subprocess.run(
             command,
+            cwd=cwd,
+            **(_process_group_kwargs() if new_process_group else {}),
             # stdin，stdout，stderr 不指定参数时将会显示命令执行的过程，比如clone的进度等
             # stdin=subprocess.PIPE,
             # stdout=subprocess.PIPE,
@@ -22,11 +43,7 @@ def run_command(command: list[str], timeout: int = 900) -> tuple[bool, str]:
             close_fds=True,
             shell=False,
         )
-        # if result.stdout == None:
-        #     return True, ""
-        # else:
-        #     return True, result.stdout.strip()
-        return True, {result.stdout.strip() if result.stdout else ""}
+        return True, result.stdout.strip() if result.stdout else ""
     except subprocess.CalledProcessError as e:
         error_msg = f"命令执行失败: {e.stderr if e.stderr else str(e)}"
         return False, error_msg
@@ -38,18 +55,26 @@ def run_command(command: list[str], timeout: int = 900) -> tuple[bool, str]:
         return False, error_msg
 
 
-def run_command_return_std(command: list[str], timeout: int = 900) -> tuple[bool, str]:
+def run_command_return_std(
+    command: list[str],
+    timeout: int = 900,
+    cwd: str | None = None,
+    input: str | None = None,
+) -> tuple[bool, str]:
     """
     执行命令并统一处理错误
     :param command: 命令列表
     :param timeout: 超时时间（秒）
+    :param cwd: 命令的工作目录，为空时使用当前进程工作目录
+    :param input: 写入命令标准输入的内容
     :return: (是否成功, 错误信息, 标准输出, 标准错误)
     """
     try:
         result = subprocess.run(
             command,
+            cwd=cwd,
             # 需要确保指定stdout=subprocess.PIPE，result.stdout才会有输出值
-            stdin=subprocess.PIPE,
+            **({"input": input} if input is not None else {"stdin": subprocess.PIPE}),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -70,6 +95,142 @@ def run_command_return_std(command: list[str], timeout: int = 900) -> tuple[bool
         return False, error_msg
 
 
+# git 的进度信息以 \r 刷新同一行，按 \r 或 \n 切分
+_LINE_SPLIT = re.compile(rb"[\r\n]")
+
+
+def _kill_process_group(process: asyncio.subprocess.Process) -> None:
+    """终止子进程及其所在的整个进程组（git 会再启动 remote-https、index-pack 等子进程）"""
+    if process.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, OSError):
+        pass
+
+
+async def _read_lines(
+    stream: asyncio.StreamReader,
+    tail: deque,
+    on_line: Callable[[str], None] | None,
+) -> None:
+    """逐行读取输出，回调每一行并保留最后几行用于错误信息"""
+    buffer = b""
+    while True:
+        chunk = await stream.read(4096)
+        if not chunk:
+            break
+        buffer += chunk
+        *lines, buffer = _LINE_SPLIT.split(buffer)
+        for line in lines:
+            if line:
+                text = line.decode("utf-8", errors="replace")
+                tail.append(text)
+                if on_line:
+                    on_line(text)
+    if buffer:
+        text = buffer.decode("utf-8", errors="replace")
+        tail.append(text)
+        if on_line:
+            on_line(text)
+
+
+async def run_command_async(
+    command: list[str],
+    timeout: int = 900,
+    cwd: str | None = None,
+    on_line: Callable[[str], None] | None = None,
+    semaphore: asyncio.Semaphore | None = None,
+) -> tuple[bool, str]:
+    """
+    基于 asyncio 异步执行命令，返回值约定与 run_command_return_std 一致
+    :param command: 命令列表
+    :param timeout: 超时时间（秒），超时后终止整个进程组
+    :param cwd: 命令的工作目录
+    :param on_line: 标准错误（git 进度信息）每输出一行时的回调
+    :param semaphore: 限制同时执行的命令数量，为空时不限制
+    :return: (是否成功, 标准输出或错误信息)
+    """
+    if semaphore is None:
+        return await _run_command_async(command, timeout, cwd, on_line)
+    async with semaphore:
+        return await _run_command_async(command, timeout, cwd, on_line)
+
+
+async def _stop_process(
+    process: asyncio.subprocess.Process, gathered: asyncio.Future
+) -> None:
+    """终止进程组，取回读取输出的任务并等待进程退出，不留下孤儿进程和未取回的异常"""
+    _kill_process_group(process)
+    gathered.cancel()
+    await asyncio.gather(gathered, return_exceptions=True)
+    await process.wait()
+
+
+async def _run_command_async(
+    command: list[str],
+    timeout: int,
+    cwd: str | None,
+    on_line: Callable[[str], None] | None,
+) -> tuple[bool, str]:
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **_process_group_kwargs(),
+        )
+    except Exception as e:
+        return False, f"未知错误: {str(e)}"
+
+    stdout_lines: deque = deque()
+    stderr_tail: deque = deque(maxlen=20)
+    gathered = asyncio.gather(
+        _read_lines(process.stdout, stdout_lines, None),
+        _read_lines(process.stderr, stderr_tail, on_line),
+        process.wait(),
+    )
+    try:
+        await asyncio.wait_for(gathered, timeout)
+    except asyncio.TimeoutError:
+        await _stop_process(process, gathered)
+        return False, "命令执行超时，已终止操作"
+    except asyncio.CancelledError:
+        # 任务被取消时同样不留下孤儿进程
+        await _stop_process(process, gathered)
+        raise
+
+    if process.returncode != 0:
+        stderr = "\n".join(stderr_tail)
+        return False, f"命令执行失败: {stderr or f'退出码 {process.returncode}'}"
+    return True, "\n".join(stdout_lines).strip()
+
+
+async def run_commands_async(
+    commands: list[list[str]], concurrency: int = 8, timeout: int = 900
+) -> list[tuple[bool, str]]:
+    """
+    并发执行一批命令，同时执行的数量不超过 concurrency
+    :return: 与 commands 顺序一致的 (是否成功, 标准输出或错误信息) 列表
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(
+        *(
+            run_command_async(command, timeout, semaphore=semaphore)
+            for command in commands
+        )
+    )
+
+
 def is_shallow_repository(repo_dir: str) -> bool:
     """
     检查仓库是否为浅克隆（shallow repository）
@@ -78,7 +239,7 @@ def is_shallow_repository(repo_dir: str) -> bool:
     """
     try:
         success, output = run_command_return_std(
-            ["git", "rev-parse", "--is-shallow-repository"], timeout=60
+            ["git", "rev-parse", "--is-shallow-repository"], timeout=60, cwd=repo_dir
         )
         # print(f"  是否为浅克隆: {output}")
         return success and output.strip() == "true"
@@ -87,12 +248,83 @@ def is_shallow_repository(repo_dir: str) -> bool:
         return False
 
 
+# 获取策略：full 一次完整克隆；partial 为 --filter=blob:none 的部分克隆（文件内容按需获取，
+# 只适合工作区镜像）；shallow 为先 --depth 1 再 --unshallow 的旧行为，需要两次协商和传输
+FETCH_STRATEGIES = ("full", "partial", "shallow")
+
+
+def resolve_fetch_strategy(
+    strategy: str | None, default: str, allowed: tuple[str, ...] = FETCH_STRATEGIES
+) -> str:
+    """校验获取策略，无效或不支持时回退到默认值"""
+    strategy = (strategy or default).strip().lower()
+    if strategy not in allowed:
+        print(f"不支持的获取策略 {strategy}，将使用 {default}")
+        return default
+    return strategy
+
+
+def clone_strategy_args(strategy: str) -> list[str]:
+    """获取策略对应的 git clone 参数"""
+    if strategy == "partial":
+        return ["--filter=blob:none"]
+    if strategy == "shallow":
+        return ["--depth", "1"]
+    return []
+
+
+def count_objects(repo_dir: str) -> int:
+    """统计仓库中的对象数量（松散对象加打包对象）"""
+    success, output = run_command_return_std(
+        ["git", "count-objects", "-v"], timeout=60, cwd=repo_dir
+    )
+    if not success:
+        return 0
+    total = 0
+    for line in output.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("count", "in-pack"):
+            total += int(value.strip() or 0)
+    return total
+
+
+def checkout_size(repo_dir: str, rev: str = "HEAD") -> int:
+    """
+    估算检出 rev 的工作区需要写入的字节数（文件内容加索引条目），
+    用于统计裸仓库流程避免的磁盘写入
+    :return: 字节数，无法获取时返回 0
+    """
+    success, output = run_command_return_std(
+        ["git", "ls-tree", "-r", "-l", "-z", rev], timeout=300, cwd=repo_dir
+    )
+    if not success:
+        return 0
+    total = 0
+    for entry in output.split("\0"):
+        meta, _, path = entry.partition("\t")
+        fields = meta.split()
+        if len(fields) == 4 and fields[3].isdigit():
+            # 每个索引条目约 62 字节固定头加路径
+            total += int(fields[3]) + 62 + len(path)
+    return total
+
+
+# 接收的对象总是保存为新的 pack（不解包为松散对象），新出现的 pack 大小即传输量（见 util_repo.received_bytes）；
+# 自动 gc 会把已有的 pack 合并成新的 pack，推迟到统计之后由 gc_auto 执行
+KEEP_PACK_CONFIG = ["-c", "transfer.unpackLimit=1", "-c", "gc.auto=0"]
+
+
+def gc_auto(repo_dir: str) -> None:
+    """统计传输量之后，按需执行获取时推迟的自动 gc"""
+    run_command(["git", "gc", "--auto", "--quiet"], 900, cwd=repo_dir)
+
+
 def fetch_repository(repo_Url: str, temp_dir: str) -> tuple[bool, str]:
-    """执行 git fetch 操作"""
-    os.chdir(temp_dir)
+    """执行 git fetch 操作（在 temp_dir 中执行，不切换进程工作目录）"""
     shallow_fetch = is_shallow_repository(temp_dir)
     command = [
         "git",
+        *KEEP_PACK_CONFIG,
         "fetch",
         "--all",
         "--tags",
@@ -103,8 +335,7 @@ def fetch_repository(repo_Url: str, temp_dir: str) -> tuple[bool, str]:
         command.append("--unshallow")
     print(f"  正在fetch仓库...{repo_Url}")
     # print(f"  命令：{command}")
-    os.chdir(temp_dir)
-    success, error_msg = run_command(command, 900)
+    success, error_msg = run_command(command, 900, cwd=temp_dir)
     if not success:
         print(f"  {error_msg}")
         return False, error_msg
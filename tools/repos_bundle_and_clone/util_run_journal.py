@@ -0,0 +1,126 @@
+"""
+运行日志（断点续跑）
+
+bundle 流程在输出目录中维护 .bundle_run_journal_{pipeline}.jsonl，每处理完一个仓库追加一行结果并立即 fsync。
+pipeline 区分共用同一输出目录的不同流程（如 GitHub 和 Coding），各自的日志互不影响。
+运行正常结束时删除日志；运行中途被终止后再次启动时，日志仍然存在，
+上次已经成功（或因没有变化而跳过）的仓库在远程引用指纹与当时记录的一致时直接跳过，
+从第一个未完成的仓库继续，失败的仓库和之后又有推送的仓库会重新处理。
+超过 BUNDLE_RESUME_MAX_HOURS（默认 24）小时的日志视为过期，不再用于续跑。
+设置环境变量 BUNDLE_RESUME=0 时忽略上次的日志，重新处理全部仓库。
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+JOURNAL_FILE = ".bundle_run_journal_{pipeline}.jsonl"
+
+
+def is_resume_enabled() -> bool:
+    return os.getenv("BUNDLE_RESUME", "1") != "0"
+
+
+def _max_age() -> timedelta:
+    try:
+        hours = float(os.getenv("BUNDLE_RESUME_MAX_HOURS", "24"))
+    except ValueError:
+        hours = 24
+    return timedelta(hours=hours)
+
+
+class RunJournal:
+    """追加写入的运行日志，可在多个处理线程之间共享"""
+
+    def __init__(
+        self, output_dir: str, pipeline: str = "bundle", resume: bool | None = None
+    ) -> None:
+        """
+        :param output_dir: bundle 输出目录
+        :param pipeline: 流程名，共用输出目录的不同流程使用不同的日志
+        :param resume: 是否从上次中断的运行继续，为空时读取环境变量 BUNDLE_RESUME（默认开启）
+        """
+        self.path = os.path.join(output_dir, JOURNAL_FILE.format(pipeline=pipeline))
+        self._lock = threading.Lock()
+        # 上次中断的运行中已经完成的仓库 -> 当时的远程引用指纹
+        self.completed: dict[str, str | None] = {}
+        if resume is None:
+            resume = is_resume_enabled()
+        if resume:
+            self._load()
+        if not self.completed and os.path.exists(self.path):
+            os.unlink(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        if not self.completed:
+            self._append({"started_at": datetime.now().isoformat(timespec="seconds")})
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        completed: dict[str, str | None] = {}
+        started_at = None
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 最后一行可能在写入时被中断
+                continue
+            if "started_at" in entry and started_at is None:
+                started_at = entry["started_at"]
+            if "repo" not in entry:
+                continue
+            if entry.get("status") in ("success", "skipped"):
+                completed[entry["repo"]] = entry.get("fingerprint")
+            else:
+                completed.pop(entry["repo"], None)
+        try:
+            started = datetime.fromisoformat(started_at)
+        except (TypeError, ValueError):
+            started = None
+        if started is None or datetime.now() - started > _max_age():
+            print(f"上次中断的运行日志已过期（开始于 {started_at}），重新处理全部仓库")
+            return
+        self.completed = completed
+        if self.completed:
+            print(
+                f"发现上次中断的运行日志，已完成 {len(self.completed)} 个仓库，"
+                f"远程引用未变化的将跳过（BUNDLE_RESUME=0 可重新处理全部仓库）"
+            )
+
+    def _append(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def has_entry(self, repo_name: str) -> bool:
+        """上次中断的运行中是否已完成该仓库（尚未核对远程引用）"""
+        return repo_name in self.completed
+
+    def is_completed(self, repo_name: str, fingerprint: str | None) -> bool:
+        """上次中断的运行中已完成该仓库，且远程引用指纹与当时记录的一致"""
+        if repo_name not in self.completed:
+            return False
+        recorded = self.completed[repo_name]
+        return recorded is not None and recorded == fingerprint
+
+    def record(
+        self, repo_name: str, status: str, fingerprint: str | None = None
+    ) -> None:
+        """记录一个仓库的处理结果及处理时的远程引用指纹"""
+        with self._lock:
+            self._append(
+                {"repo": repo_name, "status": status, "fingerprint": fingerprint}
+            )
+
+    def finish(self) -> None:
+        """运行正常结束，删除日志；运行被中断时不调用，保留日志以便下次继续"""
+        with self._lock:
+            self._file.close()
+            try:
+                os.unlink(self.path)
+            except OSError as e:
+                print(f"删除运行日志失败: {e}")
@@ -0,0 +1,197 @@
+"""
+运行报告
+
+记录打包/克隆运行中每个仓库各阶段（clone、fetch、bundle、删除旧bundle、清理临时目录等）的耗时，
+以及传输字节数、bundle 大小和对象数量。每个仓库处理完成后立即追加一行 JSON 到报告文件，
+运行结束时再追加一行汇总（各阶段 p50/p95、最慢的仓库、失败列表），便于长期对比趋势。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RepoReport:
+    """单个仓库的运行记录"""
+
+    def __init__(self, name: str, url: str) -> None:
+        self.record: dict = {
+            "type": "repo",
+            "repo": name,
+            "url": url,
+            "status": None,
+            "error": "",
+            "strategy": None,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "total_seconds": 0.0,
+            "stages": {},
+            "bytes_transferred": 0,
+            "bundle_bytes": 0,
+            "objects": 0,
+            "checkout_bytes_avoided": 0,
+        }
+        self._start = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str):
+        """统计一个阶段的耗时，同名阶段多次执行时累加"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            stages = self.record["stages"]
+            stages[name] = round(stages.get(name, 0.0) + time.monotonic() - start, 3)
+
+    def set(self, **fields) -> None:
+        """设置记录字段"""
+        self.record.update(fields)
+
+    def add(self, field: str, value: int) -> None:
+        """累加数值字段"""
+        self.record[field] = self.record.get(field, 0) + value
+
+    def finish(self, status: str, error: str = "") -> None:
+        """结束记录，status 为 success/failed/skipped/resumed/cancelled"""
+        self.record["status"] = status
+        self.record["error"] = error
+        self.record["total_seconds"] = round(time.monotonic() - self._start, 3)
+
+
+class RunReport:
+    """一次运行的报告，写入 JSON-lines 文件"""
+
+    def __init__(
+        self,
+        kind: str,
+        report_dir: str | None = None,
+        inventory=None,
+        provider: str = "",
+        org: str = "",
+    ) -> None:
+        """
+        :param kind: 运行类型，如 bundle、clone
+        :param report_dir: 报告目录，为空时读取环境变量 RUN_REPORT_DIR，默认脚本目录下的 reports
+        :param inventory: 仓库清单（util_inventory.Inventory），不为空时同时写入每个仓库的最近结果
+        :param provider: 仓库来源（如 github、coding），写入仓库清单时区分不同来源的同名仓库
+        :param org: 组织或团队
+        """
+        report_dir = report_dir or os.getenv("RUN_REPORT_DIR")
+        if not report_dir:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            report_dir = os.path.join(script_dir, "reports")
+        os.makedirs(report_dir, exist_ok=True)
+        self.kind = kind
+        self.started_at = datetime.now()
+        self.path = os.path.join(
+            report_dir, f"{kind}_run_{self.started_at.strftime('%Y%m%d_%H%M%S')}.jsonl"
+        )
+        self.records: list[dict] = []
+        self.inventory = inventory
+        self.provider = provider
+        self.org = org
+        self._lock = threading.Lock()
+
+    def new_repo(self, name: str, url: str) -> RepoReport:
+        return RepoReport(name, url)
+
+    def add(self, report: RepoReport) -> None:
+        """追加一个仓库的记录，立即写入文件，中途中断也能保留已完成的部分"""
+        with self._lock:
+            self.records.append(report.record)
+            self._write(report.record)
+        if self.inventory is not None:
+            try:
+                self.inventory.record_run(
+                    self.kind, report.record, self.provider, self.org
+                )
+            except sqlite3.Error as e:
+                print(f"写入仓库清单失败: {e}")
+
+    def _write(self, record: dict) -> None:
+        try:
+            with open(self.path, mode="a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入运行报告失败: {e}")
+
+    def succeeded(self) -> set[str]:
+        """
+        本次运行中处理成功（含因未变化而跳过）的仓库名；
+        断点续跑时沿用上次结果的仓库（resumed）不计入，它们的推送时间要由下次运行重新确认
+        """
+        with self._lock:
+            return {
+                r["repo"] for r in self.records if r["status"] in ("success", "skipped")
+            }
+
+    def summary(self, slowest: int = 10) -> dict:
+        """生成并写入运行汇总，同时打印各阶段耗时统计"""
+        with self._lock:
+            records = list(self.records)
+
+        stage_values: dict[str, list[float]] = {}
+        for record in records:
+            for stage, seconds in record["stages"].items():
+                stage_values.setdefault(stage, []).append(seconds)
+
+        statuses: dict[str, int] = {}
+        for record in records:
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+
+        summary = {
+            "type": "summary",
+            "kind": self.kind,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "total": len(records),
+            "statuses": statuses,
+            "bytes_transferred": sum(r["bytes_transferred"] for r in records),
+            "bundle_bytes": sum(r["bundle_bytes"] for r in records),
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "total": round(sum(values), 3),
+                    "p50": _percentile(values, 50),
+                    "p95": _percentile(values, 95),
+                    "max": max(values),
+                }
+                for stage, values in stage_values.items()
+            },
+            "slowest": [
+                {"repo": r["repo"], "total_seconds": r["total_seconds"]}
+                for r in sorted(records, key=lambda r: -r["total_seconds"])[:slowest]
+            ],
+            "failed": [
+                {"Name": r["repo"], "Url": r["url"], "Error": r["error"]}
+                for r in records
+                if r["status"] == "failed"
+            ],
+        }
+        with self._lock:
+            self._write(summary)
+
+        print("\n阶段                 次数      p50(秒)     p95(秒)     合计(秒)")
+        for stage, stats in summary["stages"].items():
+            print(
+                f"{stage:<16}{stats['count']:>8}{stats['p50']:>13.2f}"
+                f"{stats['p95']:>12.2f}{stats['total']:>13.2f}"
+            )
+        if summary["slowest"]:
+            print("最慢的仓库:")
+            for item in summary["slowest"]:
+                print(f"  {item['repo']}: {item['total_seconds']:.2f} 秒")
+        print(f"运行报告: {self.path}")
+        return summary
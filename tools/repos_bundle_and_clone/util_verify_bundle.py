@@ -0,0 +1,367 @@
+"""
+bundle 完整性校验
+
+两种校验方式：
+    快速校验  git bundle verify，只检查 bundle 头部、引用和前置提交是否齐全，
+              不读取包内对象，发现不了包数据损坏（如写入或复制时被截断、位翻转），不是完整性校验
+    完整校验  在临时裸仓库中 git bundle unbundle，由 index-pack 逐个校验包内对象和校验和
+完整 bundle 没有前置提交，可以在空仓库中单独校验；增量 bundle 依赖链中之前的节点，
+需要按链的顺序重放（见 util_bundle_chain）后才能校验。
+
+校验结果按文件大小、修改时间和 SHA-256 缓存在输出目录的 .bundle_verify_cache.json 中：
+大小和修改时间都没有变化时直接使用缓存；只有修改时间变化（如复制或恢复备份）时重新计算哈希，
+哈希相同也不再重复校验。打包流程中每个输出目录只读取一次缓存，在内存中更新，
+每 50 条写入一次，运行结束时由 flush_verify_caches 写入剩余部分。
+
+打包流程在新 bundle 通过校验后才删除旧 bundle（见 util_bundle_repos），
+已有的 bundle 可以通过 _verify_bundles.py 使用多进程批量校验。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from util_bundle_chain import CHAIN_SUFFIX, DELTA_SUFFIX, chain_files, load_chain
+from util_repo import remove_temp_dir
+from util_run_command import run_command_return_std
+
+VERIFY_CACHE_FILE = ".bundle_verify_cache.json"
+# 与 util_dedup_store.FAMILY_DIR 一致（util_dedup_store 依赖本模块，不能反向导入）
+FAMILY_DIR = "families"
+
+# 同一进程中多个打包线程写入校验缓存时互斥
+_cache_lock = threading.Lock()
+# 打包流程中按输出目录共享的校验缓存，及累计多少条新结果后写入一次文件
+_run_caches: dict[str, "VerifyCache"] = {}
+_SAVE_EVERY = 50
+
+
+def is_verify_enabled() -> bool:
+    """打包后是否校验新 bundle，环境变量 BUNDLE_VERIFY=0 时关闭"""
+    return os.getenv("BUNDLE_VERIFY", "1") != "0"
+
+
+def is_full_verify() -> bool:
+    """是否使用 index-pack 完整校验，环境变量 BUNDLE_VERIFY_FULL=1 时开启"""
+    return os.getenv("BUNDLE_VERIFY_FULL", "0") == "1"
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _init_temp_repo(alternate_dir: str | None = None) -> tuple[bool, str]:
+    """
+    创建用于校验的临时裸仓库
+    :param alternate_dir: 已包含前置对象的仓库，通过 alternates 借用其对象，不复制
+    :return: (是否成功, 临时仓库目录或错误信息)
+    """
+    temp_root_dir = os.path.join(tempfile.gettempdir(), "repositoryMananger")
+    os.makedirs(temp_root_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(
+        prefix="verifyBundle_", suffix="_gitRepo", dir=temp_root_dir
+    )
+    success, error_msg = run_command_return_std(
+        ["git", "init", "--bare", "--quiet", temp_dir], 60
+    )
+    if not success:
+        remove_temp_dir(temp_dir)
+        return False, error_msg
+    if alternate_dir:
+        with open(
+            os.path.join(temp_dir, "objects", "info", "alternates"),
+            "w",
+            encoding="utf-8",
+        ) as f:
+            f.write(os.path.join(os.path.abspath(alternate_dir), "objects") + "\n")
+    return True, temp_dir
+
+
+def _check_bundle(bundle_path: str, repo_dir: str, full: bool) -> tuple[bool, str]:
+    """在已有前置对象的仓库中校验 bundle，完整校验时导入对象"""
+    command = "unbundle" if full else "verify"
+    success, output = run_command_return_std(
+        ["git", "bundle", command, bundle_path], 900, cwd=repo_dir
+    )
+    return success, "" if success else output
+
+
+def verify_bundle(
+    bundle_path: str, repo_dir: str | None = None, full: bool = False
+) -> tuple[bool, str]:
+    """
+    校验单个 bundle
+    :param bundle_path: bundle 文件路径
+    :param repo_dir: 包含前置提交的仓库（如刚打包的仓库），为空时在空仓库中校验，只适用于完整 bundle
+    :param full: 是否完整校验；完整校验在临时仓库中进行，不会向 repo_dir 写入对象
+    :return: (是否通过, 错误信息)
+    """
+    if repo_dir and not full:
+        return _check_bundle(bundle_path, repo_dir, False)
+    success, temp_dir = _init_temp_repo(repo_dir)
+    if not success:
+        return False, temp_dir
+    try:
+        return _check_bundle(bundle_path, temp_dir, full)
+    finally:
+        remove_temp_dir(temp_dir)
+
+
+def verify_chain(
+    output_dir: str, files: list[str], full: bool = False
+) -> list[tuple[str, bool, str]]:
+    """
+    按顺序重放 bundle 链并逐个校验，某个节点失败后其后的节点无法校验，同样记为失败
+    :param output_dir: bundle 输出目录
+    :param files: 链中的 bundle 文件名，第一个为完整 bundle
+    :return: 每个文件的 (文件名, 是否通过, 错误信息)
+    """
+    success, temp_dir = _init_temp_repo()
+    if not success:
+        return [(file, False, temp_dir) for file in files]
+    results: list[tuple[str, bool, str]] = []
+    try:
+        for i, file in enumerate(files):
+            bundle_path = os.path.join(output_dir, file)
+            success, error_msg = _check_bundle(bundle_path, temp_dir, full)
+            # 快速校验不导入对象，后续增量 bundle 的前置提交需要先导入
+            if success and not full and i < len(files) - 1:
+                success, error_msg = _check_bundle(bundle_path, temp_dir, True)
+            results.append((file, success, error_msg))
+            if not success:
+                results.extend(
+                    (rest, False, f"前置bundle {file} 校验失败")
+                    for rest in files[i + 1 :]
+                )
+                break
+    finally:
+        remove_temp_dir(temp_dir)
+    return results
+
+
+class VerifyCache:
+    """按文件大小、修改时间和 SHA-256 缓存校验结果"""
+
+    def __init__(self, output_dir: str) -> None:
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, VERIFY_CACHE_FILE)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries: dict[str, dict] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.entries = {}
+        # 上次写入文件之后新增的结果数
+        self.unsaved = 0
+
+    def lookup(self, file: str, full: bool) -> dict | None:
+        """
+        返回仍然有效的缓存结果；快速校验的结果不能代替完整校验
+        :return: 缓存条目（包含 ok 和 error），文件变化或没有缓存时返回 None
+        """
+        entry = self.entries.get(file)
+        if not entry or (full and not entry.get("full")):
+            return None
+        try:
+            st = os.stat(os.path.join(self.output_dir, file))
+        except OSError:
+            return None
+        if st.st_size != entry.get("size"):
+            return None
+        if st.st_mtime_ns != entry.get("mtime_ns"):
+            # 只有修改时间变化时比较内容哈希，内容相同则更新修改时间后继续使用
+            if file_sha256(os.path.join(self.output_dir, file)) != entry.get("sha256"):
+                return None
+            entry["mtime_ns"] = st.st_mtime_ns
+        return entry
+
+    def store(
+        self, file: str, ok: bool, full: bool, error: str = "", sha256: str = ""
+    ) -> None:
+        path = os.path.join(self.output_dir, file)
+        try:
+            st = os.stat(path)
+            sha256 = sha256 or file_sha256(path)
+        except OSError:
+            self.entries.pop(file, None)
+            return
+        self.entries[file] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": sha256,
+            "full": full,
+            "ok": ok,
+            "error": error,
+        }
+
+    def prune(self) -> None:
+        """删除已不存在的文件的缓存"""
+        for file in list(self.entries):
+            if not os.path.isfile(os.path.join(self.output_dir, file)):
+                del self.entries[file]
+
+    def save(self) -> None:
+        """写入缓存文件，先写临时文件再替换"""
+        try:
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+            os.replace(f"{self.path}.tmp", self.path)
+            self.unsaved = 0
+        except OSError as e:
+            print(f"  保存bundle校验缓存失败: {e}")
+
+
+def verify_new_bundle(
+    output_dir: str,
+    bundle_file: str,
+    repo_dir: str,
+    full: bool | None = None,
+    sha256: str = "",
+) -> tuple[bool, str]:
+    """
+    校验刚创建的 bundle 并记入本次运行共享的校验缓存（批量写入文件，见 flush_verify_caches），
+    通过后才允许删除旧 bundle
+    :param output_dir: bundle 输出目录
+    :param bundle_file: bundle 文件名
+    :param repo_dir: 打包所用的仓库，提供增量 bundle 的前置提交
+    :param full: 是否完整校验，为空时读取环境变量 BUNDLE_VERIFY_FULL
+    :param sha256: 写入时已计算的校验和（见 util_bundle_writer），为空时重新读取文件计算
+    """
+    if full is None:
+        full = is_full_verify()
+    success, error_msg = verify_bundle(
+        os.path.join(output_dir, bundle_file), repo_dir, full
+    )
+    if success:
+        with _cache_lock:
+            key = os.path.abspath(output_dir)
+            cache = _run_caches.get(key)
+            if cache is None:
+                cache = _run_caches[key] = VerifyCache(key)
+            cache.store(bundle_file, True, full, sha256=sha256)
+            cache.unsaved += 1
+            if cache.unsaved >= _SAVE_EVERY:
+                cache.save()
+    return success, error_msg
+
+
+def flush_verify_caches() -> None:
+    """写入本次运行中尚未写入文件的校验结果，打包流程结束时调用"""
+    with _cache_lock:
+        for cache in _run_caches.values():
+            if cache.unsaved:
+                cache.save()
+        _run_caches.clear()
+
+
+def _verify_unit(output_dir: str, files: list[str], full: bool) -> list:
+    """进程池中执行的校验任务：单个完整 bundle 或一条 bundle 链"""
+    if len(files) == 1 and not files[0].endswith(DELTA_SUFFIX):
+        success, error_msg = verify_bundle(
+            os.path.join(output_dir, files[0]), None, full
+        )
+        return [(files[0], success, error_msg)]
+    return verify_chain(output_dir, files, full)
+
+
+def _collect_units(output_dir: str) -> tuple[list[list[str]], list[str]]:
+    """
+    把输出目录中的 bundle 分组为校验任务
+    :return: (任务列表，每个任务为一个完整 bundle 或一条链的文件列表, 不属于任何链的增量 bundle)
+    """
+    names = sorted(os.listdir(output_dir))
+    chained: set[str] = set()
+    units: list[list[str]] = []
+    for name in names:
+        if name.endswith(CHAIN_SUFFIX):
+            files = chain_files(load_chain(output_dir, name[: -len(CHAIN_SUFFIX)]))
+            files = [f for f in files if os.path.isfile(os.path.join(output_dir, f))]
+            if files:
+                units.append(files)
+                chained.update(files)
+    # 去重模式下的家族 bundle 保存在 families 子目录，都是完整 bundle
+    family_dir = os.path.join(output_dir, FAMILY_DIR)
+    if os.path.isdir(family_dir):
+        units.extend(
+            [f"{FAMILY_DIR}/{name}"]
+            for name in sorted(os.listdir(family_dir))
+            if name.endswith(".bundle")
+        )
+    orphans = []
+    for name in names:
+        if not name.endswith(".bundle") or name in chained:
+            continue
+        if name.endswith(DELTA_SUFFIX):
+            orphans.append(name)
+        else:
+            units.append([name])
+    return units, orphans
+
+
+def verify_bundles(
+    output_dir: str, workers: int | None = None, full: bool | None = None
+) -> tuple[int, list[tuple[str, str]]]:
+    """
+    使用进程池校验输出目录中的全部 bundle，文件没有变化且已通过校验的跳过
+    :param output_dir: bundle 输出目录
+    :param workers: 并发进程数，为空时读取环境变量 BUNDLE_VERIFY_WORKERS（默认 CPU 核数）
+    :param full: 是否完整校验，为空时读取环境变量 BUNDLE_VERIFY_FULL
+    :return: (通过校验的文件数, 校验失败的 (文件名, 错误信息) 列表)
+    """
+    output_dir = os.path.abspath(output_dir)
+    if full is None:
+        full = is_full_verify()
+    if workers is None:
+        try:
+            workers = int(os.getenv("BUNDLE_VERIFY_WORKERS", ""))
+        except ValueError:
+            workers = os.cpu_count() or 1
+    workers = max(1, workers)
+
+    cache = VerifyCache(output_dir)
+    cache.prune()
+    units, orphans = _collect_units(output_dir)
+    for orphan in orphans:
+        print(f"跳过不属于任何bundle链的增量bundle: {orphan}")
+
+    passed = 0
+    failed: list[tuple[str, str]] = []
+    pending: list[list[str]] = []
+    for files in units:
+        entries = [cache.lookup(file, full) for file in files]
+        if all(entry and entry["ok"] for entry in entries):
+            passed += len(files)
+        else:
+            pending.append(files)
+    print(
+        f"共 {sum(len(files) for files in units)} 个bundle，"
+        f"{passed} 个未变化且已通过校验，"
+        f"{sum(len(files) for files in pending)} 个需要{'完整' if full else '快速'}校验"
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            _verify_unit,
+            [output_dir] * len(pending),
+            pending,
+            [full] * len(pending),
+        )
+        for done, unit_results in enumerate(results, 1):
+            for file, success, error_msg in unit_results:
+                cache.store(file, success, full, error_msg)
+                if success:
+                    passed += 1
+                    print(f"[{done}/{len(pending)}] 校验通过: {file}")
+                else:
+                    failed.append((file, error_msg))
+                    print(f"[{done}/{len(pending)}] 校验失败: {file} - {error_msg}")
+
+    cache.save()
+    print(f"\n校验完成: 通过 {passed} 个，失败 {len(failed)} 个")
+    return passed, failed